@@ -1,10 +1,17 @@
-__all__ = ['SortedList', 'SortedSet']
+__all__ = ['SortedDatetimeList', 'SortedDatetimeSet', 'SortedDict',
+           'SortedList', 'SortedPoints', 'SortedSet', 'SortedStrings',
+           'get_threads', 'set_threads']
 __version__ = '1.0.1'
 __author__ = 'Giorgio Vinciguerra'
 
 import os as _os
 
+from ._pygm import get_threads, set_threads
+from .sorteddatetime import SortedDatetimeList, SortedDatetimeSet
+from .sorteddict import SortedDict
 from .sortedlist import SortedList
+from .sortedpoints import SortedPoints
 from .sortedset import SortedSet
+from .sortedstrings import SortedStrings
 
 _os.environ['KMP_DUPLICATE_LIB_OK'] = 'True'
@@ -1,13 +1,30 @@
+#include <pybind11/numpy.h>
 #include <pybind11/operators.h>
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 
 #include <algorithm>
+#include <array>
+#include <atomic>
 #include <cassert>
+#include <cmath>
+#include <cstdio>
+#include <cstring>
+#include <functional>
+#include <limits>
+#include <memory>
+#include <mutex>
+#include <numeric>
+#include <optional>
 #include <regex>
+#include <shared_mutex>
 #include <unordered_map>
 #include <vector>
 
+#if defined(__BMI2__)
+#include <immintrin.h>
+#endif
+
 #include "pgm/pgm_index.hpp"
 
 namespace py = pybind11;
@@ -62,6 +79,25 @@ OutputIt set_unique_symmetric_difference(InputIt1 first1, InputIt1 last1, InputI
     return std::unique_copy(first2, last2, out);
 }
 
+template <class InputIt1, class InputIt2, class OutputIt>
+OutputIt set_unique_difference(InputIt1 first1, InputIt1 last1, InputIt2 first2, InputIt2 last2, OutputIt out) {
+    while (first1 != last1) {
+        if (first2 == last2)
+            return std::unique_copy(first1, last1, out);
+
+        if (*first2 < *first1) {
+            ++first2;
+            continue;
+        }
+        auto to_skip = *first1;
+        if (to_skip < *first2)
+            *out++ = to_skip;
+        while (first1 != last1 && *first1 == to_skip)
+            ++first1;
+    }
+    return out;
+}
+
 template <class InputIt1, class InputIt2>
 bool set_unique_includes(InputIt1 first1, InputIt1 last1, InputIt2 first2, InputIt2 last2, bool proper) {
     bool is_proper = !proper;
@@ -82,27 +118,1384 @@ bool set_unique_includes(InputIt1 first1, InputIt1 last1, InputIt2 first2, Input
     return true && is_proper;
 }
 
+template <class InputIt1, class InputIt2>
+bool set_disjoint(InputIt1 first1, InputIt1 last1, InputIt2 first2, InputIt2 last2) {
+    while (first1 != last1 && first2 != last2) {
+        if (*first1 < *first2)
+            ++first1;
+        else if (*first2 < *first1)
+            ++first2;
+        else
+            return false;
+    }
+    return true;
+}
+
+/** Returns the first element >= x in the sorted range [first, last), searching exponentially from first. */
+template <class RandomIt, class T> RandomIt gallop_lower_bound(RandomIt first, RandomIt last, const T &x) {
+    size_t n = last - first;
+    if (n == 0 || !(*first < x))
+        return first;
+    size_t step = 1;
+    while (step < n && first[step] < x)
+        step *= 2;
+    return std::lower_bound(first + step / 2, first + std::min(step, n), x);
+}
+
+/**
+ * Whether looking up m sorted elements one by one among n sorted elements, by galloping or through an index, is faster
+ * than merging them.
+ */
+inline bool lookups_faster(size_t m, size_t n) { return m < n / 32; }
+
+/** The number of threads used to build containers, set by set_threads(). Zero means the OpenMP default. */
+static std::atomic<int> build_threads{0};
+
+int get_threads() {
+#ifdef _OPENMP
+    auto threads = build_threads.load();
+    return threads ? threads : omp_get_max_threads();
+#else
+    return 1;
+#endif
+}
+
+void set_threads(int threads) {
+    if (threads < 0)
+        throw py::value_error("the number of threads must be non-negative");
+    build_threads = threads;
+}
+
+/**
+ * Sets the OpenMP thread count of the calling thread to the one returned by get_threads(), for the lifetime of the
+ * object. This also governs the parallel segmentation in the upstream PGM-index code.
+ */
+class ThreadsScope {
+#ifdef _OPENMP
+    int previous = omp_get_max_threads();
+
+  public:
+    ThreadsScope() { omp_set_num_threads(get_threads()); }
+    ~ThreadsScope() { omp_set_num_threads(previous); }
+#endif
+};
+
+/**
+ * Releases the GIL held by the caller, if n, the number of elements to process, is large enough for the release to pay
+ * off. The GIL is reacquired when the returned object is destroyed.
+ */
+std::unique_ptr<py::gil_scoped_release> release_gil_if_large(size_t n) {
+    return n < 1ull << 15 ? nullptr : std::make_unique<py::gil_scoped_release>();
+}
+
+/**
+ * Returns the number of elements of the sorted range [a, a + na) that precede the k-th element of their stable
+ * merge with the sorted range [b, b + nb).
+ */
+template <typename T> size_t merge_split(const T *a, size_t na, const T *b, size_t nb, size_t k) {
+    size_t lo = k > nb ? k - nb : 0;
+    size_t hi = std::min(k, na);
+    while (lo < hi) {
+        auto i = lo + (hi - lo) / 2;
+        if (!(b[k - i - 1] < a[i]))
+            lo = i + 1;
+        else
+            hi = i;
+    }
+    return lo;
+}
+
+/**
+ * Sorts [first, last) with the given number of threads: each thread sorts a chunk of the range, and then pairs of
+ * adjacent sorted runs are merged in rounds. Every merge is split among the threads assigned to it, so that the
+ * last rounds, which merge few long runs, still use all the threads.
+ */
+template <typename T> void parallel_sort(T *first, T *last, int threads) {
+    auto n = size_t(last - first);
+    if (threads <= 1 || n < 1ull << 16) {
+        std::sort(first, last);
+        return;
+    }
+
+    std::vector<size_t> bounds(threads + 1);
+    for (int i = 0; i <= threads; ++i)
+        bounds[i] = n * i / threads;
+
+#pragma omp parallel for num_threads(threads) schedule(static, 1)
+    for (int i = 0; i < threads; ++i)
+        std::sort(first + bounds[i], first + bounds[i + 1]);
+
+    std::vector<T> buffer(n);
+    auto src = first;
+    auto dst = buffer.data();
+    for (int width = 1; width < threads; width *= 2) {
+        int pairs = (threads + 2 * width - 1) / (2 * width);
+        int parts = std::max(1, threads / pairs);
+#pragma omp parallel for num_threads(threads) schedule(static, 1)
+        for (int t = 0; t < pairs * parts; ++t) {
+            auto run = t / parts * 2 * width;
+            auto lo = bounds[run];
+            auto mid = bounds[std::min(run + width, threads)];
+            auto hi = bounds[std::min(run + 2 * width, threads)];
+            auto part = t % parts;
+            auto k_begin = (hi - lo) * part / parts;
+            auto k_end = (hi - lo) * (part + 1) / parts;
+            auto i_begin = merge_split(src + lo, mid - lo, src + mid, hi - mid, k_begin);
+            auto i_end = merge_split(src + lo, mid - lo, src + mid, hi - mid, k_end);
+            std::merge(src + lo + i_begin, src + lo + i_end,
+                       src + mid + (k_begin - i_begin), src + mid + (k_end - i_end),
+                       dst + lo + k_begin);
+        }
+        std::swap(src, dst);
+    }
+
+    if (src != first) {
+#pragma omp parallel for num_threads(threads) schedule(static, 1)
+        for (int i = 0; i < threads; ++i)
+            std::copy(src + bounds[i], src + bounds[i + 1], first + bounds[i]);
+    }
+}
+
 #define IGNORED_PARAMETER 1
 #define EPSILON_RECURSIVE 4
+#define FILE_FORMAT_VERSION 3
+#define UPDATES_BUFFER_CAPACITY 1024
+#define PARALLEL_BATCH_THRESHOLD (1 << 14)
+#define RADIX_TABLE_MAX_BITS 20
+
+/**
+ * The header of the files written by PGMWrapper::save.
+ *
+ * The header is followed by: the elements, starting at offset sizeof(FileHeader) so that they are suitably aligned
+ * when the file is memory-mapped; zero padding up to a multiple of 8 bytes; the segments of all the levels of the
+ * index; the levels offsets, as 64-bit integers. Everything is stored in the native byte order.
+ *
+ * Version 2 adds compressed indexes, for which the segments and levels offsets are those of the upper levels only,
+ * and are followed by the size in bytes of the compressed last level, as a 64-bit integer, and by its serialisation.
+ * Version 3 adds packed elements, which are stored in place of the plain ones as the words of their Elias-Fano
+ * representation, see EliasFano. Files are written with the lowest version that supports their content.
+ */
+#pragma pack(push, 1)
+struct FileHeader {
+    char magic[4];              ///< The string "PyGM".
+    uint32_t byte_order;        ///< The value 0x01020304, to detect files written with a different byte order.
+    uint32_t version;           ///< The version of the file format.
+    char key_format;            ///< The buffer-protocol format character of the elements.
+    char typecode;              ///< The typecode of the container.
+    uint8_t key_size;           ///< The size in bytes of an element.
+    uint8_t duplicates;         ///< Whether the container may have duplicate elements.
+    uint64_t n;                 ///< The number of elements.
+    uint64_t epsilon;           ///< The error bound of the last level of the index.
+    uint64_t epsilon_recursive; ///< The error bound of the upper levels of the index.
+    uint64_t n_segments;        ///< The number of segments in all the levels of the index.
+    uint64_t n_levels_offsets;  ///< The number of levels offsets.
+    uint8_t compressed;         ///< Whether the index is compressed (since version 2).
+    uint8_t packed;             ///< Whether the elements are packed (since version 3).
+    uint8_t radix;              ///< Whether the index has a radix table, which is rebuilt on load.
+    uint8_t reserved[5];
+};
+#pragma pack(pop)
+
+static_assert(sizeof(FileHeader) == 64);
+
+inline size_t round_up(size_t x, size_t multiple) { return (x + multiple - 1) / multiple * multiple; }
+
+/** Appends the bytes of the given values to a string. */
+template <typename T> void append_bytes(std::string &out, const T *values, size_t n) {
+    out.append(reinterpret_cast<const char *>(values), n * sizeof(T));
+}
+
+/** Reads n values from a range of bytes, advancing its beginning. */
+template <typename T> void read_bytes(const char *&first, const char *last, T *values, size_t n) {
+    if (n > size_t(last - first) / sizeof(T))
+        throw py::value_error("truncated compressed index");
+    std::memcpy(values, first, n * sizeof(T));
+    first += n * sizeof(T);
+}
+
+/** Returns the i-th of the width-bit integers packed in words, which must have a word of padding at the end. */
+inline uint64_t read_packed(const uint64_t *words, uint64_t width, size_t i) {
+    if (width == 0)
+        return 0;
+    auto bit = i * width;
+    auto offset = bit % 64;
+    auto value = words[bit / 64] >> offset;
+    if (offset + width > 64)
+        value |= words[bit / 64 + 1] << (64 - offset);
+    return width == 64 ? value : value & ((1ull << width) - 1);
+}
+
+/** Stores value as the i-th of the width-bit integers packed in words, which must be zero-initialised. */
+inline void write_packed(uint64_t *words, uint64_t width, size_t i, uint64_t value) {
+    if (width == 0)
+        return;
+    auto bit = i * width;
+    words[bit / 64] |= value << (bit % 64);
+    if (bit % 64 + width > 64)
+        words[bit / 64 + 1] |= value >> (64 - bit % 64);
+}
+
+/** Returns the position of the one of rank r in w, which must have more than r ones. */
+inline uint64_t select_in_word(uint64_t w, uint64_t r) {
+#if defined(__BMI2__)
+    return __builtin_ctzll(_pdep_u64(1ull << r, w));
+#else
+    uint64_t shift = 0;
+    for (auto ones = uint64_t(__builtin_popcountll(w & 0xFF)); ones <= r; ones = __builtin_popcountll(w & 0xFF)) {
+        r -= ones;
+        w >>= 8;
+        shift += 8;
+    }
+    for (; r > 0; --r)
+        w &= w - 1;
+    return shift + __builtin_ctzll(w);
+#endif
+}
+
+/** Returns the position in [lo, hi) of the first element > x (or >= x, if !Upper) of the sorted array first.
+ * Windows of a few elements are searched with the standard library, larger ones with a binary search whose loop
+ * has no data-dependent branch, and that prefetches the two candidate midpoints of the next step. */
+template <bool Upper, typename K> size_t window_bound(const K *first, size_t lo, size_t hi, K x) {
+    constexpr size_t min_branchless = 16;
+    if (hi - lo < min_branchless)
+        return (Upper ? std::upper_bound(first + lo, first + hi, x) : std::lower_bound(first + lo, first + hi, x)) -
+               first;
+
+    auto base = first + lo;
+    auto n = hi - lo;
+    while (n > 1) {
+        auto half = n / 2;
+        __builtin_prefetch(base + half / 2);
+        __builtin_prefetch(base + half + half / 2);
+        base = (Upper ? !(x < base[half]) : base[half] < x) ? base + half : base;
+        n -= half;
+    }
+    return (base - first) + (Upper ? !(x < *base) : *base < x);
+}
+
+/**
+ * The Morton (or Z-order) curve of points with the given number of dimensions, which maps a point to a 64-bit code
+ * by interleaving the bits of its coordinates, each of 64 / dimensions bits. Points close in space tend to have close
+ * codes, so that the points in a box are found by searching a few ranges of the sorted codes.
+ */
+struct MortonCurve {
+    size_t dimensions;
+    size_t bits;            ///< The number of bits of each coordinate.
+    uint64_t masks[64] = {}; ///< The positions of the bits of each coordinate in a code.
+
+    explicit MortonCurve(size_t dimensions) : dimensions(dimensions), bits(64 / checked(dimensions)) {
+        for (size_t i = 0; i < bits * dimensions; ++i)
+            masks[i % dimensions] |= 1ull << i;
+    }
+
+    static size_t checked(size_t dimensions) {
+        if (dimensions == 0 || dimensions > 64)
+            throw py::value_error("the number of dimensions must be between 1 and 64");
+        return dimensions;
+    }
+
+    uint64_t encode(const uint64_t *coordinates) const {
+        uint64_t code = 0;
+        for (size_t j = 0; j < dimensions; ++j) {
+            if (bits < 64 && coordinates[j] >> bits)
+                throw py::value_error("coordinates must fit in " + std::to_string(bits) + " bits");
+#if defined(__BMI2__)
+            code |= _pdep_u64(coordinates[j], masks[j]);
+#else
+            for (size_t i = 0; i < bits; ++i)
+                code |= ((coordinates[j] >> i) & 1) << (i * dimensions + j);
+#endif
+        }
+        return code;
+    }
+
+    /** Returns whether the point of the given code is in the box with corners of codes zmin and zmax. */
+    bool in_box(uint64_t z, uint64_t zmin, uint64_t zmax) const {
+        // The bits of a coordinate keep their order in the code, so coordinates compare as their masked codes
+        for (size_t j = 0; j < dimensions; ++j)
+            if ((z & masks[j]) < (zmin & masks[j]) || (z & masks[j]) > (zmax & masks[j]))
+                return false;
+        return true;
+    }
+
+    /**
+     * Returns the smallest code greater than z of a point in the box with corners of codes zmin and zmax, given that
+     * zmin < z < zmax and that the point of z is outside the box (the BIGMIN of Tropf and Herzog).
+     */
+    uint64_t next_in_box(uint64_t z, uint64_t zmin, uint64_t zmax) const {
+        auto next = zmax;
+        for (auto bit = bits * dimensions; bit-- > 0;) {
+            auto mask = 1ull << bit;
+            auto lower = masks[bit % dimensions] & (mask - 1);
+            auto z_bit = (z & mask) != 0;
+            auto min_bit = (zmin & mask) != 0;
+            auto max_bit = (zmax & mask) != 0;
+            if (!z_bit && !min_bit && max_bit) {
+                // Split the box along this coordinate: z is in the lower half, the answer may be in either
+                next = (zmin | mask) & ~lower;
+                zmax = (zmax & ~mask) | lower;
+            } else if (!z_bit && min_bit && max_bit) {
+                return zmin;
+            } else if (z_bit && !min_bit && !max_bit) {
+                return next;
+            } else if (z_bit && !min_bit && max_bit) {
+                zmin = (zmin | mask) & ~lower;
+            }
+        }
+        return next;
+    }
+};
+
+/** A vector of unsigned integers, each stored in the minimum number of bits needed by the largest one. */
+class PackedInts {
+    std::vector<uint64_t> words;
+    uint64_t width = 0;
+
+  public:
+    PackedInts() = default;
+
+    explicit PackedInts(const std::vector<uint64_t> &values) {
+        auto max = values.empty() ? 0 : *std::max_element(values.begin(), values.end());
+        width = max ? 64 - __builtin_clzll(max) : 0;
+        // The last word is padding, so that operator[] can always read two words
+        words.resize(values.size() * width / 64 + 2);
+        for (size_t i = 0; i < values.size(); ++i)
+            write_packed(words.data(), width, i, values[i]);
+    }
+
+    uint64_t operator[](size_t i) const { return read_packed(words.data(), width, i); }
+
+    uint64_t bit_width() const { return width; }
+
+    bool can_hold(size_t n) const { return words.size() >= n * width / 64 + 2; }
+
+    size_t size_in_bytes() const { return words.size() * sizeof(uint64_t) + sizeof(*this); }
+
+    void serialize(std::string &out) const {
+        uint64_t header[2] = {width, words.size()};
+        append_bytes(out, header, 2);
+        append_bytes(out, words.data(), words.size());
+    }
+
+    void deserialize(const char *&first, const char *last) {
+        uint64_t header[2];
+        read_bytes(first, last, header, 2);
+        if (header[0] > 64 || header[1] < 2)
+            throw py::value_error("invalid compressed index");
+        width = header[0];
+        words.resize(header[1]);
+        read_bytes(first, last, words.data(), words.size());
+    }
+};
+
+/**
+ * A non-decreasing sequence of integers in the Elias-Fano representation. Each value, minus the first one, is split
+ * into its low_width least significant bits, which are bit-packed, and its remaining high bits, which are stored in
+ * unary as the gaps between the ones of a bitvector. This takes 2 + log(u/n) bits per value, where u is the
+ * difference between the last and the first value, plus one bit per value for a sample of the positions of the ones.
+ *
+ * The whole representation is a single array of 64-bit words, so that it can be serialised as is, and used in place
+ * from a buffer, such as a memory-mapped file.
+ */
+template <typename K> class EliasFano {
+    enum { N, BASE, LOW_WIDTH, UPPER_BITS, LOWER_WORDS, UPPER_WORDS, SAMPLES, HEADER_WORDS };
+    static constexpr size_t SAMPLING = 64; ///< Every SAMPLING-th one of the upper bits has its position sampled.
+
+    std::vector<uint64_t> storage; ///< The words, unless they are borrowed from a buffer.
+    const uint64_t *words = nullptr;
+    size_t n_words = 0;
+    const uint64_t *lower = nullptr;
+    const uint64_t *upper = nullptr;
+    const uint64_t *samples = nullptr;
+    size_t n = 0;
+    uint64_t base = 0;
+    uint64_t low_width = 0;
+    uint64_t upper_bits = 0;
+
+    /** Maps the elements to unsigned integers, preserving their order. */
+    static uint64_t to_unsigned(K x) {
+        if constexpr (std::is_signed_v<K>)
+            return uint64_t(int64_t(x)) ^ (1ull << 63);
+        return uint64_t(x);
+    }
+
+    static K from_unsigned(uint64_t x) {
+        if constexpr (std::is_signed_v<K>)
+            return K(int64_t(x ^ (1ull << 63)));
+        return K(x);
+    }
+
+    /** Sets the pointers to the parts of the representation, after checking that words holds a valid one. */
+    void bind(const uint64_t *first, size_t size) {
+        // Only the sizes and the last one are checked, so that using a memory-mapped representation takes constant time
+        auto h = first;
+        if (size < HEADER_WORDS || h[LOW_WIDTH] > 63 || h[LOWER_WORDS] > size || h[UPPER_WORDS] > size
+            || h[SAMPLES] > size || HEADER_WORDS + h[LOWER_WORDS] + h[UPPER_WORDS] + h[SAMPLES] != size
+            || h[UPPER_WORDS] != h[UPPER_BITS] / 64 + 1 || h[UPPER_BITS] <= h[N]
+            || h[LOWER_WORDS] < h[N] * h[LOW_WIDTH] / 64 + 2 || h[SAMPLES] != (h[N] + SAMPLING - 1) / SAMPLING)
+            throw py::value_error("invalid packed elements");
+        words = first;
+        n_words = size;
+        n = h[N];
+        base = h[BASE];
+        low_width = h[LOW_WIDTH];
+        upper_bits = h[UPPER_BITS];
+        lower = words + HEADER_WORDS;
+        upper = lower + h[LOWER_WORDS];
+        samples = upper + h[UPPER_WORDS];
+        // The one of the last value must be the last bit but one, so that scanning for ones stops within the words
+        auto last = upper_bits - 2;
+        if (n && (samples[n_samples() - 1] >= upper_bits || (upper[last / 64] >> (last % 64) & 1) == 0))
+            throw py::value_error("invalid packed elements");
+    }
+
+    size_t n_samples() const { return (n + SAMPLING - 1) / SAMPLING; }
+
+    /** Returns the position in the upper bits of the one of the i-th value. */
+    uint64_t select(size_t i) const {
+        auto pos = samples[i / SAMPLING];
+        auto rank = i % SAMPLING;
+        auto word = pos / 64;
+        auto w = upper[word] & (~0ull << (pos % 64));
+        for (auto ones = uint64_t(__builtin_popcountll(w)); ones <= rank; ones = __builtin_popcountll(w)) {
+            rank -= ones;
+            w = upper[++word];
+        }
+        return word * 64 + select_in_word(w, rank);
+    }
+
+    uint64_t next_one(uint64_t pos) const {
+        ++pos;
+        auto word = pos / 64;
+        auto w = upper[word] & (~0ull << (pos % 64));
+        while (w == 0)
+            w = upper[++word];
+        return word * 64 + __builtin_ctzll(w);
+    }
+
+    uint64_t prev_one(uint64_t pos) const {
+        auto word = pos / 64;
+        auto w = pos % 64 ? upper[word] & (~0ull >> (64 - pos % 64)) : 0;
+        while (w == 0)
+            w = upper[--word];
+        return word * 64 + 63 - __builtin_clzll(w);
+    }
+
+    K value(size_t i, uint64_t pos) const {
+        return from_unsigned((((pos - i) << low_width) | read_packed(lower, low_width, i)) + base);
+    }
+
+  public:
+    /** A random-access iterator, which decodes the values on the fly. Incrementing and decrementing it is cheaper
+     * than moving it by an arbitrary offset. */
+    class const_iterator {
+        const EliasFano *ef = nullptr;
+        size_t i = 0;
+        uint64_t pos = 0; ///< The position of the one of the i-th value, or upper_bits if i == n.
+
+      public:
+        using iterator_category = std::random_access_iterator_tag;
+        using value_type = K;
+        using difference_type = std::ptrdiff_t;
+        using pointer = const K *;
+        using reference = K;
+
+        const_iterator() = default;
+
+        const_iterator(const EliasFano *ef, size_t i) : ef(ef), i(i), pos(i < ef->n ? ef->select(i) : ef->upper_bits) {}
+
+        K operator*() const { return ef->value(i, pos); }
+
+        K operator[](difference_type d) const { return *(*this + d); }
+
+        const_iterator &operator++() {
+            pos = ++i < ef->n ? ef->next_one(pos) : ef->upper_bits;
+            return *this;
+        }
+
+        const_iterator &operator--() {
+            pos = ef->prev_one(pos);
+            --i;
+            return *this;
+        }
+
+        const_iterator operator++(int) {
+            auto tmp = *this;
+            ++*this;
+            return tmp;
+        }
+
+        const_iterator operator--(int) {
+            auto tmp = *this;
+            --*this;
+            return tmp;
+        }
+
+        const_iterator &operator+=(difference_type d) { return *this = const_iterator(ef, i + d); }
+
+        const_iterator &operator-=(difference_type d) { return *this = const_iterator(ef, i - d); }
+
+        const_iterator operator+(difference_type d) const { return const_iterator(ef, i + d); }
+
+        const_iterator operator-(difference_type d) const { return const_iterator(ef, i - d); }
+
+        difference_type operator-(const const_iterator &other) const { return difference_type(i - other.i); }
+
+        bool operator==(const const_iterator &other) const { return i == other.i; }
+        bool operator!=(const const_iterator &other) const { return i != other.i; }
+        bool operator<(const const_iterator &other) const { return i < other.i; }
+        bool operator>(const const_iterator &other) const { return i > other.i; }
+        bool operator<=(const const_iterator &other) const { return i <= other.i; }
+        bool operator>=(const const_iterator &other) const { return i >= other.i; }
+    };
+
+    /** Encodes the given sorted values. */
+    EliasFano(const K *first, size_t size) {
+        auto u = size ? to_unsigned(first[size - 1]) - to_unsigned(first[0]) : 0;
+        uint64_t width = size && u / size > 1 ? 63 - __builtin_clzll(u / size) : 0;
+        uint64_t bits = size + (u >> width) + 1;
+        uint64_t lower_words = size * width / 64 + 2;
+        uint64_t upper_words = bits / 64 + 1;
+        uint64_t sampled = (size + SAMPLING - 1) / SAMPLING;
+        storage.resize(HEADER_WORDS + lower_words + upper_words + sampled);
+        auto h = storage.data();
+        h[N] = size;
+        h[BASE] = size ? to_unsigned(first[0]) : 0;
+        h[LOW_WIDTH] = width;
+        h[UPPER_BITS] = bits;
+        h[LOWER_WORDS] = lower_words;
+        h[UPPER_WORDS] = upper_words;
+        h[SAMPLES] = sampled;
+
+        auto lo = h + HEADER_WORDS;
+        auto up = lo + lower_words;
+        auto sa = up + upper_words;
+        for (size_t i = 0; i < size; ++i) {
+            auto v = to_unsigned(first[i]) - h[BASE];
+            auto pos = (v >> width) + i;
+            write_packed(lo, width, i, width ? v & ((1ull << width) - 1) : 0);
+            up[pos / 64] |= 1ull << (pos % 64);
+            if (i % SAMPLING == 0)
+                sa[i / SAMPLING] = pos;
+        }
+        bind(storage.data(), storage.size());
+    }
+
+    /** Uses in place the representation in the given 8-byte aligned words, which must outlive this object. */
+    EliasFano(const char *first, size_t n_words) { bind(reinterpret_cast<const uint64_t *>(first), n_words); }
+
+    /** Copies the representation in the given words. */
+    explicit EliasFano(std::vector<uint64_t> &&words) : storage(std::move(words)) {
+        bind(storage.data(), storage.size());
+    }
+
+    EliasFano(const EliasFano &) = delete;
+
+    EliasFano &operator=(const EliasFano &) = delete;
+
+    /** Returns the number of words of the representation at first, given that at most size words follow it. */
+    static size_t words_count(const char *first, size_t size) {
+        uint64_t h[HEADER_WORDS];
+        if (size < HEADER_WORDS)
+            throw py::value_error("invalid packed elements");
+        std::memcpy(h, first, sizeof(h));
+        if (h[LOWER_WORDS] > size || h[UPPER_WORDS] > size || h[SAMPLES] > size
+            || HEADER_WORDS + h[LOWER_WORDS] + h[UPPER_WORDS] + h[SAMPLES] > size)
+            throw py::value_error("invalid packed elements");
+        return HEADER_WORDS + h[LOWER_WORDS] + h[UPPER_WORDS] + h[SAMPLES];
+    }
+
+    K operator[](size_t i) const { return value(i, select(i)); }
+
+    /**
+     * Returns the position of the first value > x (or >= x, if !Upper), given that it is at least lo. The values
+     * whose high bits are smaller than those of x are skipped by counting the zeros of the upper bits, which end the
+     * groups of values sharing the same high bits, so only the values with the same high bits as x are decoded.
+     */
+    template <bool Upper> size_t bound(size_t lo, K x) const {
+        auto before = [&](K e) { return Upper ? !(x < e) : e < x; };
+        auto ux = to_unsigned(x);
+        if (lo >= n || ux < base)
+            return std::min(lo, n);
+
+        auto high = (ux - base) >> low_width;
+        if (high >= upper_bits - n)
+            return n; // all the values have smaller high bits
+        auto i = lo;
+        auto pos = select(lo);
+        if (pos - lo < high) {
+            // Find the high-th zero, after which the values have high bits >= high
+            auto to_skip = high - (pos - lo);
+            auto word = pos / 64;
+            auto w = ~upper[word] & (~0ull << (pos % 64));
+            for (auto zeros = uint64_t(__builtin_popcountll(w)); zeros < to_skip; zeros = __builtin_popcountll(w)) {
+                to_skip -= zeros;
+                w = ~upper[++word];
+            }
+            auto zero = word * 64 + select_in_word(w, to_skip - 1);
+            i = zero + 1 - high;
+            pos = next_one(zero);
+        }
+        while (i < n && before(value(i, pos)) && ++i < n)
+            pos = next_one(pos);
+        return i;
+    }
+
+    size_t size() const { return n; }
+
+    const_iterator begin() const { return const_iterator(this, 0); }
+
+    const_iterator end() const { return const_iterator(this, n); }
+
+    const uint64_t *data() const { return words; }
+
+    size_t size_in_words() const { return n_words; }
+
+    size_t size_in_bytes() const { return n_words * sizeof(uint64_t) + sizeof(*this); }
+};
 
 template <typename K> class PGMWrapper : private pgm::PGMIndex<K, IGNORED_PARAMETER, EPSILON_RECURSIVE, double> {
-    std::vector<K> data;
+    using Segment = typename pgm::PGMIndex<K, IGNORED_PARAMETER, EPSILON_RECURSIVE, double>::Segment;
+
+    std::vector<K> data;         ///< The elements, unless they are borrowed from the buffer of data_owner.
+    py::object data_owner;       ///< The object holding the elements, when they are not stored in data.
+    const K *elements = nullptr; ///< Pointer to the first element, either in data or in data_owner.
+    size_t n_elements = 0;       ///< The number of elements.
+    std::shared_ptr<const EliasFano<K>> packed_data; ///< The elements, if packed, in which case elements is null.
     bool duplicates;
     size_t epsilon = 64;
+    size_t epsilon_recursive = EPSILON_RECURSIVE;
+    bool compressed = false;
+
+    /**
+     * The last level of a compressed index. Like in the upstream CompressedPGMIndex, segments whose ranges of feasible
+     * slopes overlap share a slope from a small table, so that each segment stores just the index of its slope, and
+     * the intercepts are bit-packed. The upper levels are a regular index on the keys of these segments.
+     */
+    struct CompressedLevel {
+        std::vector<K> keys;        ///< The first key of each segment, followed by a sentinel.
+        std::vector<double> slopes; ///< The distinct slopes of the segments.
+        PackedInts slope_ids;       ///< The index in slopes of the slope of each segment.
+        PackedInts intercepts;      ///< The intercept of each segment and of the sentinel, minus intercept_bias.
+        int64_t intercept_bias = 0;
+
+        size_t size() const { return keys.empty() ? 0 : keys.size() - 1; }
+
+        double slope(size_t i) const { return slopes[slope_ids[i]]; }
+
+        int64_t intercept(size_t i) const { return int64_t(intercepts[i]) + intercept_bias; }
+
+        size_t operator()(size_t i, K k) const {
+            auto pos = int64_t(slope(i) * double(k - keys[i])) + intercept(i);
+            return pos > 0 ? size_t(pos) : 0ull;
+        }
+
+        size_t size_in_bytes() const {
+            return keys.size() * sizeof(K) + slopes.size() * sizeof(double) + slope_ids.size_in_bytes()
+                   + intercepts.size_in_bytes() + sizeof(intercept_bias);
+        }
+
+        std::string serialize() const {
+            std::string out;
+            uint64_t header[3] = {keys.size(), slopes.size(), uint64_t(intercept_bias)};
+            append_bytes(out, header, 3);
+            append_bytes(out, keys.data(), keys.size());
+            append_bytes(out, slopes.data(), slopes.size());
+            slope_ids.serialize(out);
+            intercepts.serialize(out);
+            return out;
+        }
 
-    void build_internal_pgm() {
+        void deserialize(const char *first, const char *last) {
+            uint64_t header[3];
+            read_bytes(first, last, header, 3);
+            if (header[0] < 2 || header[1] == 0)
+                throw py::value_error("invalid compressed index");
+            keys.resize(header[0]);
+            slopes.resize(header[1]);
+            intercept_bias = int64_t(header[2]);
+            read_bytes(first, last, keys.data(), keys.size());
+            read_bytes(first, last, slopes.data(), slopes.size());
+            slope_ids.deserialize(first, last);
+            intercepts.deserialize(first, last);
+            if (!slope_ids.can_hold(size()) || !intercepts.can_hold(keys.size()))
+                throw py::value_error("invalid compressed index");
+            for (size_t i = 0; i < size(); ++i)
+                if (slope_ids[i] >= slopes.size())
+                    throw py::value_error("invalid compressed index");
+        }
+    };
+
+    CompressedLevel leaf; ///< The last level of the index, if compressed.
+
+    /**
+     * Whether search uses a radix table instead of the upper levels of the index. Entry p of the table is the first
+     * segment of the last level whose key has prefix >= p, where the prefix of a key k is given by radix_prefix, so
+     * that the segment responsible for k is found with a binary search among the few segments between entries p and
+     * p + 1. The table is derived from the last level, so it is rebuilt rather than saved.
+     */
+    bool radix = false;
+    std::vector<uint32_t> radix_table;
+    unsigned radix_shift = 0; ///< For integer keys, the prefix of k is (k - first_key) >> radix_shift.
+    double radix_scale = 0;   ///< For floating-point keys, the prefix of k is (k - first_key) * radix_scale.
+
+    /**
+     * Counters of the searches in the index, kept only if instrumentation is enabled. They are updated with relaxed
+     * atomic operations, so that queries answered by many threads at once are all counted. The histograms have an
+     * entry for each bit width of the counted values, that is, entry i counts the values in [2^(i-1), 2^i).
+     */
+    struct QueryCounters {
+        std::atomic<uint64_t> searches{0};
+        std::atomic<uint64_t> levels{0};         ///< The total number of levels traversed.
+        std::atomic<uint64_t> total_error{0};    ///< The total distance between predicted and true positions.
+        std::atomic<uint64_t> max_error{0};
+        std::atomic<uint64_t> out_of_window{0};  ///< The searches whose true position was outside the window.
+        std::array<std::atomic<uint64_t>, 65> window_histogram{};
+        std::array<std::atomic<uint64_t>, 65> error_histogram{};
+        std::vector<std::atomic<uint64_t>> segment_searches; ///< The searches in each segment of the last level.
+        std::vector<std::atomic<uint64_t>> segment_errors;   ///< The total error of the searches in each segment.
+
+        explicit QueryCounters(size_t n_segments) : segment_searches(n_segments), segment_errors(n_segments) {}
+
+        /** Returns counters with the totals of other, for an index with n_segments segments in its last level. */
+        QueryCounters(const QueryCounters &other, size_t n_segments) : QueryCounters(n_segments) {
+            searches = other.searches.load();
+            levels = other.levels.load();
+            total_error = other.total_error.load();
+            max_error = other.max_error.load();
+            out_of_window = other.out_of_window.load();
+            for (size_t i = 0; i < window_histogram.size(); ++i) {
+                window_histogram[i] = other.window_histogram[i].load();
+                error_histogram[i] = other.error_histogram[i].load();
+            }
+        }
+
+        static size_t bit_width(uint64_t x) { return x ? 64 - __builtin_clzll(x) : 0; }
+
+        void record(size_t levels_traversed, size_t segment, const pgm::ApproxPos &range, size_t pos) {
+            constexpr auto relaxed = std::memory_order_relaxed;
+            auto error = uint64_t(pos > range.pos ? pos - range.pos : range.pos - pos);
+            searches.fetch_add(1, relaxed);
+            levels.fetch_add(levels_traversed, relaxed);
+            total_error.fetch_add(error, relaxed);
+            for (auto max = max_error.load(relaxed); error > max && !max_error.compare_exchange_weak(max, error);)
+                continue;
+            if (pos < range.lo || pos > range.hi)
+                out_of_window.fetch_add(1, relaxed);
+            window_histogram[bit_width(range.hi - range.lo)].fetch_add(1, relaxed);
+            error_histogram[bit_width(error)].fetch_add(1, relaxed);
+            if (segment < segment_searches.size()) {
+                segment_searches[segment].fetch_add(1, relaxed);
+                segment_errors[segment].fetch_add(error, relaxed);
+            }
+        }
+
+        py::dict to_dict() const {
+            auto histogram = [](auto &h) {
+                std::vector<uint64_t> out(h.begin(), h.end());
+                while (!out.empty() && out.back() == 0)
+                    out.pop_back();
+                return out;
+            };
+            auto array = [](auto &v) {
+                std::vector<uint64_t> values(v.begin(), v.end());
+                return py::array_t<uint64_t>(values.size(), values.data());
+            };
+            py::dict out;
+            out["searches"] = searches.load();
+            out["levels traversed"] = levels.load();
+            out["mean error"] = searches ? double(total_error) / double(searches) : 0.;
+            out["max error"] = max_error.load();
+            out["out of window"] = out_of_window.load();
+            out["window histogram"] = histogram(window_histogram);
+            out["error histogram"] = histogram(error_histogram);
+            out["segment searches"] = array(segment_searches);
+            out["segment errors"] = array(segment_errors);
+            return out;
+        }
+    };
+
+    std::shared_ptr<QueryCounters> counters; ///< The counters of the searches, if instrumentation is enabled.
+
+    /**
+     * A sorted multiset of pending insertions or deletions, organised with the logarithmic method: a small sorted
+     * buffer, plus sorted runs whose maximum size doubles from one to the next, each indexed by a PGMWrapper. When the
+     * buffer fills up, it is merged with the smallest runs into the first empty run that can hold the result. Runs are
+     * never modified, so they can be shared between copies, and their elements are never packed.
+     */
+    class Runs {
+        std::vector<std::shared_ptr<const PGMWrapper>> runs; ///< runs[i] is null or has <= capacity(i) elements.
+        std::vector<K> buffer;
+        size_t n = 0;
+
+        static size_t capacity(size_t i) { return size_t(UPDATES_BUFFER_CAPACITY) << (i + 1); }
+
+        static void append_merge(std::vector<K> &out, const K *first, const K *last) {
+            auto mid = out.size();
+            out.insert(out.end(), first, last);
+            std::inplace_merge(out.begin(), out.begin() + mid, out.end());
+        }
+
+        void cascade(std::vector<K> &&carry, size_t epsilon, size_t epsilon_recursive) {
+            for (size_t i = 0;; ++i) {
+                if (i == runs.size())
+                    runs.emplace_back();
+                if (runs[i]) {
+                    append_merge(carry, runs[i]->begin(), runs[i]->end());
+                    runs[i].reset();
+                } else if (carry.size() <= capacity(i)) {
+                    // Built with the GIL held, so that no thread can observe the runs while they are being merged
+                    runs[i] = std::make_shared<const PGMWrapper>(std::move(carry), true, epsilon, epsilon_recursive,
+                                                                 false, false, false, false);
+                    return;
+                }
+            }
+        }
+
+      public:
+        size_t size() const { return n; }
+
+        bool empty() const { return n == 0; }
+
+        void insert(K x, size_t epsilon, size_t epsilon_recursive) {
+            buffer.insert(std::upper_bound(buffer.begin(), buffer.end(), x), x);
+            ++n;
+            if (buffer.size() >= UPDATES_BUFFER_CAPACITY)
+                cascade(std::exchange(buffer, {}), epsilon, epsilon_recursive);
+        }
+
+        void insert_sorted(std::vector<K> &&sorted, size_t epsilon, size_t epsilon_recursive) {
+            n += sorted.size();
+            append_merge(sorted, buffer.data(), buffer.data() + buffer.size());
+            buffer.clear();
+            if (sorted.size() < UPDATES_BUFFER_CAPACITY)
+                buffer = std::move(sorted);
+            else
+                cascade(std::move(sorted), epsilon, epsilon_recursive);
+        }
+
+        bool erase_from_buffer(K x) {
+            auto it = std::lower_bound(buffer.begin(), buffer.end(), x);
+            if (it == buffer.end() || *it != x)
+                return false;
+            buffer.erase(it);
+            --n;
+            return true;
+        }
+
+        size_t erase_range_from_buffer(K a, K b, std::pair<bool, bool> inclusive) {
+            auto [l, r] = sorted_range(buffer.data(), buffer.data() + buffer.size(), a, b, inclusive);
+            auto erased = size_t(r - l);
+            buffer.erase(buffer.begin() + (l - buffer.data()), buffer.begin() + (r - buffer.data()));
+            n -= erased;
+            return erased;
+        }
+
+        bool contains(K x) const {
+            if (std::binary_search(buffer.begin(), buffer.end(), x))
+                return true;
+            for (auto &run : runs)
+                if (run && run->contains(x))
+                    return true;
+            return false;
+        }
+
+        size_t count_less(K x) const {
+            size_t count = std::lower_bound(buffer.begin(), buffer.end(), x) - buffer.begin();
+            for (auto &run : runs)
+                if (run)
+                    count += run->lower_bound(x);
+            return count;
+        }
+
+        size_t count_less_equal(K x) const {
+            size_t count = std::upper_bound(buffer.begin(), buffer.end(), x) - buffer.begin();
+            for (auto &run : runs)
+                if (run)
+                    count += run->upper_bound(x);
+            return count;
+        }
+
+        /** Updates best with the smallest element >= x (or > x, if strict), if it is smaller. */
+        void next_candidate(K x, bool strict, std::optional<K> &best) const {
+            auto consider = [&](const K *it, const K *last) {
+                if (it != last && (!best || *it < *best))
+                    best = *it;
+            };
+            auto first = buffer.data();
+            auto last = first + buffer.size();
+            consider(strict ? std::upper_bound(first, last, x) : std::lower_bound(first, last, x), last);
+            for (auto &run : runs)
+                if (run)
+                    consider(run->begin() + (strict ? run->upper_bound(x) : run->lower_bound(x)), run->end());
+        }
+
+        /** Updates best with the largest element <= x (or < x, if strict), if it is larger. */
+        void prev_candidate(K x, bool strict, std::optional<K> &best) const {
+            auto consider = [&](const K *first, const K *it) {
+                if (it != first && (!best || *best < *(it - 1)))
+                    best = *(it - 1);
+            };
+            auto first = buffer.data();
+            auto last = first + buffer.size();
+            consider(first, strict ? std::lower_bound(first, last, x) : std::upper_bound(first, last, x));
+            for (auto &run : runs)
+                if (run)
+                    consider(run->begin(), run->begin() + (strict ? run->lower_bound(x) : run->upper_bound(x)));
+        }
+
+        /** Calls f(first, last) for the buffer and each run. */
+        template <typename F> void for_each_sequence(F f) const {
+            f(buffer.data(), buffer.data() + buffer.size());
+            for (auto &run : runs)
+                if (run)
+                    f(run->begin(), run->end());
+        }
+
+        /** Merges into out the elements in the given range, optionally excluding the ones in the buffer. */
+        void collect_range(K a, K b, std::pair<bool, bool> inclusive, bool with_buffer, std::vector<K> &out) const {
+            if (with_buffer) {
+                auto [l, r] = sorted_range(buffer.data(), buffer.data() + buffer.size(), a, b, inclusive);
+                append_merge(out, l, r);
+            }
+            for (auto &run : runs) {
+                if (run) {
+                    auto [l, r] = run->range_positions(a, b, inclusive);
+                    append_merge(out, run->begin() + l, run->begin() + r);
+                }
+            }
+        }
+
+        std::vector<K> to_vector() const {
+            std::vector<K> out;
+            out.reserve(n);
+            out = buffer;
+            for (auto &run : runs)
+                if (run)
+                    append_merge(out, run->begin(), run->end());
+            return out;
+        }
+    };
+
+    /// The elements are the plain or packed ones, plus the insertions, minus the deletions. The former are
+    /// never modified after construction; updates go to the two Runs objects, which are protected by mutex against
+    /// concurrent readers not holding the GIL.
+    Runs insertions;
+    Runs deletions;
+    mutable std::shared_mutex mutex;
+
+    /// Whether the index has been built. The results of set operations, merges and slices defer building it until
+    /// the first query that needs it, see ensure_index(), as they are often only iterated, exported or combined.
+    mutable std::atomic<bool> indexed{true};
+    mutable std::mutex index_mutex;
+
+    void bind_data() {
+        elements = data.data();
+        n_elements = data.size();
+    }
+
+    void build_internal_pgm(bool release_gil = true) {
         this->n = size();
         if (this->n == 0) {
             this->first_key = 0;
+            radix_table.clear();
             return;
         }
-        this->first_key = data.front();
-        if (this->n < 1ull << 15)
-            this->build(begin(), end(), epsilon, EPSILON_RECURSIVE, this->segments, this->levels_offsets);
+        this->first_key = (*this)[0];
+        auto build = [&] {
+            ThreadsScope threads;
+            with_elements([&](auto first, auto last) {
+                if (compressed)
+                    build_compressed_pgm(first, last);
+                else
+                    this->build(first, last, epsilon, epsilon_recursive, this->segments, this->levels_offsets);
+            });
+            build_radix_table();
+        };
+        if (!release_gil || this->n < 1ull << 15)
+            build();
         else {
             py::gil_scoped_release release;
-            this->build(begin(), end(), epsilon, EPSILON_RECURSIVE, this->segments, this->levels_offsets);
+            build();
+        }
+    }
+
+    size_t leaf_segments_count() const { return compressed ? leaf.size() : this->segments_count(); }
+
+    K leaf_segment_key(size_t i) const { return compressed ? leaf.keys[i] : this->segments[i].key; }
+
+    size_t radix_prefix(K k) const {
+        auto max_prefix = radix_table.size() - 2;
+        if constexpr (std::is_integral_v<K>) {
+            using U = std::make_unsigned_t<K>;
+            return std::min<size_t>((U(k) - U(this->first_key)) >> radix_shift, max_prefix);
+        } else {
+            auto prefix = (double(k) - double(this->first_key)) * radix_scale;
+            return prefix < double(max_prefix) ? size_t(prefix) : max_prefix;
+        }
+    }
+
+    void build_radix_table() {
+        radix_table.clear();
+        auto count = leaf_segments_count();
+        if (!radix || count < 2)
+            return;
+
+        // About two entries per segment, so that most ranges between consecutive entries span at most one segment
+        unsigned bits = 1;
+        while (bits < RADIX_TABLE_MAX_BITS && (size_t(1) << bits) < 2 * count)
+            ++bits;
+        auto prefixes = size_t(1) << bits;
+        auto last_key = leaf_segment_key(count - 1);
+        if constexpr (std::is_integral_v<K>) {
+            using U = std::make_unsigned_t<K>;
+            auto range = U(last_key) - U(this->first_key);
+            radix_shift = 0;
+            while ((range >> radix_shift) >= prefixes)
+                ++radix_shift;
+        } else {
+            auto range = double(last_key) - double(this->first_key);
+            radix_scale = range > 0 ? double(prefixes - 1) / range : 0;
+        }
+
+        radix_table.resize(prefixes + 1);
+        size_t i = 0;
+        for (size_t p = 0; p < radix_table.size(); ++p) {
+            while (i < count && radix_prefix(leaf_segment_key(i)) < p)
+                ++i;
+            radix_table[p] = uint32_t(i);
+        }
+    }
+
+    /** Returns the segment of the last level responsible for k >= first_key, using the radix table. */
+    size_t radix_segment(K k) const {
+        auto p = radix_prefix(k);
+        size_t lo = radix_table[p];
+        size_t hi = radix_table[p + 1];
+        // The segments before lo have keys <= k, and those from hi onwards have keys > k
+        while (lo < hi) {
+            auto mid = lo + (hi - lo) / 2;
+            if (leaf_segment_key(mid) <= k)
+                lo = mid + 1;
+            else
+                hi = mid;
+        }
+        return lo ? lo - 1 : 0;
+    }
+
+    template <typename It> void build_compressed_pgm(It first, It last) {
+        using CanonicalSegment = typename pgm::internal::OptimalPiecewiseLinearModel<K, size_t>::CanonicalSegment;
+
+        // Segment the elements as PGMIndex::build does for the last level, but keep the canonical segments
+        auto ignore_last = *std::prev(last) == std::numeric_limits<K>::max(); // max() is the sentinel value
+        auto last_n = size() - ignore_last;
+        std::vector<CanonicalSegment> canonical;
+        auto in_fun = pgm::internal::first_level_in_fun<K, It>(first, size());
+        auto out_fun = [&](const auto &cs) { canonical.push_back(cs); };
+        pgm::internal::make_segmentation_par(last_n, epsilon, in_fun, out_fun);
+
+        // Pick the minimum number of slopes such that each segment's range of feasible slopes contains one of them,
+        // by scanning the ranges in order of their lower end and closing a group when a range does not overlap with
+        // the intersection of the group
+        auto m = canonical.size();
+        std::vector<std::pair<long double, long double>> ranges(m);
+        std::vector<size_t> order(m);
+        for (size_t i = 0; i < m; ++i)
+            ranges[i] = canonical[i].get_slope_range();
+        std::iota(order.begin(), order.end(), 0);
+        std::sort(order.begin(), order.end(), [&](auto i, auto j) { return ranges[i].first < ranges[j].first; });
+
+        std::vector<uint64_t> slope_ids(m);
+        leaf.slopes.clear();
+        for (size_t i = 0; i < m;) {
+            auto [lo, hi] = ranges[order[i]];
+            auto j = i + 1;
+            for (; j < m && ranges[order[j]].first <= hi; ++j) {
+                lo = ranges[order[j]].first;
+                hi = std::min(hi, ranges[order[j]].second);
+            }
+            for (; i < j; ++i)
+                slope_ids[order[i]] = leaf.slopes.size();
+            leaf.slopes.push_back(double((lo + hi) / 2));
+        }
+        if (leaf.slopes.empty())
+            leaf.slopes.push_back(0);
+
+        // Any line through the intersection point of a canonical segment with a slope in its range is feasible
+        std::vector<int64_t> intercepts(m + 1);
+        leaf.keys.resize(m + 1);
+        for (size_t i = 0; i < m; ++i) {
+            auto key = canonical[i].get_first_x();
+            auto [i_x, i_y] = canonical[i].get_intersection();
+            leaf.keys[i] = key;
+            intercepts[i] = std::llround(i_y - (i_x - key) * leaf.slopes[slope_ids[i]]);
+        }
+        if (m == 0) {
+            // Only the sentinel value was given
+            leaf.keys.insert(leaf.keys.begin(), *first);
+            intercepts.insert(intercepts.begin(), 0);
+            slope_ids.push_back(0);
+            ++m;
+        }
+        leaf.keys[m] = std::numeric_limits<K>::max();
+        intercepts[m] = last_n;
+
+        leaf.intercept_bias = *std::min_element(intercepts.begin(), intercepts.end());
+        std::vector<uint64_t> biased(intercepts.size());
+        for (size_t i = 0; i < intercepts.size(); ++i)
+            biased[i] = uint64_t(intercepts[i] - leaf.intercept_bias);
+        leaf.intercepts = PackedInts(biased);
+        leaf.slope_ids = PackedInts(slope_ids);
+
+        // Index the keys of the segments with the upper levels
+        this->build(leaf.keys.begin(), leaf.keys.begin() + m, epsilon_recursive, epsilon_recursive, this->segments,
+                    this->levels_offsets);
+    }
+
+    /** Returns the position of the first element > x (or >= x, if !Upper). */
+    template <bool Upper> size_t bound(K x) const {
+        if (!counters)
+            return bound<Upper>(x, search(x));
+        size_t segment;
+        auto range = search(x, &segment);
+        auto pos = bound<Upper>(x, range);
+        counters->record(radix_table.empty() ? index_height() : 1, segment, range, pos);
+        return pos;
+    }
+
+    /** Returns the position of the first element > x (or >= x, if !Upper), given its approximate position. */
+    template <bool Upper> size_t bound(K x, const pgm::ApproxPos &range) const {
+        if (packed_data)
+            return packed_data->template bound<Upper>(range.lo, x);
+
+        auto first = begin();
+        auto last = end();
+        auto it = first + window_bound<Upper>(first, range.lo, range.hi, x);
+
+        // The last segment underestimates the position of keys following a long run of duplicates
+        auto before = [&](K e) { return Upper ? !(x < e) : e < x; };
+        if (it < last && before(*it)) {
+            auto step = 1ull;
+            while (it + step < last && before(*(it + step)))
+                step *= 2;
+            auto end = std::min(it + step, last);
+            it = Upper ? std::upper_bound(it + step / 2, end, x) : std::lower_bound(it + step / 2, end, x);
+        }
+        return it - first;
+    }
+
+    static void check_epsilon_recursive(size_t epsilon_recursive) {
+        if (epsilon_recursive == 0)
+            throw py::value_error("epsilon_recursive must be at least 1");
+    }
+
+    static void check_packable(bool packed) {
+        if (packed && !std::is_integral_v<K>)
+            throw py::value_error("only containers of integers can be packed");
+    }
+
+    static std::shared_ptr<const EliasFano<K>> make_packed(const K *first, size_t n, bool release_gil = true) {
+        check_packable(true);
+        if (!release_gil || n < 1ull << 15)
+            return std::make_shared<const EliasFano<K>>(first, n);
+        py::gil_scoped_release release;
+        return std::make_shared<const EliasFano<K>>(first, n);
+    }
+
+    /** Replaces the plain elements with their packed representation. */
+    void pack_data(bool release_gil = true) {
+        packed_data = make_packed(elements, n_elements, release_gil);
+        std::vector<K>().swap(data);
+        elements = nullptr;
+    }
+
+    void sort_and_build(bool sorted, bool drop_duplicates, bool release_gil = true) {
+        if (release_gil && data.size() >= 1ull << 15) {
+            py::gil_scoped_release release;
+            sort_and_build(sorted, drop_duplicates, false);
+            return;
+        }
+
+        if (!sorted)
+            parallel_sort(data.data(), data.data() + data.size(), get_threads());
+        if (drop_duplicates) {
+            data.erase(std::unique(data.begin(), data.end()), data.end());
+            duplicates = false;
+        } else
+            duplicates = true;
+
+        data.shrink_to_fit();
+        bind_data();
+        build_internal_pgm(release_gil);
+    }
+
+    void borrow_or_copy(const py::buffer &owner, const K *first, size_t n) {
+        if (reinterpret_cast<uintptr_t>(first) % alignof(K) == 0) {
+            // Keep the buffer exported, and thus valid, for the lifetime of this object
+            data_owner = py::memoryview(owner);
+            elements = first;
+            n_elements = n;
+        } else {
+            data.resize(n);
+            std::memcpy(data.data(), first, n * sizeof(K));
+            bind_data();
+        }
+    }
+
+    void borrow_or_copy_packed(const py::buffer &owner, const char *first, size_t n_words) {
+        if (reinterpret_cast<uintptr_t>(first) % alignof(uint64_t) == 0) {
+            // As in borrow_or_copy, the packed representation is used in place
+            packed_data = std::make_shared<const EliasFano<K>>(first, n_words);
+            data_owner = py::memoryview(owner);
+        } else {
+            std::vector<uint64_t> words(n_words);
+            std::memcpy(words.data(), first, n_words * sizeof(uint64_t));
+            packed_data = std::make_shared<const EliasFano<K>>(std::move(words));
+        }
+        n_elements = packed_data->size();
+    }
+
+    /** Loads the segments and the levels offsets of the index, and returns false if they are not consistent. */
+    bool load_index(const char *segments_ptr, size_t n_segments, const char *levels_ptr, size_t n_levels) {
+        this->segments.resize(n_segments);
+        std::memcpy(this->segments.data(), segments_ptr, n_segments * sizeof(Segment));
+        this->levels_offsets.resize(n_levels);
+        for (size_t i = 0; i < n_levels; ++i) {
+            uint64_t offset;
+            std::memcpy(&offset, levels_ptr + i * 8, 8);
+            this->levels_offsets[i] = offset;
+        }
+        this->n = size();
+        this->first_key = size() ? (*this)[0] : 0;
+
+        // The queries walk the levels without bounds checks, so each level must be non-empty and within the segments,
+        // and the root level must have at most one segment plus its sentinel (only the sentinel if all the keys are
+        // max()). An empty container may keep the index of its former elements, which is never queried
+        auto &offsets = this->levels_offsets;
+        if (offsets.empty())
+            return n_segments == 0 && size() == 0;
+        if (offsets.size() < 2 || offsets.front() != 0 || offsets.back() != n_segments)
+            return false;
+        for (size_t i = 1; i < offsets.size(); ++i)
+            if (offsets[i] <= offsets[i - 1])
+                return false;
+        return offsets.back() - offsets[offsets.size() - 2] <= 2;
+    }
+
+    static bool is_sorted(const K *first, size_t n) {
+        // Branch-free so that the compiler can vectorise the loop
+        bool unsorted = false;
+        for (size_t i = 1; i < n; ++i)
+            unsorted |= first[i] < first[i - 1];
+        return !unsorted;
+    }
+
+    using copy_fun = void (*)(const char *, size_t, ssize_t, K *);
+
+    template <typename T> static void copy_buffer(const char *src, size_t n, ssize_t stride, K *out) {
+        if constexpr (std::is_same_v<T, K>) {
+            if (stride == sizeof(K)) {
+                std::memcpy(out, src, n * sizeof(K));
+                return;
+            }
+        }
+
+        if constexpr (std::is_floating_point_v<T> && std::is_integral_v<K>) {
+            // Casting a value that is not an integer in the range of K would truncate it, or be undefined behaviour
+            auto lowest = static_cast<T>(std::numeric_limits<K>::min());
+            auto limit = std::is_signed_v<K> ? -lowest : static_cast<T>(std::numeric_limits<K>::max()) + T(1);
+            for (size_t i = 0; i < n; ++i) {
+                T x;
+                std::memcpy(&x, src + i * stride, sizeof(T));
+                if (!std::isfinite(x) || x < lowest || !(x < limit) || std::trunc(x) != x)
+                    throw std::overflow_error("buffer contains values that can't be represented by the container type");
+            }
+        }
+
+        for (size_t i = 0; i < n; ++i) {
+            T x;
+            std::memcpy(&x, src + i * stride, sizeof(T));
+            out[i] = static_cast<K>(x);
+        }
+
+        if constexpr (std::is_integral_v<T> && std::is_integral_v<K> && !std::is_same_v<T, K>) {
+            // The values were cast to K: the conversion was lossless iff casting them back gives the original values
+            bool overflow = false;
+            for (size_t i = 0; i < n; ++i) {
+                T x;
+                std::memcpy(&x, src + i * stride, sizeof(T));
+                overflow |= static_cast<T>(out[i]) != x || ((x < T(0)) != (out[i] < K(0)));
+            }
+            if (overflow)
+                throw std::overflow_error("buffer contains values that can't be represented by the container type");
+        }
+    }
+
+    static copy_fun buffer_copier(const py::buffer_info &info) {
+        auto format = info.format;
+        const uint16_t one = 1;
+        auto little_endian = *reinterpret_cast<const uint8_t *>(&one) == 1;
+        auto native_order = format[0] == (little_endian ? '<' : '>');
+        if (format.size() == 2 && (format[0] == '@' || format[0] == '=' || native_order))
+            format = format.substr(1);
+        if (format.size() != 1)
+            throw py::type_error("unsupported buffer format '" + info.format + "'");
+
+        auto c = format[0];
+        auto size = info.itemsize;
+        if (std::strchr("bhilqn", c)) {
+            switch (size) {
+            case 1: return copy_buffer<int8_t>;
+            case 2: return copy_buffer<int16_t>;
+            case 4: return copy_buffer<int32_t>;
+            case 8: return copy_buffer<int64_t>;
+            }
+        } else if (std::strchr("BHILQN", c)) {
+            switch (size) {
+            case 1: return copy_buffer<uint8_t>;
+            case 2: return copy_buffer<uint16_t>;
+            case 4: return copy_buffer<uint32_t>;
+            case 8: return copy_buffer<uint64_t>;
+            }
+        } else if (c == 'f' && size == sizeof(float))
+            return copy_buffer<float>;
+        else if (c == 'd' && size == sizeof(double))
+            return copy_buffer<double>;
+        throw py::type_error("unsupported buffer format '" + info.format + "'");
+    }
+
+    /** Appends the elements of a one-dimensional buffer to v, returning whether v is still sorted afterwards. */
+    static bool append_buffer(std::vector<K> &v, const py::buffer &b) {
+        auto info = b.request();
+        if (info.ndim != 1)
+            throw py::value_error("buffer must be one-dimensional");
+
+        auto copy = buffer_copier(info);
+        auto src = static_cast<const char *>(info.ptr);
+        auto n = (size_t) info.shape[0];
+        auto stride = info.strides[0];
+
+        auto release = release_gil_if_large(n);
+        auto old_size = v.size();
+        v.resize(old_size + n);
+        copy(src, n, stride, v.data() + old_size);
+        auto from = old_size ? old_size - 1 : 0;
+        return is_sorted(v.data() + from, v.size() - from);
+    }
+
+    /**
+     * Appends the elements of an iterator to v, returning whether they are sorted and not smaller than the last
+     * element of v.
+     */
+    static bool append_iterable(std::vector<K> &v, py::iterator it) {
+        auto sorted = true;
+        for (; it != py::iterator::sentinel(); ++it) {
+            auto x = implicit_cast(*it);
+            if (!v.empty() && x < v.back())
+                sorted = false;
+            v.push_back(x);
         }
+        return sorted;
     }
 
     static K implicit_cast(py::handle h) {
@@ -116,248 +1509,1582 @@ template <typename K> class PGMWrapper : private pgm::PGMIndex<K, IGNORED_PARAME
     }
 
   public:
-    using iterator = typename std::vector<K>::iterator;
-    using const_iterator = typename std::vector<K>::const_iterator;
+    using const_iterator = const K *;
 
-    PGMWrapper() = default;
+    PGMWrapper() : duplicates(false) { build_internal_pgm(); }
 
-    PGMWrapper(const PGMWrapper &p, bool drop_duplicates, size_t epsilon) : epsilon(epsilon) {
-        if (p.has_duplicates() && drop_duplicates) {
+    PGMWrapper(const PGMWrapper &p, bool drop_duplicates, size_t epsilon, size_t epsilon_recursive, bool compressed,
+               bool packed, bool radix)
+        : epsilon(epsilon), epsilon_recursive(epsilon_recursive), compressed(compressed), radix(radix) {
+        check_epsilon_recursive(epsilon_recursive);
+        check_packable(packed);
+        auto dedup = p.has_duplicates() && drop_duplicates;
+        if (!dedup && packed == p.is_packed())
+            data_owner = p.data_owner; // Python objects can only be copied while holding the GIL
+        auto release = release_gil_if_large(p.size());
+
+        if (dedup) {
             data.reserve(p.size());
-            std::unique_copy(p.begin(), p.end(), std::back_inserter(data));
+            p.with_elements([&](auto first, auto last) { std::unique_copy(first, last, std::back_inserter(data)); });
             data.shrink_to_fit();
+            bind_data();
             duplicates = false;
-            build_internal_pgm();
+            build_internal_pgm(false);
+            if (packed)
+                pack_data(false);
             return;
         }
 
-        data = p.data;
+        if (packed && !p.is_packed()) {
+            packed_data = make_packed(p.begin(), p.size(), false);
+            n_elements = p.size();
+        } else if (!packed && p.is_packed()) {
+            p.with_elements([&](auto first, auto last) { data.assign(first, last); });
+            bind_data();
+        } else if (p.data_owner || p.packed_data) {
+            // The borrowed or packed elements are immutable, so they can be shared
+            packed_data = p.packed_data;
+            elements = p.elements;
+            n_elements = p.n_elements;
+        } else {
+            data = p.data;
+            bind_data();
+        }
         duplicates = p.duplicates;
 
-        if (p.get_epsilon() == epsilon) {
+        if (p.is_indexed() && p.epsilon == epsilon && p.epsilon_recursive == epsilon_recursive
+            && p.compressed == compressed) {
             this->n = p.n;
             this->segments = p.segments;
             this->first_key = p.first_key;
             this->levels_offsets = p.levels_offsets;
+            leaf = p.leaf;
+            if (p.radix == radix) {
+                radix_table = p.radix_table;
+                radix_shift = p.radix_shift;
+                radix_scale = p.radix_scale;
+            } else
+                build_radix_table();
         } else {
-            build_internal_pgm();
+            build_internal_pgm(false);
         }
     }
 
-    PGMWrapper(py::iterator it, size_t size_hint, bool drop_duplicates, size_t epsilon) : epsilon(epsilon) {
-        auto sorted = true;
+    PGMWrapper(py::iterator it, size_t size_hint, bool drop_duplicates, size_t epsilon, size_t epsilon_recursive,
+               bool compressed, bool packed, bool radix)
+        : epsilon(epsilon), epsilon_recursive(epsilon_recursive), compressed(compressed), radix(radix) {
+        check_epsilon_recursive(epsilon_recursive);
+        check_packable(packed);
         data.reserve(size_hint);
-        if (it != py::iterator::sentinel())
-            data.push_back(implicit_cast(*it++));
-        for (; it != py::iterator::sentinel(); ++it) {
-            auto x = implicit_cast(*it);
-            if (x < data.back())
-                sorted = false;
-            data.push_back(x);
+        auto sorted = append_iterable(data, it);
+        sort_and_build(sorted, drop_duplicates);
+        if (packed)
+            pack_data();
+    }
+
+    PGMWrapper(py::buffer b, bool drop_duplicates, size_t epsilon, size_t epsilon_recursive, bool compressed,
+               bool packed, bool radix)
+        : epsilon(epsilon), epsilon_recursive(epsilon_recursive), compressed(compressed), radix(radix) {
+        check_epsilon_recursive(epsilon_recursive);
+        check_packable(packed);
+        auto sorted = append_buffer(data, b);
+        sort_and_build(sorted, drop_duplicates);
+        if (packed)
+            pack_data();
+    }
+
+    PGMWrapper(std::vector<K> &&data, bool duplicates, size_t epsilon, size_t epsilon_recursive, bool compressed,
+               bool packed, bool radix, bool release_gil = true)
+        : data(std::move(data)), duplicates(duplicates), epsilon(epsilon), epsilon_recursive(epsilon_recursive),
+          compressed(compressed), radix(radix) {
+        bind_data();
+        build_internal_pgm(release_gil);
+        if (packed)
+            pack_data(release_gil);
+    }
+
+    /**
+     * Accumulates elements given in chunks, and then builds a container with them. Only the elements are kept
+     * between chunks, so that inputs larger than any single Python object can be streamed in.
+     */
+    class Builder {
+        std::vector<K> data;
+        bool sorted = true;
+        bool finished = false;
+        bool drop_duplicates;
+        size_t epsilon;
+        size_t epsilon_recursive;
+        bool compressed;
+        bool packed;
+        bool radix;
+
+        void check_not_finished() const {
+            if (finished)
+                throw py::value_error("the builder is already finished");
         }
 
-        if (!sorted)
-            std::sort(data.begin(), data.end());
-        if (drop_duplicates) {
-            data.erase(std::unique(data.begin(), data.end()), data.end());
-            duplicates = false;
+      public:
+        Builder(bool drop_duplicates, size_t epsilon, size_t epsilon_recursive, bool compressed, bool packed,
+                bool radix)
+            : drop_duplicates(drop_duplicates), epsilon(epsilon), epsilon_recursive(epsilon_recursive),
+              compressed(compressed), packed(packed), radix(radix) {
+            check_epsilon_recursive(epsilon_recursive);
+            check_packable(packed);
+        }
+
+        void extend(py::buffer b) {
+            check_not_finished();
+            sorted &= append_buffer(data, b);
+        }
+
+        void extend(py::iterator it) {
+            check_not_finished();
+            sorted &= append_iterable(data, it);
+        }
+
+        size_t size() const { return data.size(); }
+
+        PGMWrapper *finish() {
+            check_not_finished();
+            finished = true;
+            auto p = std::make_unique<PGMWrapper>();
+            p->epsilon = epsilon;
+            p->epsilon_recursive = epsilon_recursive;
+            p->compressed = compressed;
+            p->radix = radix;
+            p->data = std::move(data);
+            p->sort_and_build(sorted, drop_duplicates);
+            if (packed)
+                p->pack_data();
+            return p.release();
+        }
+    };
+
+    PGMWrapper(const PGMWrapper &) = delete;
+
+    PGMWrapper &operator=(const PGMWrapper &) = delete;
+
+    /** Returns a copy of self that shares its elements, which are immutable, and its pending updates. */
+    static PGMWrapper *copy(py::object self) {
+        auto &p = self.cast<const PGMWrapper &>();
+        auto q = std::make_unique<PGMWrapper>();
+        q->epsilon = p.epsilon;
+        q->epsilon_recursive = p.epsilon_recursive;
+        q->duplicates = p.duplicates;
+        q->compressed = p.compressed;
+        q->data_owner = p.data_owner || p.packed_data ? p.data_owner : py::memoryview(self);
+        q->packed_data = p.packed_data;
+        q->elements = p.elements;
+        q->n_elements = p.n_elements;
+        q->radix = p.radix;
+        if (p.is_indexed()) {
+            q->n = p.n;
+            q->first_key = p.first_key;
+            q->segments = p.segments;
+            q->levels_offsets = p.levels_offsets;
+            q->leaf = p.leaf;
+            q->radix_table = p.radix_table;
+            q->radix_shift = p.radix_shift;
+            q->radix_scale = p.radix_scale;
         } else
-            duplicates = true;
+            q->indexed = false;
+        q->insertions = p.insertions;
+        q->deletions = p.deletions;
+        return q.release();
+    }
+
+    /**
+     * Returns the segment of the last level of the regular index responsible for k, that is, the rightmost segment
+     * with key <= k. Like PGMIndex::segment_for_key, but with the error of the upper levels given at runtime.
+     */
+    auto segment_for_key(const K &k) const {
+        static constexpr size_t linear_search_threshold = 8 * 64 / sizeof(Segment);
+        auto it = this->segments.begin() + *(this->levels_offsets.end() - 2);
+        for (auto l = int(this->height()) - 2; l >= 0; --l) {
+            auto level_begin = this->segments.begin() + this->levels_offsets[l];
+            auto pos = std::min<size_t>((*it)(k), std::next(it)->intercept);
+            auto lo = level_begin + PGM_SUB_EPS(pos, epsilon_recursive + 1);
+            if (epsilon_recursive <= linear_search_threshold) {
+                // The key of the sentinel closing the level is max(), which may equal k
+                auto sentinel = this->segments.begin() + this->levels_offsets[l + 1] - 1;
+                while (std::next(lo) < sentinel && std::next(lo)->key <= k)
+                    ++lo;
+                it = lo;
+            } else {
+                auto level_size = this->levels_offsets[l + 1] - this->levels_offsets[l] - 1;
+                auto hi = level_begin + PGM_ADD_EPS(pos, epsilon_recursive, level_size);
+                it = std::prev(std::upper_bound(lo, hi, k));
+            }
+        }
+        return it;
+    }
+
+    /** Returns the approximate position of key, and sets *segment to the responsible segment of the last level. */
+    pgm::ApproxPos search(const K &key, size_t *segment = nullptr) const {
+        size_t ignored;
+        segment = segment ? segment : &ignored;
+        *segment = 0;
+        ensure_index();
+        if (this->n == 0)
+            return {0, 0, 0};
+        auto k = std::max(this->first_key, key);
+        if (!radix_table.empty()) {
+            auto i = *segment = radix_segment(k);
+            auto pos = compressed ? std::min<size_t>(leaf(i, k), leaf.intercept(i + 1))
+                                  : std::min<size_t>(this->segments[i](k), this->segments[i + 1].intercept);
+            return {pos, PGM_SUB_EPS(pos, epsilon), PGM_ADD_EPS(pos, epsilon, this->n)};
+        }
+        auto it = this->segment_for_key(k);
+        auto pos = std::min<size_t>((*it)(k), std::next(it)->intercept);
+        *segment = it - this->segments.begin();
+        if (compressed) {
+            // pos approximates the position of k in the keys of the segments of the last level
+            auto i = PGM_SUB_EPS(pos, epsilon_recursive + 1);
+            while (i + 1 < leaf.size() && leaf.keys[i + 1] <= k)
+                ++i;
+            pos = std::min<size_t>(leaf(i, k), leaf.intercept(i + 1));
+            *segment = i;
+        }
+        auto lo = PGM_SUB_EPS(pos, epsilon);
+        auto hi = PGM_ADD_EPS(pos, epsilon, this->n);
+        return {pos, lo, hi};
+    }
+
+    bool contains(K x) const {
+        auto i = lower_bound(x);
+        auto found = i < size() && (*this)[i] == x;
+        if (!has_updates())
+            return found;
+        if (!deletions.contains(x))
+            return found || insertions.contains(x);
+        return count(x) > 0;
+    }
+
+    /** Returns the position of the first element >= x, ignoring the pending updates. */
+    size_t lower_bound(K x) const {
+        return bound<false>(x);
+    }
+
+    /** Returns the position of the first element > x, ignoring the pending updates. */
+    size_t upper_bound(K x) const {
+        return bound<true>(x);
+    }
+
+    std::pair<size_t, size_t> range_positions(K a, K b, std::pair<bool, bool> inclusive) const {
+        auto l = inclusive.first ? lower_bound(a) : upper_bound(a);
+        auto r = inclusive.second ? upper_bound(b) : lower_bound(b);
+        return {l, std::max(l, r)};
+    }
+
+    static std::pair<const K *, const K *> sorted_range(const K *first, const K *last, K a, K b,
+                                                        std::pair<bool, bool> inclusive) {
+        auto l = inclusive.first ? std::lower_bound(first, last, a) : std::upper_bound(first, last, a);
+        auto r = inclusive.second ? std::upper_bound(l, last, b) : std::lower_bound(l, last, b);
+        return {l, r};
+    }
+
+    // The following queries take into account the pending updates
+
+    bool has_updates() const { return !insertions.empty() || !deletions.empty(); }
+
+    size_t size_with_updates() const { return size() + insertions.size() - deletions.size(); }
+
+    size_t bisect_left(K x) const {
+        size_t r = lower_bound(x);
+        return has_updates() ? r + insertions.count_less(x) - deletions.count_less(x) : r;
+    }
+
+    size_t bisect_right(K x) const {
+        size_t r = upper_bound(x);
+        return has_updates() ? r + insertions.count_less_equal(x) - deletions.count_less_equal(x) : r;
+    }
+
+    std::pair<size_t, size_t> range_bounds(K a, K b, std::pair<bool, bool> inclusive) const {
+        auto l = inclusive.first ? bisect_left(a) : bisect_right(a);
+        auto r = inclusive.second ? bisect_right(b) : bisect_left(b);
+        return {l, std::max(l, r)};
+    }
+
+    size_t count(K x) const {
+        if (has_updates())
+            return bisect_right(x) - bisect_left(x);
+        auto lb = lower_bound(x);
+        if (lb >= size() || (*this)[lb] != x)
+            return 0;
+        return upper_bound(x) - lb;
+    }
+
+    /** Returns the element of rank r, counting from 0. */
+    K select(size_t r) const {
+        if (!has_updates())
+            return (*this)[r];
+
+        // The result is the smallest element e, among the ones in all the sequences, such that bisect_right(e) > r
+        std::optional<K> best;
+        auto consider = [&](auto first, auto last) {
+            if (best)
+                last = std::lower_bound(first, last, *best);
+            auto it = std::partition_point(first, last, [&](K e) { return bisect_right(e) <= r; });
+            if (it != last)
+                best = *it;
+        };
+        with_elements(consider);
+        insertions.for_each_sequence(consider);
+        return *best;
+    }
+
+    /** Returns the smallest element >= x (or > x, if strict). */
+    std::optional<K> find_next(K x, bool strict) const {
+        std::optional<K> best;
+        auto i = strict ? upper_bound(x) : lower_bound(x);
+        if (i < size())
+            best = (*this)[i];
+        if (!has_updates())
+            return best;
+
+        insertions.next_candidate(x, strict, best);
+        if (!best || !deletions.contains(*best) || count(*best) > 0)
+            return best;
+        auto r = strict ? bisect_right(x) : bisect_left(x);
+        return r < size_with_updates() ? std::optional<K>(select(r)) : std::nullopt;
+    }
+
+    /** Returns the largest element <= x (or < x, if strict). */
+    std::optional<K> find_prev(K x, bool strict) const {
+        std::optional<K> best;
+        auto i = strict ? lower_bound(x) : upper_bound(x);
+        if (i > 0)
+            best = (*this)[i - 1];
+        if (!has_updates())
+            return best;
+
+        insertions.prev_candidate(x, strict, best);
+        if (!best || !deletions.contains(*best) || count(*best) > 0)
+            return best;
+        auto r = strict ? bisect_left(x) : bisect_right(x);
+        return r > 0 ? std::optional<K>(select(r - 1)) : std::nullopt;
+    }
+
+    std::shared_lock<std::shared_mutex> read_lock() const { return std::shared_lock(mutex); }
 
-        data.shrink_to_fit();
-        build_internal_pgm();
+    // Updates, which must be called with the GIL held. They return whether the elements changed
+
+    bool add(K x, bool unique) {
+        if (unique && contains(x))
+            return false;
+        std::unique_lock lock(mutex);
+        insertions.insert(x, epsilon, epsilon_recursive);
+        return true;
     }
 
-    PGMWrapper(std::vector<K> &&data, bool duplicates, size_t epsilon)
-        : data(std::move(data)), duplicates(duplicates), epsilon(epsilon) {
-        build_internal_pgm();
+    template <typename O> bool update(const O &o, size_t o_size, bool unique) {
+        std::vector<K> tmp;
+        if constexpr (std::is_same_v<O, py::iterator>) {
+            auto it = o;
+            tmp = to_sorted_vector(it, o_size);
+        } else
+            o.with_elements([&](auto first, auto last) { tmp.assign(first, last); });
+
+        if (unique) {
+            tmp.erase(std::unique(tmp.begin(), tmp.end()), tmp.end());
+            tmp.erase(std::remove_if(tmp.begin(), tmp.end(), [&](K x) { return contains(x); }), tmp.end());
+        }
+        if (tmp.empty())
+            return false;
+        std::unique_lock lock(mutex);
+        insertions.insert_sorted(std::move(tmp), epsilon, epsilon_recursive);
+        return true;
     }
 
-    pgm::ApproxPos search(const K &key) const {
-        auto k = std::max(this->first_key, key);
-        auto it = this->segment_for_key(k);
-        auto pos = std::min<size_t>((*it)(k), std::next(it)->intercept);
-        auto lo = PGM_SUB_EPS(pos, epsilon);
-        auto hi = PGM_ADD_EPS(pos, epsilon, this->n);
-        return {pos, lo, hi};
+    bool discard(K x) {
+        if (!contains(x))
+            return false;
+        std::unique_lock lock(mutex);
+        if (!insertions.erase_from_buffer(x))
+            deletions.insert(x, epsilon, epsilon_recursive);
+        return true;
     }
 
-    bool contains(K x) const {
-        auto range = search(x);
-        return std::binary_search(data.begin() + range.lo, data.begin() + range.hi, x);
+    bool remove_range(K a, K b, std::pair<bool, bool> inclusive) {
+        // Insertions still in the buffer are erased, the other elements in the range that are not already deleted
+        // are added to the deletions
+        auto [l, r] = range_positions(a, b, inclusive);
+        std::vector<K> in_range;
+        with_elements([&, l = l, r = r](auto first, auto) { in_range.assign(first + l, first + r); });
+        insertions.collect_range(a, b, inclusive, false, in_range);
+        std::vector<K> deleted;
+        deletions.collect_range(a, b, inclusive, true, deleted);
+        std::vector<K> to_delete;
+        std::set_difference(in_range.begin(), in_range.end(), deleted.begin(), deleted.end(),
+                            std::back_inserter(to_delete));
+
+        std::unique_lock lock(mutex);
+        auto changed = insertions.erase_range_from_buffer(a, b, inclusive) > 0 || !to_delete.empty();
+        if (!to_delete.empty())
+            deletions.insert_sorted(std::move(to_delete), epsilon, epsilon_recursive);
+        return changed;
     }
 
-    const_iterator lower_bound(K x) const {
-        auto range = search(x);
-        return std::lower_bound(data.begin() + range.lo, data.begin() + range.hi, x);
+    /** Whether the pending updates are large enough to be worth merging into a new index, see compacted(). */
+    bool compaction_due() const {
+        return insertions.size() > std::max<size_t>(size() / 4, UPDATES_BUFFER_CAPACITY)
+               || deletions.size() > (size() + insertions.size()) / 8;
     }
 
-    const_iterator upper_bound(K x) const {
-        auto range = search(x);
-        auto it = std::upper_bound(data.begin() + range.lo, data.begin() + range.hi, x);
-        if (!duplicates)
-            return it;
+    /** Returns a new object with the elements of this one and no pending updates. */
+    PGMWrapper *compacted() const {
+        py::gil_scoped_release release;
+        std::vector<K> out;
+        {
+            auto lock = read_lock();
+            auto inserted = insertions.to_vector();
+            auto deleted = deletions.to_vector();
+            std::vector<K> merged;
+            merged.reserve(size() + inserted.size());
+            with_elements([&](auto first, auto last) {
+                std::merge(first, last, inserted.begin(), inserted.end(), std::back_inserter(merged));
+            });
+            out.reserve(merged.size() - deleted.size());
+            std::set_difference(merged.begin(), merged.end(), deleted.begin(), deleted.end(), std::back_inserter(out));
+        }
+        auto duplicates = std::adjacent_find(out.begin(), out.end()) != out.end();
+        auto p = new PGMWrapper(std::move(out), duplicates, epsilon, epsilon_recursive, compressed, is_packed(), radix,
+                                false);
+        if (counters)
+            p->counters = std::make_shared<QueryCounters>(*counters, p->leaf_segments_count());
+        return p;
+    }
 
-        auto step = 1ull;
-        while (it + step < end() && *(it + step) == x)
-            step *= 2;
-        return std::upper_bound(it + (step / 2), std::min(it + step, end()), x);
+    /** Enables or disables the counters of the searches, resetting them. */
+    void set_instrumented(bool enabled) {
+        ensure_index();
+        counters = enabled ? std::make_shared<QueryCounters>(leaf_segments_count()) : nullptr;
     }
 
+    py::object query_stats() const { return counters ? py::object(counters->to_dict()) : py::none(); }
+
     template <typename O> PGMWrapper<K> *merge(const O &o, size_t o_size) const {
-        return set_operation<std::merge>(o, o_size, size() + o_size, true);
+        auto f = [](auto... args) { return std::merge(args...); };
+        return set_operation(o, o_size, size() + o_size, true, f);
     }
 
     template <typename O> PGMWrapper<K> *set_difference(const O &o, size_t o_size) const {
-        return set_operation<std::set_difference>(o, o_size, size(), false);
+        auto f = [](auto... args) { return std::set_difference(args...); };
+        return set_operation(o, o_size, size(), false, f);
     }
 
     template <typename O> PGMWrapper<K> *set_symmetric_difference(const O &o, size_t o_size) const {
-        return set_operation<set_unique_symmetric_difference>(o, o_size, size() + o_size, false);
+        auto f = [](auto... args) { return set_unique_symmetric_difference(args...); };
+        return set_operation(o, o_size, size() + o_size, false, f);
     }
 
     template <typename O> PGMWrapper<K> *set_union(const O &o, size_t o_size) const {
-        return set_operation<set_unique_union>(o, o_size, size() + o_size, false);
+        auto f = [](auto... args) { return set_unique_union(args...); };
+        return set_operation(o, o_size, size() + o_size, false, f);
     }
 
     template <typename O> PGMWrapper<K> *set_intersection(const O &o, size_t o_size) const {
         assert(!has_duplicates()); // otherwise std::set_intersection may output duplicates
-        return set_operation<std::set_intersection>(o, o_size, std::min(size(), o_size), false);
+        // The elements of a much smaller operand are looked up in the index, or galloped to in a much larger operand
+        auto f = [this](auto first, auto last, auto o_first, auto o_last, auto out) {
+            if (lookups_faster(o_last - o_first, size())) {
+                while (o_first != o_last) {
+                    auto x = *o_first;
+                    if (contains(x))
+                        *out++ = x;
+                    while (++o_first != o_last && *o_first == x)
+                        ;
+                }
+                return out;
+            }
+            if (lookups_faster(size(), o_last - o_first)) {
+                for (; first != last && o_first != o_last; ++first) {
+                    o_first = gallop_lower_bound(o_first, o_last, *first);
+                    if (o_first != o_last && *o_first == *first)
+                        *out++ = *first;
+                }
+                return out;
+            }
+            return std::set_intersection(first, last, o_first, o_last, out);
+        };
+        return set_operation(o, o_size, std::min(size(), o_size), false, f);
     }
 
+    /**
+     * Returns whether this container is a subset of q (or a superset, if Reverse), or a proper one. Without duplicates,
+     * the larger one can't be included in the smaller one, and the elements of a much smaller one are looked up in the
+     * index of the other.
+     */
     template <bool Reverse> bool subset(const PGMWrapper<K> &q, size_t, bool proper) const {
-        if constexpr (Reverse)
-            return set_unique_includes(begin(), end(), q.begin(), q.end(), proper);
-        return set_unique_includes(q.begin(), q.end(), begin(), end(), proper);
+        auto &included = Reverse ? q : *this;
+        auto &including = Reverse ? *this : q;
+        if (!has_duplicates() && !q.has_duplicates()) {
+            if (included.size() > including.size() || (proper && included.size() == including.size()))
+                return false;
+            if (lookups_faster(included.size(), including.size()))
+                return included.with_elements([&](auto first, auto last) {
+                    return std::all_of(first, last, [&](K x) { return including.contains(x); });
+                });
+        }
+        auto release = release_gil_if_large(size() + q.size());
+        return with_elements([&](auto first, auto last) {
+            return q.with_elements([&](auto q_first, auto q_last) {
+                if constexpr (Reverse)
+                    return set_unique_includes(first, last, q_first, q_last, proper);
+                return set_unique_includes(q_first, q_last, first, last, proper);
+            });
+        });
     }
 
     template <bool Reverse> bool subset(py::iterator it, size_t it_size_hint, bool proper) const {
-        auto tmp = to_sorted_vector(it, it_size_hint);
-        if constexpr (Reverse)
-            return set_unique_includes(begin(), end(), tmp.begin(), tmp.end(), proper);
-        return set_unique_includes(tmp.begin(), tmp.end(), begin(), end(), proper);
+        auto [tmp, sorted] = to_vector(it, it_size_hint);
+        auto release = release_gil_if_large(size() + tmp.size());
+        sort_if(tmp, sorted);
+        if (Reverse && !has_duplicates() && lookups_faster(tmp.size(), size())) {
+            tmp.erase(std::unique(tmp.begin(), tmp.end()), tmp.end());
+            auto included = std::all_of(tmp.begin(), tmp.end(), [&](K x) { return contains(x); });
+            return included && (!proper || tmp.size() < size());
+        }
+        return with_elements([&](auto first, auto last) {
+            if constexpr (Reverse)
+                return set_unique_includes(first, last, tmp.begin(), tmp.end(), proper);
+            return set_unique_includes(tmp.begin(), tmp.end(), first, last, proper);
+        });
+    }
+
+    /** Returns whether q has no elements in common, looking up those of the smaller one in the much larger one. */
+    bool disjoint(const PGMWrapper<K> &q, size_t) const {
+        auto &smaller = size() < q.size() ? *this : q;
+        auto &larger = size() < q.size() ? q : *this;
+        if (lookups_faster(smaller.size(), larger.size()))
+            return smaller.with_elements([&](auto first, auto last) {
+                return std::none_of(first, last, [&](K x) { return larger.contains(x); });
+            });
+        auto release = release_gil_if_large(size() + q.size());
+        return with_elements([&](auto first, auto last) {
+            return q.with_elements([&](auto q_first, auto q_last) { return set_disjoint(first, last, q_first, q_last); });
+        });
+    }
+
+    bool disjoint(py::iterator it, size_t it_size_hint) const {
+        auto [tmp, sorted] = to_vector(it, it_size_hint);
+        if (lookups_faster(tmp.size(), size()))
+            return std::none_of(tmp.begin(), tmp.end(), [&](K x) { return contains(x); });
+        auto release = release_gil_if_large(size() + tmp.size());
+        sort_if(tmp, sorted);
+        return with_elements([&](auto first, auto last) { return set_disjoint(first, last, tmp.begin(), tmp.end()); });
+    }
+
+    bool equal_to(const PGMWrapper<K> &q, size_t) const {
+        if (size() != q.size())
+            return false;
+        auto release = release_gil_if_large(size());
+        return with_elements([&](auto first, auto last) {
+            return q.with_elements([&](auto q_first, auto q_last) { return std::equal(first, last, q_first, q_last); });
+        });
     }
 
-    bool equal_to(const PGMWrapper<K> &q, size_t) const { return data == q.data; }
+    bool equal_to(py::iterator it, size_t it_size_hint) const {
+        auto [tmp, sorted] = to_vector(it, it_size_hint);
+        if (size() != tmp.size())
+            return false;
+        auto release = release_gil_if_large(size());
+        sort_if(tmp, sorted);
+        return with_elements([&](auto first, auto last) { return std::equal(first, last, tmp.begin(), tmp.end()); });
+    }
 
-    bool equal_to(py::iterator it, size_t it_size_hint) const { return data == to_sorted_vector(it, it_size_hint); }
+    bool not_equal_to(const PGMWrapper<K> &q, size_t) const { return !equal_to(q, 0); }
 
-    bool not_equal_to(const PGMWrapper<K> &q, size_t) const { return data != q.data; }
+    bool not_equal_to(py::iterator it, size_t it_size_hint) const { return !equal_to(it, it_size_hint); }
 
-    bool not_equal_to(py::iterator it, size_t it_size_hint) const { return data != to_sorted_vector(it, it_size_hint); }
+    size_t index_height() const {
+        ensure_index();
+        return size() ? this->height() + compressed : 0;
+    }
 
     py::dict stats() const {
         std::vector<size_t> segments_counts;
-        for (size_t i = 0; i < this->height(); ++i)
+        for (size_t i = 0; i < index_height(); ++i)
             segments_counts.push_back(num_segments(i));
 
+        auto index_size = this->size_in_bytes() + (compressed ? leaf.size_in_bytes() : 0)
+                          + radix_table.size() * sizeof(uint32_t);
+        auto uncompressed_index_size = this->size_in_bytes();
+        if (compressed)
+            uncompressed_index_size += (leaf.size() + 1) * sizeof(Segment) + sizeof(size_t);
+
         py::dict stats;
         stats["epsilon"] = get_epsilon();
         stats["epsilon recursive"] = get_epsilon_recursive();
-        stats["height"] = this->height();
-        stats["index size"] = this->size_in_bytes();
-        stats["data size"] = sizeof(K) * size() + sizeof(*this);
-        stats["segment size"] = sizeof(this->segments[0]);
-        stats["leaf segments"] = this->segments_count();
+        stats["height"] = index_height();
+        stats["index size"] = index_size;
+        stats["data size"] = (packed_data ? packed_data->size_in_bytes() : sizeof(K) * size()) + sizeof(*this);
+        if (compressed && leaf.size())
+            stats["segment size"] = double(leaf.size_in_bytes()) / leaf.size();
+        else
+            stats["segment size"] = sizeof(Segment);
+        stats["leaf segments"] = compressed ? leaf.size() : this->segments_count();
         stats["segments counts"] = segments_counts;
+        stats["compressed"] = compressed;
+        stats["uncompressed index size"] = uncompressed_index_size;
+        if (compressed)
+            stats["distinct slopes"] = leaf.slopes.size();
+        stats["packed"] = is_packed();
+        stats["radix"] = radix;
+        stats["radix table size"] = radix_table.size() * sizeof(uint32_t);
         return stats;
     }
 
     size_t num_segments(size_t level_num) const {
-        if (level_num < 0)
-            throw std::invalid_argument("level can't be < 0");
-        if (level_num >= this->height())
+        if (level_num >= index_height())
             throw std::invalid_argument("level can't be >= index height");
-
+        if (compressed) {
+            if (level_num == 0)
+                return leaf.size();
+            --level_num;
+        }
         return this->levels_offsets[level_num + 1] - this->levels_offsets[level_num] - 1;
     }
 
-    py::dict segment(size_t level_num, size_t segment_num) {
-        if (level_num >= this->height())
+    py::dict segment(size_t level_num, size_t segment_num) const {
+        if (level_num >= index_height())
             throw std::invalid_argument("level can't be >= index height");
         if (segment_num >= num_segments(level_num))
             throw std::invalid_argument("segment can't be >= number of segments in level");
 
-        auto &s = this->segments[this->levels_offsets[level_num] + segment_num];
         py::dict out;
+        out["epsilon"] = level_num == 0 ? get_epsilon() : get_epsilon_recursive();
+        if (compressed && level_num == 0) {
+            out["key"] = leaf.keys[segment_num];
+            out["slope"] = leaf.slope(segment_num);
+            out["intercept"] = leaf.intercept(segment_num);
+            return out;
+        }
+
+        auto &s = this->segments[this->levels_offsets[level_num - compressed] + segment_num];
         out["key"] = s.key;
         out["slope"] = s.slope;
         out["intercept"] = s.intercept;
-        out["epsilon"] = level_num == 0 ? get_epsilon() : get_epsilon_recursive();
         return out;
     }
 
-    K operator[](size_t i) const { return data[i]; }
+    py::tuple segments_array(size_t level_num) const {
+        auto count = num_segments(level_num);
+        py::array_t<K> keys(count);
+        py::array_t<double> slopes(count);
+        py::array_t<int64_t> intercepts(count);
+        auto keys_ptr = keys.mutable_data();
+        auto slopes_ptr = slopes.mutable_data();
+        auto intercepts_ptr = intercepts.mutable_data();
+        for (size_t i = 0; i < count; ++i) {
+            if (compressed && level_num == 0) {
+                keys_ptr[i] = leaf.keys[i];
+                slopes_ptr[i] = leaf.slope(i);
+                intercepts_ptr[i] = leaf.intercept(i);
+            } else {
+                auto &s = this->segments[this->levels_offsets[level_num - compressed] + i];
+                keys_ptr[i] = s.key;
+                slopes_ptr[i] = s.slope;
+                intercepts_ptr[i] = s.intercept;
+            }
+        }
+        return py::make_tuple(keys, slopes, intercepts);
+    }
+
+    void save(const std::string &path, char typecode) const {
+        ensure_index();
+        FileHeader h{};
+        std::memcpy(h.magic, "PyGM", 4);
+        h.byte_order = 0x01020304;
+        h.version = packed_data ? 3 : compressed ? 2 : 1;
+        h.key_format = py::format_descriptor<K>::format()[0];
+        h.typecode = typecode;
+        h.key_size = sizeof(K);
+        h.duplicates = duplicates;
+        h.n = size();
+        h.epsilon = epsilon;
+        h.epsilon_recursive = get_epsilon_recursive();
+        h.n_segments = this->segments.size();
+        h.n_levels_offsets = this->levels_offsets.size();
+        h.compressed = compressed;
+        h.packed = is_packed();
+        h.radix = radix;
+        std::vector<uint64_t> levels_offsets(this->levels_offsets.begin(), this->levels_offsets.end());
+        auto leaf_bytes = compressed ? leaf.serialize() : std::string();
+        uint64_t leaf_size = leaf_bytes.size();
+
+        bool ok;
+        {
+            py::gil_scoped_release release;
+            uint64_t zero = 0;
+            auto data_ptr = packed_data ? static_cast<const void *>(packed_data->data()) : begin();
+            auto data_bytes = packed_data ? packed_data->size_in_words() * sizeof(uint64_t) : size() * sizeof(K);
+            auto f = std::fopen(path.c_str(), "wb");
+            ok = f != nullptr;
+            ok = ok && std::fwrite(&h, sizeof(h), 1, f) == 1;
+            ok = ok && std::fwrite(data_ptr, 1, data_bytes, f) == data_bytes;
+            ok = ok && std::fwrite(&zero, 1, round_up(data_bytes, 8) - data_bytes, f) == round_up(data_bytes, 8) - data_bytes;
+            ok = ok && std::fwrite(this->segments.data(), sizeof(Segment), h.n_segments, f) == h.n_segments;
+            ok = ok && std::fwrite(levels_offsets.data(), 8, h.n_levels_offsets, f) == h.n_levels_offsets;
+            if (compressed) {
+                ok = ok && std::fwrite(&leaf_size, 8, 1, f) == 1;
+                ok = ok && std::fwrite(leaf_bytes.data(), 1, leaf_size, f) == leaf_size;
+            }
+            ok = f != nullptr && std::fclose(f) == 0 && ok;
+        }
+        if (!ok) {
+            PyErr_SetFromErrnoWithFilename(PyExc_OSError, path.c_str());
+            throw py::error_already_set();
+        }
+    }
+
+    static PGMWrapper *load(const py::buffer &b, const py::buffer_info &info, const FileHeader &h) {
+        if (h.key_size != sizeof(K) || h.epsilon_recursive == 0 || h.n_levels_offsets == 1)
+            throw py::value_error("invalid or unsupported PyGM file");
+
+        auto base = static_cast<const char *>(info.ptr);
+        auto file_size = (size_t) (info.size * info.itemsize);
+        auto packed = h.version >= 3 && h.packed;
+        // Packed elements may take less than sizeof(K) bytes each, and are checked by EliasFano::words_count
+        if ((!packed && h.n > file_size / sizeof(K)) || h.n_segments > file_size / sizeof(Segment)
+            || h.n_levels_offsets > file_size / 8)
+            throw py::value_error("truncated PyGM file");
+        auto data_bytes = h.n * sizeof(K);
+        if (packed) {
+            check_packable(true);
+            auto available = (file_size - sizeof(FileHeader)) / sizeof(uint64_t);
+            data_bytes = EliasFano<K>::words_count(base + sizeof(FileHeader), available) * sizeof(uint64_t);
+        }
+        auto segments_offset = sizeof(FileHeader) + round_up(data_bytes, 8);
+        auto levels_offset = segments_offset + h.n_segments * sizeof(Segment);
+        auto leaf_offset = levels_offset + h.n_levels_offsets * 8;
+        if (file_size < leaf_offset)
+            throw py::value_error("truncated PyGM file");
+
+        auto p = std::make_unique<PGMWrapper>();
+        p->epsilon = h.epsilon;
+        p->epsilon_recursive = h.epsilon_recursive;
+        p->duplicates = h.duplicates;
+        p->compressed = h.version >= 2 && h.compressed;
+        if (packed) {
+            p->borrow_or_copy_packed(b, base + sizeof(FileHeader), data_bytes / sizeof(uint64_t));
+            if (p->size() != h.n)
+                throw py::value_error("invalid or unsupported PyGM file");
+        } else
+            p->borrow_or_copy(b, reinterpret_cast<const K *>(base + sizeof(FileHeader)), h.n);
+        if (!p->load_index(base + segments_offset, h.n_segments, base + levels_offset, h.n_levels_offsets))
+            throw py::value_error("invalid or unsupported PyGM file");
+        if (p->compressed && h.n) {
+            uint64_t leaf_size = 0;
+            if (file_size >= leaf_offset + 8)
+                std::memcpy(&leaf_size, base + leaf_offset, 8);
+            if (file_size - leaf_offset < 8 || leaf_size > file_size - leaf_offset - 8)
+                throw py::value_error("truncated PyGM file");
+            p->leaf.deserialize(base + leaf_offset + 8, base + leaf_offset + 8 + leaf_size);
+        }
+        p->radix = h.radix;
+        p->build_radix_table();
+        return p.release();
+    }
+
+    py::tuple get_state(py::object self, int protocol) const {
+        // With protocol 5 the elements are exported through a PickleBuffer, so that they can be transferred out of
+        // band and need not be copied into the pickle stream
+        ensure_index();
+        py::object elements_state;
+        if (packed_data)
+            elements_state = py::bytes(reinterpret_cast<const char *>(packed_data->data()),
+                                       packed_data->size_in_words() * sizeof(uint64_t));
+        else if (protocol >= 5)
+            elements_state = py::module_::import("pickle").attr("PickleBuffer")(self);
+        else
+            elements_state = py::bytes(reinterpret_cast<const char *>(begin()), size() * sizeof(K));
+
+        std::vector<uint64_t> levels_offsets(this->levels_offsets.begin(), this->levels_offsets.end());
+        return py::make_tuple(
+            FILE_FORMAT_VERSION, elements_state,
+            py::bytes(reinterpret_cast<const char *>(this->segments.data()), this->segments.size() * sizeof(Segment)),
+            py::bytes(reinterpret_cast<const char *>(levels_offsets.data()), levels_offsets.size() * 8), epsilon,
+            duplicates, compressed ? py::object(py::bytes(leaf.serialize())) : py::none(), is_packed(), radix,
+            epsilon_recursive);
+    }
+
+    static PGMWrapper *from_state(const py::tuple &state) {
+        // Version 1 states lack the compressed last level, and version 2 states lack the packed flag. Version 3 states
+        // may end with the radix flag and the recursive epsilon, as files do not need a new version for them
+        auto version = state.size() ? state[0].cast<uint32_t>() : 0;
+        auto extra = version == FILE_FORMAT_VERSION && state.size() == version + 7;
+        if (version == 0 || version > FILE_FORMAT_VERSION || (state.size() != version + 5 && !extra))
+            throw py::value_error("invalid or unsupported pickled state");
+        auto packed = version >= 3 && state[7].cast<bool>();
+
+        auto elements_buffer = state[1].cast<py::buffer>();
+        auto elements_info = elements_buffer.request();
+        auto segments = state[2].cast<std::string_view>();
+        auto levels = state[3].cast<std::string_view>();
+        auto elements_bytes = (size_t) (elements_info.size * elements_info.itemsize);
+        if (elements_bytes % (packed ? sizeof(uint64_t) : sizeof(K)) || segments.size() % sizeof(Segment)
+            || levels.size() % 8 || levels.size() == 8)
+            throw py::value_error("invalid or unsupported pickled state");
+
+        auto p = std::make_unique<PGMWrapper>();
+        p->epsilon = state[4].cast<size_t>();
+        if (extra) {
+            p->radix = state[8].cast<bool>();
+            p->epsilon_recursive = state[9].cast<size_t>();
+            check_epsilon_recursive(p->epsilon_recursive);
+        }
+        p->duplicates = state[5].cast<bool>();
+        auto elements_ptr = static_cast<const char *>(elements_info.ptr);
+        if (packed) {
+            check_packable(true);
+            p->borrow_or_copy_packed(elements_buffer, elements_ptr, elements_bytes / sizeof(uint64_t));
+        } else
+            p->borrow_or_copy(elements_buffer, reinterpret_cast<const K *>(elements_ptr), elements_bytes / sizeof(K));
+        if (!p->load_index(segments.data(), segments.size() / sizeof(Segment), levels.data(), levels.size() / 8))
+            throw py::value_error("invalid or unsupported pickled state");
+        if (version >= 2 && !state[6].is_none()) {
+            auto leaf_bytes = state[6].cast<std::string_view>();
+            p->compressed = true;
+            if (p->size())
+                p->leaf.deserialize(leaf_bytes.data(), leaf_bytes.data() + leaf_bytes.size());
+        }
+        p->build_radix_table();
+        return p.release();
+    }
+
+    K operator[](size_t i) const { return packed_data ? (*packed_data)[i] : elements[i]; }
 
-    size_t size() const { return data.size(); }
+    size_t size() const { return n_elements; }
 
     size_t get_epsilon() const { return epsilon; }
 
-    size_t get_epsilon_recursive() const { return EPSILON_RECURSIVE; }
+    size_t get_epsilon_recursive() const { return epsilon_recursive; }
 
     bool has_duplicates() const { return duplicates; }
 
-    auto begin() { return data.begin(); }
+    bool is_compressed() const { return compressed; }
 
-    auto end() { return data.end(); }
+    bool is_packed() const { return packed_data != nullptr; }
 
-    auto begin() const { return data.cbegin(); }
+    bool has_radix_table() const { return radix; }
 
-    auto end() const { return data.cend(); }
+    /** Returns f(first, last), where [first, last) are the elements, which are decoded on the fly if packed. */
+    template <typename F> auto with_elements(F f) const {
+        if (packed_data)
+            return f(packed_data->begin(), packed_data->end());
+        return f(begin(), end());
+    }
 
-  private:
-    using back_iterator = typename std::back_insert_iterator<std::vector<K>>;
-    using set_fun = back_iterator (*)(const_iterator, const_iterator, const_iterator, const_iterator, back_iterator);
+    /**
+     * Builds the index, if it was deferred. Concurrent callers wait for the first one to build it, which releases the
+     * GIL, if held, for large containers.
+     */
+    void ensure_index() const {
+        if (indexed.load(std::memory_order_acquire))
+            return;
+        auto release = PyGILState_Check() ? release_gil_if_large(size()) : nullptr;
+        std::lock_guard lock(index_mutex);
+        if (!indexed.load(std::memory_order_relaxed)) {
+            const_cast<PGMWrapper *>(this)->build_internal_pgm(false);
+            indexed.store(true, std::memory_order_release);
+        }
+    }
 
-    static std::vector<K> to_sorted_vector(py::iterator &it, size_t it_size_hint) {
+    bool is_indexed() const { return indexed.load(std::memory_order_acquire); }
+
+    /**
+     * Returns a container with the given sorted elements and the parameters of like, whose index is built on first
+     * use. The elements are packed right away if those of like are.
+     */
+    static PGMWrapper *deferred(std::vector<K> &&elements, bool duplicates, const PGMWrapper &like,
+                                bool release_gil = true) {
+        auto p = std::make_unique<PGMWrapper>();
+        p->epsilon = like.epsilon;
+        p->epsilon_recursive = like.epsilon_recursive;
+        p->compressed = like.compressed;
+        p->radix = like.radix;
+        p->duplicates = duplicates;
+        p->data = std::move(elements);
+        p->bind_data();
+        p->indexed = p->size() == 0;
+        if (like.is_packed())
+            p->pack_data(release_gil);
+        return p.release();
+    }
+
+    /** Returns an iterator to the first element, which must not be packed. */
+    const_iterator begin() const { return elements; }
+
+    const_iterator end() const { return elements + n_elements; }
+
+  private:
+    /** Returns the elements of the given iterator, and whether they are sorted. Must be called with the GIL held. */
+    static std::pair<std::vector<K>, bool> to_vector(py::iterator &it, size_t it_size_hint) {
         std::vector<K> tmp;
         tmp.reserve(it_size_hint);
+        auto sorted = append_iterable(tmp, it);
+        return {std::move(tmp), sorted};
+    }
 
-        auto sorted = true;
-        if (it != py::iterator::sentinel())
-            tmp.push_back(implicit_cast(*it++));
-        for (; it != py::iterator::sentinel(); ++it) {
-            auto x = implicit_cast(*it);
-            if (x < tmp.back())
-                sorted = false;
-            tmp.push_back(x);
-        }
-
+    static void sort_if(std::vector<K> &v, bool sorted) {
         if (!sorted)
-            std::sort(tmp.begin(), tmp.end());
-        return tmp;
+            parallel_sort(v.data(), v.data() + v.size(), get_threads());
     }
 
-    template <set_fun F>
-    PGMWrapper<K> *set_operation(py::iterator it, size_t it_size_hint, size_t size_hint,
-                                 bool generates_duplicates) const {
+    static std::vector<K> to_sorted_vector(py::iterator &it, size_t it_size_hint) {
+        auto [tmp, sorted] = to_vector(it, it_size_hint);
+        auto release = release_gil_if_large(tmp.size());
+        sort_if(tmp, sorted);
+        return std::move(tmp);
+    }
+
+    template <typename F>
+    PGMWrapper<K> *set_operation(py::iterator it, size_t it_size_hint, size_t size_hint, bool generates_duplicates,
+                                 F f) const {
+        auto [tmp, sorted] = to_vector(it, it_size_hint);
+        auto release = release_gil_if_large(size() + tmp.size());
+        sort_if(tmp, sorted);
         std::vector<K> out;
         out.reserve(size_hint);
-        auto tmp = to_sorted_vector(it, it_size_hint);
-        F(begin(), end(), tmp.begin(), tmp.end(), std::back_inserter(out));
+        with_elements([&](auto first, auto last) { f(first, last, tmp.begin(), tmp.end(), std::back_inserter(out)); });
         out.shrink_to_fit();
-        return new PGMWrapper<K>(std::move(out), generates_duplicates, epsilon);
+        return deferred(std::move(out), generates_duplicates, *this, !release);
     }
 
-    template <set_fun F>
-    PGMWrapper<K> *set_operation(const PGMWrapper<K> &q, size_t, size_t size_hint, bool generates_duplicates) const {
+    template <typename F>
+    PGMWrapper<K> *set_operation(const PGMWrapper<K> &q, size_t, size_t size_hint, bool generates_duplicates,
+                                 F f) const {
+        auto release = release_gil_if_large(size() + q.size());
         std::vector<K> out;
         out.reserve(size_hint);
-        F(begin(), end(), q.begin(), q.end(), std::back_inserter(out));
+        with_elements([&](auto first, auto last) {
+            q.with_elements([&](auto q_first, auto q_last) {
+                f(first, last, q_first, q_last, std::back_inserter(out));
+            });
+        });
+        out.shrink_to_fit();
+        return deferred(std::move(out), generates_duplicates, *this, !release);
+    }
+};
+
+/** A sorted range of elements, which the k-way set operations consume from the front. */
+template <typename K> struct SortedRun {
+    const K *first;
+    const K *last;
+    const PGMWrapper<K> *container = nullptr; ///< The container whose elements the run spans, if it is indexed.
+
+    bool empty() const { return first == last; }
+
+    size_t size() const { return last - first; }
+
+    /** Moves past the elements equal to the first one. */
+    void pop() {
+        auto x = *first;
+        while (++first != last && *first == x)
+            ;
+    }
+
+    /**
+     * Moves to the first element >= x, galloping as the sought elements are usually close to the front. Those farther
+     * than the error of the index of the container, if any, are found through the index.
+     */
+    void seek(K x) {
+        auto far = container ? 2 * container->get_epsilon() : size();
+        if (far < size() && first[far] < x)
+            first = std::max(first, container->begin() + container->lower_bound(x));
+        else
+            first = gallop_lower_bound(first, last, x);
+    }
+};
+
+enum class SetOperation { UNION, INTERSECTION, DIFFERENCE, SYMMETRIC_DIFFERENCE, MERGE };
+
+/**
+ * Appends to out the distinct elements of the result of op on two runs, or all of them for a merge, with a linear
+ * merge. An intersection, or a difference from a run, with a much larger run seeks the larger one to each element of
+ * the smaller one instead.
+ */
+template <typename K> void binary_set_operation(SetOperation op, SortedRun<K> a, SortedRun<K> b, std::vector<K> &out) {
+    if (op == SetOperation::INTERSECTION && lookups_faster(b.size(), a.size()))
+        std::swap(a, b);
+    auto seekable = op == SetOperation::INTERSECTION || op == SetOperation::DIFFERENCE;
+    if (seekable && lookups_faster(a.size(), b.size())) {
+        for (; !a.empty(); a.pop()) {
+            b.seek(*a.first);
+            auto found = !b.empty() && *b.first == *a.first;
+            if (found == (op == SetOperation::INTERSECTION))
+                out.push_back(*a.first);
+        }
+        return;
+    }
+
+    auto o = std::back_inserter(out);
+    switch (op) {
+    case SetOperation::MERGE:
+        std::merge(a.first, a.last, b.first, b.last, o);
+        return;
+    case SetOperation::UNION:
+        set_unique_union(a.first, a.last, b.first, b.last, o);
+        return;
+    case SetOperation::SYMMETRIC_DIFFERENCE:
+        set_unique_symmetric_difference(a.first, a.last, b.first, b.last, o);
+        return;
+    case SetOperation::DIFFERENCE:
+        set_unique_difference(a.first, a.last, b.first, b.last, o);
+        return;
+    case SetOperation::INTERSECTION:
+        // Both runs may have duplicates, if they come from SortedList objects
+        auto begin = out.size();
+        std::set_intersection(a.first, a.last, b.first, b.last, o);
+        out.erase(std::unique(out.begin() + begin, out.end()), out.end());
+        return;
+    }
+}
+
+/**
+ * Appends to out the distinct elements of the result of op on the given runs, or all of them for a merge, where a
+ * difference is the first run minus all the others. More than two runs are intersected in a single pass, seeking each
+ * run to the element under consideration of the smallest one. Otherwise, they are combined by linear merges of two
+ * runs at a time, which are faster than a single pass repeatedly taking the smallest front of the runs, with a heap or
+ * a tournament tree, even for hundreds of runs: a difference subtracts the runs one by one, and a union, a symmetric
+ * difference or a merge combines the two shortest runs until one is left, so that each element is moved about
+ * log2(runs.size()) times at most. Each intermediate result is freed as soon as it is merged into the next one.
+ */
+template <typename K> void kway_set_operation(SetOperation op, std::vector<SortedRun<K>> runs, std::vector<K> &out) {
+    if (runs.size() == 1 && op == SetOperation::MERGE) {
+        out.insert(out.end(), runs[0].first, runs[0].last);
+        return;
+    }
+    if (runs.size() == 1) {
+        std::unique_copy(runs[0].first, runs[0].last, std::back_inserter(out));
+        return;
+    }
+
+    if (op == SetOperation::INTERSECTION && runs.size() > 2) {
+        std::sort(runs.begin(), runs.end(), [](auto &a, auto &b) { return a.size() < b.size(); });
+        for (auto &lead = runs[0]; !lead.empty();) {
+            auto x = *lead.first;
+            auto agree = true;
+            for (size_t i = 1; i < runs.size() && agree; ++i) {
+                runs[i].seek(x);
+                if (runs[i].empty())
+                    return;
+                agree = *runs[i].first == x;
+                if (!agree)
+                    lead.seek(*runs[i].first);
+            }
+            if (agree) {
+                out.push_back(x);
+                lead.pop();
+            }
+        }
+        return;
+    }
+
+    std::vector<std::vector<K>> buffers; // The intermediate results, which runs may point to
+    buffers.reserve(runs.size());
+    auto free_buffer = [&](const SortedRun<K> &run) {
+        auto it = std::find_if(buffers.begin(), buffers.end(),
+                               [&](auto &b) { return !b.empty() && b.data() == run.first; });
+        if (it != buffers.end())
+            std::vector<K>().swap(*it);
+    };
+    auto shortest_last = [](auto &a, auto &b) { return a.size() > b.size(); };
+    if (op != SetOperation::DIFFERENCE)
+        std::make_heap(runs.begin(), runs.end(), shortest_last);
+    while (runs.size() > 2) {
+        SortedRun<K> a, b;
+        if (op == SetOperation::DIFFERENCE) {
+            a = runs[0];
+            b = runs[1];
+            runs.erase(runs.begin() + 1);
+        } else {
+            std::pop_heap(runs.begin(), runs.end(), shortest_last);
+            a = runs.back();
+            runs.pop_back();
+            std::pop_heap(runs.begin(), runs.end(), shortest_last);
+            b = runs.back();
+            runs.pop_back();
+        }
+        auto &merged = buffers.emplace_back();
+        merged.reserve(op == SetOperation::DIFFERENCE ? a.size() : a.size() + b.size());
+        binary_set_operation(op, a, b, merged);
+        free_buffer(a);
+        free_buffer(b);
+        SortedRun<K> run{merged.data(), merged.data() + merged.size()};
+        if (op == SetOperation::DIFFERENCE)
+            runs[0] = run;
+        else {
+            runs.push_back(run);
+            std::push_heap(runs.begin(), runs.end(), shortest_last);
+        }
+    }
+    binary_set_operation(op, runs[0], runs[1], out);
+}
+
+/**
+ * An expression of set operations on containers. Nested operations with the same associative operation, or a
+ * difference as the first operand of a difference, are flattened into a single k-way operation. A merge, which keeps
+ * the duplicates, is not parsed from a tuple, but can be built around the parsed operands, see merge_all.
+ */
+template <typename K> struct SetExpression {
+    SetOperation op = SetOperation::UNION;
+    std::vector<SetExpression> operands;
+    const PGMWrapper<K> *container = nullptr; ///< The container, if this is not an operation.
+
+    /**
+     * Parses a tuple (operation, operand, operand, ...) whose operands are containers or nested tuples, and sets first
+     * to the leftmost container. Must be called with the GIL held.
+     */
+    static SetExpression parse(py::handle expr, const PGMWrapper<K> *&first) {
+        SetExpression e;
+        if (py::isinstance<PGMWrapper<K>>(expr)) {
+            e.container = &expr.cast<const PGMWrapper<K> &>();
+            first = first ? first : e.container;
+            return e;
+        }
+        if (!py::isinstance<py::tuple>(expr) || py::len(expr) < 2)
+            throw py::value_error("invalid set expression");
+        auto t = py::reinterpret_borrow<py::tuple>(expr);
+        e.op = operation(t[0]);
+        for (size_t i = 1; i < t.size(); ++i) {
+            auto operand = parse(t[i], first);
+            auto flatten = !operand.container && operand.op == e.op
+                           && (e.op != SetOperation::DIFFERENCE || i == 1);
+            if (!flatten)
+                e.operands.push_back(std::move(operand));
+            else
+                for (auto &inner : operand.operands)
+                    e.operands.push_back(std::move(inner));
+        }
+        return e;
+    }
+
+    static SetOperation operation(py::handle name) {
+        auto s = py::isinstance<py::str>(name) ? name.cast<std::string>() : std::string();
+        if (s == "union")
+            return SetOperation::UNION;
+        if (s == "intersection")
+            return SetOperation::INTERSECTION;
+        if (s == "difference")
+            return SetOperation::DIFFERENCE;
+        if (s == "symmetric_difference")
+            return SetOperation::SYMMETRIC_DIFFERENCE;
+        throw py::value_error("invalid set expression");
+    }
+
+    /** An upper bound on the number of elements of the result. */
+    size_t size_bound() const {
+        if (container)
+            return container->size();
+        size_t n = op == SetOperation::INTERSECTION ? std::numeric_limits<size_t>::max() : 0;
+        for (size_t i = 0; i < operands.size(); ++i) {
+            if (op == SetOperation::INTERSECTION)
+                n = std::min(n, operands[i].size_bound());
+            else if (op != SetOperation::DIFFERENCE || i == 0)
+                n += operands[i].size_bound();
+        }
+        return n;
+    }
+
+    /**
+     * Returns the distinct elements of the result of the operation, or all of them for a merge. Nested operations and packed containers are
+     * expanded into temporary vectors, which are freed as soon as the operation is done. The pending updates of the
+     * containers are ignored, as in lower_bound.
+     */
+    std::vector<K> evaluate() const {
+        std::vector<std::vector<K>> buffers;
+        buffers.reserve(operands.size());
+        std::vector<SortedRun<K>> runs;
+        for (auto &operand : operands) {
+            if (operand.container && !operand.container->is_packed()) {
+                auto indexed = operand.container->is_indexed() ? operand.container : nullptr;
+                runs.push_back({operand.container->begin(), operand.container->end(), indexed});
+                continue;
+            }
+            if (operand.container)
+                operand.container->with_elements([&](auto first, auto last) { buffers.emplace_back(first, last); });
+            else
+                buffers.push_back(operand.evaluate());
+            runs.push_back({buffers.back().data(), buffers.back().data() + buffers.back().size()});
+        }
+        std::vector<K> out;
+        out.reserve(size_bound());
+        kway_set_operation(op, std::move(runs), out);
         out.shrink_to_fit();
-        return new PGMWrapper<K>(std::move(out), generates_duplicates, epsilon);
+        return out;
+    }
+};
+
+/**
+ * Returns a container with the result of the given set expression, see SetExpression::parse, whose index is built on
+ * first use. Its parameters are those of the leftmost container in the expression.
+ */
+template <typename K> PGMWrapper<K> *fused_set_operation(const py::tuple &expr) {
+    const PGMWrapper<K> *first = nullptr;
+    auto e = SetExpression<K>::parse(expr, first);
+    auto release = release_gil_if_large(e.size_bound());
+    return PGMWrapper<K>::deferred(e.evaluate(), false, *first, !release);
+}
+
+/**
+ * Returns a container with all the elements of the given containers, whose index is built on first use. Its parameters
+ * are those of the first container.
+ */
+template <typename K> PGMWrapper<K> *merge_all(const py::sequence &containers) {
+    const PGMWrapper<K> *first = nullptr;
+    SetExpression<K> e;
+    e.op = SetOperation::MERGE;
+    for (auto c : containers) {
+        if (!py::isinstance<PGMWrapper<K>>(c))
+            throw py::type_error("merge_all expects containers of the same type");
+        e.operands.push_back(SetExpression<K>::parse(c, first));
+    }
+    if (e.operands.empty())
+        throw py::value_error("merge_all expects at least one container");
+    auto release = release_gil_if_large(e.size_bound());
+    return PGMWrapper<K>::deferred(e.evaluate(), true, *first, !release);
+}
+
+/**
+ * A sorted sequence of strings, which are either all str or all bytes, and are compared as the bytes of their UTF-8
+ * encoding (which is the order of their code points). The strings are stored one after the other in an arena, and
+ * indexed by a PGM-index on their keys: the big-endian integers of their first 8 bytes after the prefix common to
+ * all the strings, padded with zeros. Keys preserve the order of the strings, so that a query finds the run of
+ * strings with the key of the query, and compares the full strings only in that run.
+ */
+class StringPGM {
+    std::string arena;
+    std::vector<uint64_t> offsets{0}; ///< The start of each string in the arena, followed by the arena size.
+    std::string common;               ///< The prefix common to all the strings.
+    std::unique_ptr<PGMWrapper<uint64_t>> index;
+    size_t distinct_keys = 0;
+    size_t epsilon;
+    std::optional<bool> text; ///< Whether the strings are str rather than bytes, or nullopt if there are none.
+
+    static uint64_t key(std::string_view s, size_t skip) {
+        uint64_t k = 0;
+        for (size_t i = skip; i < skip + 8; ++i)
+            k = k << 8 | (i < s.size() ? uint8_t(s[i]) : 0);
+        // The largest key is reserved by the index: strings sharing the one below it are told apart by bound
+        return std::min(k, std::numeric_limits<uint64_t>::max() - 1);
+    }
+
+    /** Builds the index on the arena. */
+    void build(bool release_gil) {
+        auto n = size();
+        common.clear();
+        if (n > 0) {
+            auto first = at(0);
+            auto last = at(n - 1);
+            auto lcp = std::mismatch(first.begin(), first.begin() + std::min(first.size(), last.size()), last.begin());
+            common = first.substr(0, lcp.first - first.begin());
+        }
+
+        std::vector<uint64_t> keys(n);
+        distinct_keys = 0;
+        for (size_t i = 0; i < n; ++i) {
+            keys[i] = key(at(i), common.size());
+            distinct_keys += i == 0 || keys[i] != keys[i - 1];
+        }
+        index = std::make_unique<PGMWrapper<uint64_t>>(std::move(keys), distinct_keys < n, epsilon, EPSILON_RECURSIVE,
+                                                       false, false, false, release_gil);
+    }
+
+    /** Returns the UTF-8 bytes of s, which must have the same type as the strings in the container. */
+    std::string_view view(py::handle s) const {
+        auto is_str = PyUnicode_Check(s.ptr());
+        if (!is_str && !PyBytes_Check(s.ptr()))
+            throw py::type_error("strings must be str or bytes");
+        if (text && *text != bool(is_str))
+            throw py::type_error("can't compare str and bytes");
+        if (!is_str)
+            return {PyBytes_AS_STRING(s.ptr()), size_t(PyBytes_GET_SIZE(s.ptr()))};
+        Py_ssize_t size;
+        auto data = PyUnicode_AsUTF8AndSize(s.ptr(), &size);
+        if (!data)
+            throw py::error_already_set();
+        return {data, size_t(size)};
+    }
+
+  public:
+    StringPGM(py::iterable strings, size_t epsilon) : epsilon(epsilon) {
+        // The views point into the objects, which are kept alive by owners until the arena is built
+        py::list owners;
+        std::vector<std::string_view> views;
+        for (auto s : strings) {
+            views.push_back(view(s));
+            if (!text)
+                text = PyUnicode_Check(s.ptr());
+            owners.append(s);
+        }
+
+        py::gil_scoped_release release;
+        if (!std::is_sorted(views.begin(), views.end()))
+            parallel_sort(views.data(), views.data() + views.size(), get_threads());
+        size_t total = 0;
+        for (auto v : views)
+            total += v.size();
+        arena.reserve(total);
+        offsets.reserve(views.size() + 1);
+        for (auto v : views) {
+            arena.append(v);
+            offsets.push_back(arena.size());
+        }
+        build(false);
+    }
+
+    StringPGM(std::string &&arena, std::vector<uint64_t> &&offsets, size_t epsilon, std::optional<bool> text)
+        : arena(std::move(arena)), offsets(std::move(offsets)), epsilon(epsilon), text(text) {
+        build(true);
+    }
+
+    size_t size() const { return offsets.size() - 1; }
+
+    std::string_view at(size_t i) const { return {arena.data() + offsets[i], offsets[i + 1] - offsets[i]}; }
+
+    py::object get(size_t i) const {
+        auto s = at(i);
+        if (text.value_or(false))
+            return py::str(s.data(), s.size());
+        return py::bytes(s.data(), s.size());
+    }
+
+    /** Returns the i-th string, where negative values of i count from the end. */
+    py::object getitem(py::ssize_t i) const {
+        if (i < 0)
+            i += size();
+        if (i < 0 || size_t(i) >= size())
+            throw py::index_error("index out of range");
+        return get(i);
+    }
+
+    /** Returns the strings in positions [start, stop) as a list. */
+    py::list to_list(size_t start, size_t stop) const {
+        py::list out;
+        for (auto i = start; i < std::min(stop, size()); ++i)
+            out.append(get(i));
+        return out;
+    }
+
+    /** Returns a new container with the strings selected by slice, which stay sorted even if its step is negative. */
+    StringPGM *slice(py::slice slice) const {
+        size_t start, stop, step, length;
+        if (!slice.compute(size(), &start, &stop, &step, &length))
+            throw py::error_already_set();
+        auto first = py::ssize_t(step) < 0 ? start + (length - 1) * step : start;
+        auto stride = py::ssize_t(step) < 0 ? -step : step;
+
+        std::string sub_arena;
+        std::vector<uint64_t> sub_offsets{0};
+        sub_offsets.reserve(length + 1);
+        for (size_t j = 0; j < length; ++j) {
+            sub_arena.append(at(first + j * stride));
+            sub_offsets.push_back(sub_arena.size());
+        }
+        return new StringPGM(std::move(sub_arena), std::move(sub_offsets), epsilon, length ? text : std::nullopt);
+    }
+
+    /** Returns the position of the first string > x (or >= x, if !Upper). */
+    template <bool Upper> size_t bound(py::handle s) const {
+        auto x = view(s);
+        auto head = x.substr(0, common.size());
+        if (head != common)
+            return head < common ? 0 : size();
+
+        auto k = key(x, common.size());
+        auto lo = index->lower_bound(k);
+        auto hi = lo < size() && (*index)[lo] == k ? index->upper_bound(k) : lo;
+        while (lo < hi) {
+            auto mid = lo + (hi - lo) / 2;
+            auto y = at(mid);
+            if (Upper ? !(x < y) : y < x)
+                lo = mid + 1;
+            else
+                hi = mid;
+        }
+        return lo;
+    }
+
+    bool contains(py::handle s) const {
+        auto i = bound<false>(s);
+        return i < size() && at(i) == view(s);
+    }
+
+    size_t count(py::handle s) const { return bound<true>(s) - bound<false>(s); }
+
+    std::pair<size_t, size_t> range_bounds(py::handle a, py::handle b, std::pair<bool, bool> inclusive) const {
+        auto l = inclusive.first ? bound<false>(a) : bound<true>(a);
+        auto r = inclusive.second ? bound<true>(b) : bound<false>(b);
+        return {l, std::max(l, r)};
+    }
+
+    py::dict stats() const {
+        auto stats = index->stats();
+        stats["data size"] = arena.capacity() + offsets.capacity() * sizeof(uint64_t) + sizeof(*this);
+        stats["index size"] = stats["index size"].cast<size_t>() + index->size() * sizeof(uint64_t);
+        stats["common prefix"] = py::bytes(common);
+        stats["distinct keys"] = distinct_keys;
+        return stats;
+    }
+
+    py::tuple get_state() const {
+        py::array_t<uint64_t> o(offsets.size());
+        std::copy(offsets.begin(), offsets.end(), o.mutable_data());
+        return py::make_tuple(py::bytes(arena), o, epsilon, text ? py::object(py::bool_(*text)) : py::none());
+    }
+
+    static StringPGM *from_state(const py::tuple &state) {
+        auto o = state[1].cast<py::array_t<uint64_t, py::array::c_style | py::array::forcecast>>();
+        auto arena = state[0].cast<std::string>();
+        std::vector<uint64_t> offsets(o.data(), o.data() + o.size());
+        if (offsets.empty() || offsets.front() != 0 || offsets.back() != arena.size()
+            || !std::is_sorted(offsets.begin(), offsets.end()))
+            throw py::value_error("invalid state");
+        return new StringPGM(std::move(arena), std::move(offsets), state[2].cast<size_t>(),
+                             state[3].cast<std::optional<bool>>());
     }
 };
 
+template <typename K> using query_array = py::array_t<K, py::array::c_style | py::array::forcecast>;
+
+template <typename K> query_array<K> to_query_array(py::handle queries) {
+    auto a = py::array::ensure(queries);
+    if (!a)
+        throw py::type_error("queries must be an array-like object");
+    if (std::is_integral_v<K> && a.dtype().kind() == 'f')
+        throw py::type_error("can't search floating-point values in a container of integers");
+    if constexpr (std::is_integral_v<K>) {
+        // Integers of a wider type would wrap around when cast, so they must be in the range of K
+        auto kind = a.dtype().kind();
+        auto numpy = py::module_::import("numpy");
+        if ((kind == 'i' || kind == 'u') && a.size() > 0
+            && !numpy.attr("can_cast")(a.dtype(), py::dtype::of<K>(), "safe").template cast<bool>()) {
+            auto lowest = py::int_(std::numeric_limits<K>::min());
+            auto highest = py::int_(std::numeric_limits<K>::max());
+            if (py::int_(a.attr("min")()) < lowest || py::int_(a.attr("max")()) > highest)
+                throw std::overflow_error("queries contain values that can't be represented by the container type");
+        }
+    }
+    return a.cast<query_array<K>>();
+}
+
+/**
+ * Returns the number of threads to answer a batch of n queries with, given the one requested by the caller. Batches
+ * smaller than PARALLEL_BATCH_THRESHOLD are answered serially, as the cost of waking the threads would dominate.
+ */
+int batch_threads(std::optional<int> threads, py::ssize_t n) {
+    if (threads && *threads < 1)
+        throw py::value_error("the number of threads must be positive");
+    return n < PARALLEL_BATCH_THRESHOLD ? 1 : threads.value_or(get_threads());
+}
+
+template <typename R, typename K, typename F>
+py::array_t<R> batch_query(const PGMWrapper<K> &p, py::handle queries, std::optional<int> threads, F f) {
+    auto in = to_query_array<K>(queries);
+    py::array_t<R> out(std::vector<py::ssize_t>(in.shape(), in.shape() + in.ndim()));
+    auto in_ptr = in.data();
+    auto out_ptr = out.mutable_data();
+    auto n = in.size();
+    auto t = batch_threads(threads, n);
+    {
+        py::gil_scoped_release release;
+        auto lock = p.read_lock();
+#pragma omp parallel for num_threads(t) schedule(static) if (t > 1)
+        for (py::ssize_t i = 0; i < n; ++i)
+            out_ptr[i] = f(in_ptr[i]);
+    }
+    return out;
+}
+
+template <typename K, typename F>
+py::tuple batch_find(const PGMWrapper<K> &p, py::handle queries, std::optional<int> threads, F f) {
+    auto in = to_query_array<K>(queries);
+    std::vector<py::ssize_t> shape(in.shape(), in.shape() + in.ndim());
+    py::array_t<K> values(shape);
+    py::array_t<bool> found(shape);
+    auto in_ptr = in.data();
+    auto values_ptr = values.mutable_data();
+    auto found_ptr = found.mutable_data();
+    auto n = in.size();
+    auto t = batch_threads(threads, n);
+    {
+        py::gil_scoped_release release;
+        auto lock = p.read_lock();
+#pragma omp parallel for num_threads(t) schedule(static) if (t > 1)
+        for (py::ssize_t i = 0; i < n; ++i) {
+            auto result = f(in_ptr[i]);
+            found_ptr[i] = result.has_value();
+            values_ptr[i] = result.value_or(K());
+        }
+    }
+    return py::make_tuple(values, found);
+}
+
+/** Returns the Morton codes of the rows of a two-dimensional array of unsigned coordinates. */
+py::array_t<uint64_t> morton_encode(py::array_t<uint64_t, py::array::c_style | py::array::forcecast> points) {
+    if (points.ndim() != 2)
+        throw py::value_error("points must be a two-dimensional array");
+    MortonCurve curve(points.shape(1));
+    auto n = points.shape(0);
+    py::array_t<uint64_t> out(n);
+    auto in_ptr = points.data();
+    auto out_ptr = out.mutable_data();
+    auto release = release_gil_if_large(n);
+    for (py::ssize_t i = 0; i < n; ++i)
+        out_ptr[i] = curve.encode(in_ptr + i * curve.dimensions);
+    return out;
+}
+
+/** Returns the positions of the Morton codes in p of the points in the box with corners of codes zmin and zmax. */
+py::array_t<py::ssize_t> morton_range(const PGMWrapper<uint64_t> &p, uint64_t zmin, uint64_t zmax,
+                                      size_t dimensions) {
+    MortonCurve curve(dimensions);
+    std::vector<py::ssize_t> positions;
+    {
+        py::gil_scoped_release release;
+        auto lock = p.read_lock();
+        p.with_elements([&](auto first, auto last) {
+            auto n = size_t(last - first);
+            for (auto i = p.lower_bound(zmin); i < n && first[i] <= zmax;) {
+                auto z = first[i];
+                if (curve.in_box(z, zmin, zmax)) {
+                    positions.push_back(i++);
+                    continue;
+                }
+                // Skip to the next code in the box, unless it is the one following z
+                auto next = curve.next_in_box(z, zmin, zmax);
+                if (++i < n && first[i] < next)
+                    i = p.lower_bound(next);
+            }
+        });
+    }
+    py::array_t<py::ssize_t> out(positions.size());
+    std::copy(positions.begin(), positions.end(), out.mutable_data());
+    return out;
+}
+
 template <typename K> void declare_class(py::module &m, const std::string &name) {
     using PGM = PGMWrapper<K>;
-    py::class_<PGM>(m, name.c_str())
+    py::class_<PGM>(m, name.c_str(), py::buffer_protocol())
         .def(py::init<>())
-        .def(py::init<const PGM &, bool, size_t>())
-        .def(py::init<py::iterator, size_t, bool, size_t>())
+        .def(py::init<const PGM &, bool, size_t, size_t, bool, bool, bool>())
+        .def(py::init<py::iterator, size_t, bool, size_t, size_t, bool, bool, bool>())
+        .def(py::init<py::buffer, bool, size_t, size_t, bool, bool, bool>())
+
+        // buffer protocol, exposing the elements as a read-only array
+        .def_buffer([](const PGM &p) {
+            if (p.is_packed())
+                throw py::buffer_error("packed elements can't be exported through the buffer protocol");
+            static K empty;
+            auto ptr = p.size() ? &*p.begin() : &empty;
+            return py::buffer_info(const_cast<K *>(ptr), sizeof(K), py::format_descriptor<K>::format(), 1,
+                                   {p.size()}, {sizeof(K)}, true);
+        })
 
         // sequence protocol
-        .def("__len__", &PGM::size)
+        .def("__len__", &PGM::size_with_updates)
 
         .def("__contains__", &PGM::contains)
 
@@ -368,6 +3095,7 @@ template <typename K> void declare_class(py::module &m, const std::string &name)
                 if (!slice.compute(p.size(), &start, &stop, &step, &length))
                     throw py::error_already_set();
 
+                auto release = release_gil_if_large(length);
                 bool duplicates = false;
                 std::vector<K> out;
                 out.reserve(length);
@@ -383,7 +3111,7 @@ template <typename K> void declare_class(py::module &m, const std::string &name)
                     out.push_back(x);
                 }
 
-                return new PGM(std::move(out), duplicates, p.get_epsilon());
+                return PGM::deferred(std::move(out), duplicates, p, !release);
             },
             "slice"_a.noconvert())
 
@@ -399,53 +3127,37 @@ template <typename K> void declare_class(py::module &m, const std::string &name)
             "i"_a.noconvert())
 
         .def(
-            "__iter__", [](const PGM &p) { return py::make_iterator(p.begin(), p.end()); }, py::keep_alive<0, 1>())
+            "__iter__",
+            [](const PGM &p) {
+                return p.with_elements([](auto first, auto last) -> py::iterator {
+                    return py::make_iterator(first, last);
+                });
+            },
+            py::keep_alive<0, 1>())
 
         .def(
             "__reversed__",
             [](const PGM &p) {
-                return py::make_iterator(std::make_reverse_iterator(p.end()), std::make_reverse_iterator(p.begin()));
+                return p.with_elements([](auto first, auto last) -> py::iterator {
+                    return py::make_iterator(std::make_reverse_iterator(last), std::make_reverse_iterator(first));
+                });
             },
             py::keep_alive<0, 1>())
 
         // query operations
-        .def("bisect_left", [](const PGM &p, K x) { return std::distance(p.begin(), p.lower_bound(x)); })
+        .def("bisect_left", &PGM::bisect_left)
 
-        .def("bisect_right", [](const PGM &p, K x) { return std::distance(p.begin(), p.upper_bound(x)); })
+        .def("bisect_right", &PGM::bisect_right)
 
-        .def("find_lt",
-             [](const PGM &p, K x) {
-                 auto it = p.lower_bound(x);
-                 if (it <= p.begin())
-                     return py::object(py::cast(nullptr));
-                 return py::cast(*(it - 1));
-             })
+        .def("find_lt", [](const PGM &p, K x) { return p.find_prev(x, true); })
 
-        .def("find_le",
-             [](const PGM &p, K x) {
-                 auto it = p.upper_bound(x);
-                 if (it <= p.begin())
-                     return py::object(py::cast(nullptr));
-                 return py::cast(*(it - 1));
-             })
+        .def("find_le", [](const PGM &p, K x) { return p.find_prev(x, false); })
 
-        .def("find_gt",
-             [](const PGM &p, K x) -> py::object {
-                 auto it = p.upper_bound(x);
-                 if (it >= p.end())
-                     return py::object(py::cast(nullptr));
-                 return py::cast(*it);
-             })
+        .def("find_gt", [](const PGM &p, K x) { return p.find_next(x, true); })
 
-        .def("find_ge",
-             [](const PGM &p, K x) -> py::object {
-                 auto it = p.lower_bound(x);
-                 if (it >= p.end())
-                     return py::object(py::cast(nullptr));
-                 return py::cast(*it);
-             })
+        .def("find_ge", [](const PGM &p, K x) { return p.find_next(x, false); })
 
-        .def("rank", [](const PGM &p, K x) { return std::distance(p.begin(), p.upper_bound(x)); })
+        .def("rank", &PGM::bisect_right)
 
         .def("approximate_rank",
              [](const PGM &p, K x) {
@@ -453,35 +3165,103 @@ template <typename K> void declare_class(py::module &m, const std::string &name)
                  return std::make_tuple(r, lo, hi);
              })
 
-        .def("count",
-             [](const PGM &p, K x) -> size_t {
-                 auto lb = p.lower_bound(x);
-                 if (lb >= p.end() || *lb != x)
-                     return 0;
-                 return std::distance(lb, p.upper_bound(x));
-             })
+        .def("count", &PGM::count)
 
         .def("range",
              [](const PGM &p, K a, K b, std::pair<bool, bool> inclusive, bool reverse) {
-                 auto l_it = inclusive.first ? p.lower_bound(a) : p.upper_bound(a);
-                 auto r_it = inclusive.second ? p.upper_bound(b) : p.lower_bound(b);
-                 if (reverse)
-                     return py::make_iterator(std::make_reverse_iterator(r_it), std::make_reverse_iterator(l_it));
-                 return py::make_iterator(l_it, r_it);
+                 auto [l, r] = p.range_positions(a, b, inclusive);
+                 return p.with_elements([&, l = l, r = r](auto first, auto) -> py::iterator {
+                     if (reverse)
+                         return py::make_iterator(std::make_reverse_iterator(first + r),
+                                                  std::make_reverse_iterator(first + l));
+                     return py::make_iterator(first + l, first + r);
+                 });
              },
              py::keep_alive<0, 1>())
 
+        .def("range_bounds", &PGM::range_bounds)
+
+        .def("range_count",
+             [](const PGM &p, K a, K b, std::pair<bool, bool> inclusive) {
+                 auto [l, r] = p.range_bounds(a, b, inclusive);
+                 return r - l;
+             })
+
+        // batch query operations
+        .def("bisect_left_many",
+             [](const PGM &p, py::object xs, std::optional<int> threads) {
+                 return batch_query<py::ssize_t>(p, xs, threads, [&](K x) { return p.bisect_left(x); });
+             },
+             "xs"_a, "threads"_a = py::none())
+
+        .def("bisect_right_many",
+             [](const PGM &p, py::object xs, std::optional<int> threads) {
+                 return batch_query<py::ssize_t>(p, xs, threads, [&](K x) { return p.bisect_right(x); });
+             },
+             "xs"_a, "threads"_a = py::none())
+
+        .def("contains_many",
+             [](const PGM &p, py::object xs, std::optional<int> threads) {
+                 return batch_query<bool>(p, xs, threads, [&](K x) { return p.contains(x); });
+             },
+             "xs"_a, "threads"_a = py::none())
+
+        .def("count_many",
+             [](const PGM &p, py::object xs, std::optional<int> threads) {
+                 return batch_query<py::ssize_t>(p, xs, threads, [&](K x) { return p.count(x); });
+             },
+             "xs"_a, "threads"_a = py::none())
+
+        .def("find_lt_many",
+             [](const PGM &p, py::object xs, std::optional<int> threads) {
+                 return batch_find(p, xs, threads, [&](K x) { return p.find_prev(x, true); });
+             },
+             "xs"_a, "threads"_a = py::none())
+
+        .def("find_le_many",
+             [](const PGM &p, py::object xs, std::optional<int> threads) {
+                 return batch_find(p, xs, threads, [&](K x) { return p.find_prev(x, false); });
+             },
+             "xs"_a, "threads"_a = py::none())
+
+        .def("find_gt_many",
+             [](const PGM &p, py::object xs, std::optional<int> threads) {
+                 return batch_find(p, xs, threads, [&](K x) { return p.find_next(x, true); });
+             },
+             "xs"_a, "threads"_a = py::none())
+
+        .def("find_ge_many",
+             [](const PGM &p, py::object xs, std::optional<int> threads) {
+                 return batch_find(p, xs, threads, [&](K x) { return p.find_next(x, false); });
+             },
+             "xs"_a, "threads"_a = py::none())
+
+        // updates
+        .def("add", &PGM::add)
+
+        .def("update", &PGM::template update<PGM>)
+        .def("update", &PGM::template update<py::iterator>)
+
+        .def("discard", &PGM::discard)
+
+        .def("remove_range", &PGM::remove_range)
+
+        .def("compaction_due", &PGM::compaction_due)
+
+        .def("compacted", &PGM::compacted)
+
+        .def("copy", &PGM::copy)
+
         // list-like operations
         .def("index",
              [](const PGM &p, K x, std::optional<ssize_t> start, std::optional<ssize_t> stop) -> py::object {
-                 auto it = p.lower_bound(x);
-                 auto index = (size_t) std::distance(p.begin(), it);
+                 auto index = p.lower_bound(x);
 
                  size_t left, right, step, length;
                  auto slice = py::slice(start.value_or(0), stop.value_or(p.size()), 1);
                  slice.compute(p.size(), &left, &right, &step, &length);
 
-                 if (it >= p.end() || *it != x || index < left || index > right)
+                 if (index >= p.size() || p[index] != x || index < left || index > right)
                      throw py::value_error(std::to_string(x) + " is not in PGMIndex");
                  return py::cast(index);
              })
@@ -490,9 +3270,16 @@ template <typename K> void declare_class(py::module &m, const std::string &name)
         .def("merge", &PGM::template merge<const PGM &>)
         .def("merge", &PGM::template merge<py::iterator>)
 
-        .def("drop_duplicates", [](const PGM &p) { return new PGM(p, true, p.get_epsilon()); })
+        .def("drop_duplicates",
+             [](const PGM &p) {
+                 return new PGM(p, true, p.get_epsilon(), p.get_epsilon_recursive(), p.is_compressed(), p.is_packed(),
+                                p.has_radix_table());
+             })
 
         // set operations
+        .def_static("fused", &fused_set_operation<K>, "expr"_a)
+        .def_static("merge_all", &merge_all<K>, "containers"_a)
+        .def("is_indexed", &PGM::is_indexed)
         .def("difference", &PGM::template set_difference<const PGM &>)
         .def("difference", &PGM::template set_difference<py::iterator>)
 
@@ -505,6 +3292,8 @@ template <typename K> void declare_class(py::module &m, const std::string &name)
         .def("intersection", &PGM::template set_intersection<const PGM &>)
         .def("intersection", &PGM::template set_intersection<py::iterator>)
 
+        .def("disjoint", py::overload_cast<const PGM &, size_t>(&PGM::disjoint, py::const_))
+        .def("disjoint", py::overload_cast<py::iterator, size_t>(&PGM::disjoint, py::const_))
         .def("subset", py::overload_cast<const PGM &, size_t, bool>(&PGM::template subset<false>, py::const_))
         .def("subset", py::overload_cast<py::iterator, size_t, bool>(&PGM::template subset<false>, py::const_))
 
@@ -518,11 +3307,82 @@ template <typename K> void declare_class(py::module &m, const std::string &name)
         .def("not_equal_to", py::overload_cast<py::iterator, size_t>(&PGM::not_equal_to, py::const_))
 
         // other methods
+        .def(py::pickle([](const PGM &p) { return p.get_state(py::none(), 4); }, &PGM::from_state))
+
+        .def("__reduce_ex__",
+             [](py::object self, int protocol) {
+                 // Like object.__reduce_ex__, but passing the protocol to get_state
+                 auto state = self.cast<const PGM &>().get_state(self, protocol);
+                 auto newobj = py::module_::import("copyreg").attr("__newobj__");
+                 return py::make_tuple(newobj, py::make_tuple(py::type::of(self)), state);
+             })
+
+        .def("save", &PGM::save)
+
         .def("stats", &PGM::stats)
 
         .def("segment", &PGM::segment)
 
-        .def("has_duplicates", &PGM::has_duplicates);
+        .def("segments_array", &PGM::segments_array)
+
+        .def("set_instrumented", &PGM::set_instrumented)
+
+        .def("query_stats", &PGM::query_stats)
+
+        .def("has_duplicates", &PGM::has_duplicates)
+
+        .def("is_packed", &PGM::is_packed)
+
+        .def(
+            "to_array",
+            [](const PGM &p, std::optional<size_t> start, std::optional<size_t> stop) {
+                // A copy of the elements, which is the only way to get them as an array when they are packed
+                auto l = std::min(start.value_or(0), p.size());
+                auto r = std::max(l, std::min(stop.value_or(p.size()), p.size()));
+                py::array_t<K> out(r - l);
+                auto out_ptr = out.mutable_data();
+                py::gil_scoped_release release;
+                p.with_elements([&](auto first, auto) { std::copy(first + l, first + r, out_ptr); });
+                return out;
+            },
+            "start"_a = py::none(), "stop"_a = py::none());
+
+    using Builder = typename PGM::Builder;
+    py::class_<Builder>(m, (name + "Builder").c_str())
+        .def(py::init<bool, size_t, size_t, bool, bool, bool>())
+        .def("extend", py::overload_cast<py::buffer>(&Builder::extend))
+        .def("extend", py::overload_cast<py::iterator>(&Builder::extend))
+        .def("__len__", &Builder::size)
+        .def("finish", &Builder::finish);
+}
+
+template <typename K> bool load_if_matches(const FileHeader &h, const py::buffer &b, const py::buffer_info &info,
+                                           py::object &out) {
+    if (h.key_format != py::format_descriptor<K>::format()[0])
+        return false;
+    out = py::cast(PGMWrapper<K>::load(b, info, h), py::return_value_policy::take_ownership);
+    return true;
+}
+
+py::tuple load(const py::buffer &b) {
+    auto info = b.request();
+    FileHeader h;
+    if ((size_t) (info.size * info.itemsize) < sizeof(h))
+        throw py::value_error("not a PyGM file");
+    std::memcpy(&h, info.ptr, sizeof(h));
+    if (std::memcmp(h.magic, "PyGM", 4) != 0)
+        throw py::value_error("not a PyGM file");
+    if (h.byte_order != 0x01020304)
+        throw py::value_error("PyGM file written with a different byte order");
+    if (h.version == 0 || h.version > FILE_FORMAT_VERSION)
+        throw py::value_error("unsupported PyGM file version " + std::to_string(h.version));
+
+    py::object out;
+    if (load_if_matches<uint32_t>(h, b, info, out) || load_if_matches<int32_t>(h, b, info, out)
+        || load_if_matches<int64_t>(h, b, info, out) || load_if_matches<uint64_t>(h, b, info, out)
+        || load_if_matches<float>(h, b, info, out) || load_if_matches<double>(h, b, info, out))
+        return py::make_tuple(std::string(1, h.typecode), out);
+    throw py::value_error("invalid or unsupported PyGM file");
 }
 
 PYBIND11_MODULE(_pygm, m) {
@@ -532,4 +3392,43 @@ PYBIND11_MODULE(_pygm, m) {
     declare_class<uint64_t>(m, "PGMIndexUInt64");
     declare_class<float>(m, "PGMIndexFloat");
     declare_class<double>(m, "PGMIndexDouble");
+
+    py::class_<StringPGM>(m, "PGMIndexStrings")
+        .def(py::init<py::iterable, size_t>())
+        .def("__len__", &StringPGM::size)
+        .def("__getitem__", &StringPGM::getitem)
+        .def("__contains__", &StringPGM::contains)
+        .def("to_list", &StringPGM::to_list)
+        .def("slice", &StringPGM::slice)
+        .def("bisect_left", &StringPGM::bound<false>)
+        .def("bisect_right", &StringPGM::bound<true>)
+        .def("count", &StringPGM::count)
+        .def("range_bounds", &StringPGM::range_bounds)
+        .def("stats", &StringPGM::stats)
+        .def(py::pickle([](const StringPGM &p) { return p.get_state(); }, &StringPGM::from_state));
+
+    m.def("load", &load);
+    m.def("morton_encode", &morton_encode, "points"_a);
+    m.def("morton_range", &morton_range, "p"_a, "zmin"_a, "zmax"_a, "dimensions"_a);
+    m.def("get_threads", &get_threads, R"(Return the number of threads used to build containers and to answer
+    batches of queries.
+
+    Returns:
+        int: the number of threads
+    )");
+    m.def("set_threads", &set_threads, "threads"_a, R"(Set the number of threads used to build containers and to
+    answer batches of queries.
+
+    Sorting the elements, fitting the segments of the index, and large
+    batches of queries such as those of ``bisect_left_many`` are split among
+    ``threads`` threads. Zero restores the default, which is the
+    number of threads chosen by OpenMP, usually one per core or the value
+    of the ``OMP_NUM_THREADS`` environment variable.
+
+    Args:
+        threads (int): the number of threads, or zero for the default
+
+    Raises:
+        ValueError: if ``threads`` is negative
+    )");
 }
\ No newline at end of file
@@ -1,26 +1,68 @@
 import collections.abc
+import mmap as _mmap
+import os
+import sys
+import time
 
 from . import _pygm
 
+_NATIVE_BYTE_ORDER = "@=" + ("<" if sys.byteorder == "little" else ">")
+_TUNING_EPSILONS = (16, 32, 64, 128, 256, 512, 1024)
+_TUNING_EPSILONS_RECURSIVE = (2, 4, 8, 16)
+
 
 class SortedContainer(collections.abc.Sequence):
+    @property
+    def _impl(self):
+        # The index with the pending updates merged in, as needed by the
+        # methods that access elements by position
+        if self._dirty:
+            self._impl = self._pgm.compacted()
+        return self._pgm
+
+    @_impl.setter
+    def _impl(self, impl):
+        self._pgm = impl
+        self._dirty = False
+
+    def _updated(self, changed):
+        if changed:
+            self._dirty = True
+            if self._pgm.compaction_due():
+                self._impl = self._pgm.compacted()
+
     @staticmethod
-    def _fromtypecode(typecode, *args):
+    def _impl_class(typecode):
         if typecode in "BHI":
-            return _pygm.PGMIndexUInt32(*args)
+            return _pygm.PGMIndexUInt32
         elif typecode in "LQN":
-            return _pygm.PGMIndexUInt64(*args)
+            return _pygm.PGMIndexUInt64
         elif typecode in "bhi":
-            return _pygm.PGMIndexInt32(*args)
+            return _pygm.PGMIndexInt32
         elif typecode in "lqn":
-            return _pygm.PGMIndexInt64(*args)
+            return _pygm.PGMIndexInt64
         elif typecode in "ef":
-            return _pygm.PGMIndexFloat(*args)
+            return _pygm.PGMIndexFloat
         elif typecode in "d":
-            return _pygm.PGMIndexDouble(*args)
+            return _pygm.PGMIndexDouble
         else:
             raise TypeError("Unsupported typecode")
 
+    @staticmethod
+    def _fromtypecode(typecode, *args):
+        return SortedContainer._impl_class(typecode)(*args)
+
+    @staticmethod
+    def _infer_typecode(o):
+        # The typecode of a sequence of Python numbers, which must not be a
+        # one-shot iterator as it is traversed
+        return "d" if any(isinstance(x, float) for x in o) else "q"
+
+    def _operand(self):
+        # The index of self as an operand of a deferred set operation, see
+        # SortedSet._operation
+        return self._impl
+
     @staticmethod
     def _impl_or_iter(o):
         n = len(o) if hasattr(o, "__len__") else 0
@@ -28,13 +70,96 @@ class SortedContainer(collections.abc.Sequence):
         return (o, n)
 
     @staticmethod
-    def _initwitharg(self, o, typecode, epsilon, drop_duplicates):
-        has_len = hasattr(o, "__len__")
-        if o is None or (has_len and len(o) == 0):
-            self._typecode = "q"
-            self._impl = _pygm.PGMIndexInt64()
-            return
+    def _buffer_typecode(o):
+        try:
+            v = memoryview(o)
+        except (TypeError, BufferError):
+            return None
+        fmt = v.format
+        if len(fmt) == 2 and fmt[0] in _NATIVE_BYTE_ORDER:
+            fmt = fmt[1:]
+        if v.ndim == 1 and len(fmt) == 1 and fmt in "bBhHiIlLqQnNfd":
+            return fmt
+        return None
 
+    @staticmethod
+    def _load(path, mmap):
+        with open(path, "rb") as f:
+            if mmap:
+                buffer = _mmap.mmap(f.fileno(), 0, access=_mmap.ACCESS_READ)
+            else:
+                buffer = f.read()
+        return _pygm.load(buffer)
+
+    @staticmethod
+    def _tune(cls, data, typecode, max_index_bytes, target_latency_ns,
+              sample_queries, compressed, packed, radix):
+        import numpy as np
+        if max_index_bytes is None and target_latency_ns is None:
+            raise ValueError("either max_index_bytes or target_latency_ns "
+                             "must be given")
+
+        base = cls(data, typecode, packed=packed)
+        elements = base.to_numpy()
+        if sample_queries is None:
+            rng = np.random.default_rng(42)
+            sample_queries = rng.choice(elements, min(len(elements), 10000))
+        queries = np.asarray(sample_queries)
+
+        # Skip the epsilons whose index would exceed the budget, as estimated
+        # on every k-th element: with epsilon / k, its index has about as many
+        # segments as the index on all the elements
+        epsilons = _TUNING_EPSILONS
+        if max_index_bytes is not None:
+            k = max(1, min(epsilons[0] // 4, len(elements) // 2 ** 16))
+            sample = elements[::k]
+
+            def estimate(epsilon):
+                c = cls(sample, base._typecode, epsilon // k, compressed,
+                        radix=radix)
+                return c.stats()["index size"]
+
+            fitting = [e for e in epsilons if estimate(e) <= max_index_bytes]
+            epsilons = fitting or epsilons[-1:]
+
+        def measure(epsilon, epsilon_recursive):
+            c = cls(base, None, epsilon, compressed, packed, radix,
+                    epsilon_recursive)
+            best = float("inf")
+            for _ in range(3):
+                start = time.perf_counter()
+                c.bisect_left_many(queries, threads=1)
+                best = min(best, time.perf_counter() - start)
+            latency = best / max(len(queries), 1) * 1e9
+            return c, {"epsilon": epsilon,
+                       "epsilon recursive": epsilon_recursive,
+                       "index size": c.stats()["index size"],
+                       "latency": latency}
+
+        def best_of(candidates):
+            # The smallest index meeting both budgets, if the latency one is
+            # given, otherwise the fastest. Failing that, the closest one
+            def key(candidate):
+                params = candidate[1]
+                fits = max_index_bytes is None or \
+                    params["index size"] <= max_index_bytes
+                fast = target_latency_ns is None or \
+                    params["latency"] <= target_latency_ns
+                if target_latency_ns is None:
+                    return (not fits, params["latency"])
+                return (not fits, not fast, params["index size"]
+                        if fast else params["latency"])
+            return min(candidates, key=key)
+
+        # Tune epsilon with the default recursive epsilon, then the latter
+        best = best_of([measure(e, 4) for e in epsilons])
+        others = [e for e in _TUNING_EPSILONS_RECURSIVE if e != 4]
+        epsilon = best[1]["epsilon"]
+        return best_of([best] + [measure(epsilon, e) for e in others])
+
+    @staticmethod
+    def _initwitharg(self, o, typecode, epsilon, drop_duplicates, compressed,
+                     packed, radix=False, epsilon_recursive=4):
         # Init from internal _pygm objects
         if isinstance(o, (_pygm.PGMIndexUInt32, _pygm.PGMIndexUInt64,
                           _pygm.PGMIndexInt32, _pygm.PGMIndexInt64,
@@ -44,12 +169,46 @@ class SortedContainer(collections.abc.Sequence):
             self._impl = o
             return
 
+        tinit = SortedContainer._fromtypecode
+
+        # Init from a container of the same type, possibly sharing its
+        # elements and its index
+        if isinstance(o, SortedContainer) and typecode in (None, o._typecode):
+            self._typecode = o._typecode
+            self._impl = tinit(self._typecode, o._impl, drop_duplicates,
+                               epsilon, epsilon_recursive, compressed, packed,
+                               radix)
+            return
+
+        # Keep the typecode and epsilon of empty containers, as elements can
+        # be added later
+        has_len = hasattr(o, "__len__")
+        if o is None or (has_len and len(o) == 0):
+            self._typecode = typecode or SortedContainer._buffer_typecode(o) or "q"
+            self._impl = tinit(self._typecode, iter(()), 0, drop_duplicates,
+                               epsilon, epsilon_recursive, compressed, packed,
+                               radix)
+            return
+
+        # Init from an object supporting the buffer protocol, without
+        # converting its elements to Python objects
+        buffer_typecode = SortedContainer._buffer_typecode(o)
+        if buffer_typecode:
+            self._typecode = typecode or buffer_typecode
+            self._impl = tinit(self._typecode, o, drop_duplicates, epsilon,
+                               epsilon_recursive, compressed, packed, radix)
+            return
+
         # Init from an iterable
         is_iterable = isinstance(o, collections.abc.Iterable)
         if is_iterable:
+            if not typecode and iter(o) is o:
+                # Inferring the typecode would consume the iterator
+                o = list(o)
+                has_len = True
             len_hint = len(o) if has_len else 0
-            args = (len_hint, drop_duplicates, epsilon)
-            tinit = SortedContainer._fromtypecode
+            args = (len_hint, drop_duplicates, epsilon, epsilon_recursive,
+                    compressed, packed, radix)
 
             if typecode:  # user-provided typecode
                 self._typecode = typecode
@@ -61,12 +220,11 @@ class SortedContainer(collections.abc.Sequence):
                 self._typecode = v.format
                 self._impl = tinit(v.format, iter(v), *args)
                 return
-            except TypeError:
+            except (TypeError, NotImplementedError, BufferError):
                 pass
 
             # Find the typecode by inspecting the type of the elements
-            anyfloat = any(isinstance(x, float) for x in o)
-            self._typecode = "d" if anyfloat else "q"
+            self._typecode = SortedContainer._infer_typecode(o)
             self._impl = tinit(self._typecode, iter(o), *args)
             return
 
@@ -80,7 +238,7 @@ class SortedContainer(collections.abc.Sequence):
         Returns:
             int: number of elements
         """
-        return self._impl.__len__()
+        return self._pgm.__len__()
 
     def __contains__(self, x):
         """Check whether ``self`` contains the given value ``x`` or not.
@@ -94,7 +252,7 @@ class SortedContainer(collections.abc.Sequence):
             bool: ``True`` if an element equal to ``x`` is found, ``False``
                 otherwise
         """
-        return self._impl.__contains__(x)
+        return self._pgm.__contains__(x)
 
     def bisect_left(self, x):
         """Locate the insertion point for ``x`` to maintain sorted order.
@@ -111,7 +269,7 @@ class SortedContainer(collections.abc.Sequence):
         Returns:
             int: insertion index in sorted list
         """
-        return self._impl.bisect_left(x)
+        return self._pgm.bisect_left(x)
 
     def bisect_right(self, x):
         """Locate the insertion point for ``x`` to maintain sorted order.
@@ -128,7 +286,7 @@ class SortedContainer(collections.abc.Sequence):
         Returns:
             int: insertion index in sorted list
         """
-        return self._impl.bisect_right(x)
+        return self._pgm.bisect_right(x)
 
     def find_lt(self, x):
         """Find the rightmost element less than ``x``.
@@ -140,7 +298,7 @@ class SortedContainer(collections.abc.Sequence):
             value of the rightmost element ``< x``, or ``None`` if no such
             element is found
         """
-        return self._impl.find_lt(x)
+        return self._pgm.find_lt(x)
 
     def find_le(self, x):
         """Find the rightmost element less than or equal to ``x``
@@ -152,7 +310,7 @@ class SortedContainer(collections.abc.Sequence):
             value of the rightmost element ``<= x``, or ``None`` if no such
             element is found
         """
-        return self._impl.find_le(x)
+        return self._pgm.find_le(x)
 
     def find_gt(self, x):
         """Find the leftmost element greater than ``x``.
@@ -164,7 +322,7 @@ class SortedContainer(collections.abc.Sequence):
             value of the leftmost element ``> x``, or ``None`` if no such
             element is found
         """
-        return self._impl.find_gt(x)
+        return self._pgm.find_gt(x)
 
     def find_ge(self, x):
         """Find the leftmost element greater than or equal to ``x``.
@@ -176,7 +334,7 @@ class SortedContainer(collections.abc.Sequence):
             value of the leftmost element ``>= x``, or ``None`` if no such
             element is found
         """
-        return self._impl.find_ge(x)
+        return self._pgm.find_ge(x)
 
     def rank(self, x):
         """Return the number of elements less than or equal to ``x``.
@@ -187,7 +345,7 @@ class SortedContainer(collections.abc.Sequence):
         Returns:
             int: number of elements ``<= x``
         """
-        return self._impl.rank(x)
+        return self._pgm.rank(x)
 
     def approximate_rank(self, x):
         """
@@ -213,7 +371,183 @@ class SortedContainer(collections.abc.Sequence):
         Returns:
             int: number of elements ``== x``
         """
-        return self._impl.count(x)
+        return self._pgm.count(x)
+
+    def bisect_left_many(self, xs, threads=None):
+        """Vectorised version of :func:`bisect_left`.
+
+        The whole batch is processed in C++ without holding the GIL, and
+        batches of at least 16384 values are split among ``threads`` threads.
+
+        Args:
+            xs (array-like): values to compare the elements to, given as a
+                NumPy array or any object supporting the buffer protocol
+            threads (int, optional): number of threads to use. Defaults to
+                the value returned by :func:`pygm.get_threads`.
+
+        Returns:
+            numpy.ndarray: insertion indexes, with the same shape as ``xs``
+        """
+        return self._pgm.bisect_left_many(xs, threads)
+
+    def bisect_right_many(self, xs, threads=None):
+        """Vectorised version of :func:`bisect_right`.
+
+        The whole batch is processed in C++ without holding the GIL, and
+        batches of at least 16384 values are split among ``threads`` threads.
+
+        Args:
+            xs (array-like): values to compare the elements to, given as a
+                NumPy array or any object supporting the buffer protocol
+            threads (int, optional): number of threads to use. Defaults to
+                the value returned by :func:`pygm.get_threads`.
+
+        Returns:
+            numpy.ndarray: insertion indexes, with the same shape as ``xs``
+        """
+        return self._pgm.bisect_right_many(xs, threads)
+
+    def contains_many(self, xs, threads=None):
+        """Vectorised version of :func:`__contains__`.
+
+        The whole batch is processed in C++ without holding the GIL, and
+        batches of at least 16384 values are split among ``threads`` threads.
+
+        Args:
+            xs (array-like): values to search, given as a NumPy array or any
+                object supporting the buffer protocol
+            threads (int, optional): number of threads to use. Defaults to
+                the value returned by :func:`pygm.get_threads`.
+
+        Returns:
+            numpy.ndarray: boolean mask, with the same shape as ``xs``, that
+                is ``True`` where an element equal to the value is found
+        """
+        return self._pgm.contains_many(xs, threads)
+
+    def rank_many(self, xs, threads=None):
+        """Vectorised version of :func:`rank`.
+
+        The whole batch is processed in C++ without holding the GIL, and
+        batches of at least 16384 values are split among ``threads`` threads.
+
+        Args:
+            xs (array-like): values to compare the elements to, given as a
+                NumPy array or any object supporting the buffer protocol
+            threads (int, optional): number of threads to use. Defaults to
+                the value returned by :func:`pygm.get_threads`.
+
+        Returns:
+            numpy.ndarray: number of elements ``<=`` each value, with the same
+                shape as ``xs``
+        """
+        return self._pgm.bisect_right_many(xs, threads)
+
+    def count_many(self, xs, threads=None):
+        """Vectorised version of :func:`count`.
+
+        The whole batch is processed in C++ without holding the GIL, and
+        batches of at least 16384 values are split among ``threads`` threads.
+
+        Args:
+            xs (array-like): values to count, given as a NumPy array or any
+                object supporting the buffer protocol
+            threads (int, optional): number of threads to use. Defaults to
+                the value returned by :func:`pygm.get_threads`.
+
+        Returns:
+            numpy.ndarray: number of elements ``==`` each value, with the same
+                shape as ``xs``
+        """
+        return self._pgm.count_many(xs, threads)
+
+    def find_lt_many(self, xs, threads=None):
+        """Vectorised version of :func:`find_lt`.
+
+        Args:
+            xs (array-like): values to compare the elements to, given as a
+                NumPy array or any object supporting the buffer protocol
+            threads (int, optional): number of threads to use. Defaults to
+                the value returned by :func:`pygm.get_threads`.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: the rightmost elements
+                ``< x`` for each value ``x``, and a boolean mask that is
+                ``False`` where no such element is found (the corresponding
+                entries of the first array are zero)
+        """
+        return self._pgm.find_lt_many(xs, threads)
+
+    def find_le_many(self, xs, threads=None):
+        """Vectorised version of :func:`find_le`.
+
+        Args:
+            xs (array-like): values to compare the elements to, given as a
+                NumPy array or any object supporting the buffer protocol
+            threads (int, optional): number of threads to use. Defaults to
+                the value returned by :func:`pygm.get_threads`.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: the rightmost elements
+                ``<= x`` for each value ``x``, and a boolean mask that is
+                ``False`` where no such element is found (the corresponding
+                entries of the first array are zero)
+        """
+        return self._pgm.find_le_many(xs, threads)
+
+    def find_gt_many(self, xs, threads=None):
+        """Vectorised version of :func:`find_gt`.
+
+        Args:
+            xs (array-like): values to compare the elements to, given as a
+                NumPy array or any object supporting the buffer protocol
+            threads (int, optional): number of threads to use. Defaults to
+                the value returned by :func:`pygm.get_threads`.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: the leftmost elements
+                ``> x`` for each value ``x``, and a boolean mask that is
+                ``False`` where no such element is found (the corresponding
+                entries of the first array are zero)
+        """
+        return self._pgm.find_gt_many(xs, threads)
+
+    def find_ge_many(self, xs, threads=None):
+        """Vectorised version of :func:`find_ge`.
+
+        Args:
+            xs (array-like): values to compare the elements to, given as a
+                NumPy array or any object supporting the buffer protocol
+            threads (int, optional): number of threads to use. Defaults to
+                the value returned by :func:`pygm.get_threads`.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: the leftmost elements
+                ``>= x`` for each value ``x``, and a boolean mask that is
+                ``False`` where no such element is found (the corresponding
+                entries of the first array are zero)
+        """
+        return self._pgm.find_ge_many(xs, threads)
+
+    def discard(self, x):
+        """Remove an element equal to ``x`` from ``self``, if present.
+
+        Args:
+            x: value to remove
+        """
+        self._updated(self._pgm.discard(x))
+
+    def remove_range(self, a, b, inclusive=(True, True)):
+        """Remove all the elements between ``a`` and ``b``.
+
+        Args:
+            a: lower bound value
+            b: upper bound value
+            inclusive (tuple[bool, bool], optional): a pair of boolean
+                indicating whether the bounds are inclusive (``True``) or
+                exclusive (``False``). Defaults to ``(True, True)``
+        """
+        self._updated(self._pgm.remove_range(a, b, inclusive))
 
     def range(self, a, b, inclusive=(True, True), reverse=False):
         """Return an iterator over elements between ``a`` and ``b``.
@@ -232,6 +566,68 @@ class SortedContainer(collections.abc.Sequence):
         """
         return self._impl.range(a, b, inclusive, reverse)
 
+    def range_bounds(self, a, b, inclusive=(True, True)):
+        """Return the positions delimiting the elements between ``a`` and
+        ``b``.
+
+        Args:
+            a: lower bound value
+            b: upper bound value
+            inclusive (tuple[bool, bool], optional): a pair of boolean
+                indicating whether the bounds are inclusive (``True``) or
+                exclusive (``False``). Defaults to ``(True, True)``
+
+        Returns:
+            tuple[int, int]: the position of the first element in the range,
+                and the position past the last one, so that ``self[i:j]``
+                are the elements in the range
+        """
+        return self._pgm.range_bounds(a, b, inclusive)
+
+    def range_count(self, a, b, inclusive=(True, True)):
+        """Return the number of elements between ``a`` and ``b``.
+
+        Unlike iterating :func:`range`, this takes logarithmic time.
+
+        Args:
+            a: lower bound value
+            b: upper bound value
+            inclusive (tuple[bool, bool], optional): a pair of boolean
+                indicating whether the bounds are inclusive (``True``) or
+                exclusive (``False``). Defaults to ``(True, True)``
+
+        Returns:
+            int: number of elements in the range
+        """
+        return self._pgm.range_count(a, b, inclusive)
+
+    def range_slice(self, a, b, inclusive=(True, True)):
+        """Return a read-only NumPy array with the elements between ``a`` and
+        ``b``.
+
+        The array is a view on the internal storage, like :func:`to_numpy`,
+        so it is obtained in logarithmic time. If the elements are packed,
+        only those in the range are decoded into a new array.
+
+        Args:
+            a: lower bound value
+            b: upper bound value
+            inclusive (tuple[bool, bool], optional): a pair of boolean
+                indicating whether the bounds are inclusive (``True``) or
+                exclusive (``False``). Defaults to ``(True, True)``
+
+        Returns:
+            numpy.ndarray: read-only array with the elements in the range
+        """
+        import numpy as np
+        impl = self._impl
+        left, right = impl.range_bounds(a, b, inclusive)
+        if impl.is_packed():
+            a = impl.to_array(left, right)
+            a.flags.writeable = False
+            return a
+        return np.asarray(impl)[left:right]
+
     def index(self, x, start=None, stop=None):
         """Return the first index of ``x``.
 
@@ -256,13 +652,23 @@ class SortedContainer(collections.abc.Sequence):
         The keys are:
 
         * ``'data size'`` size of the elements in bytes
+        * ``'packed'`` whether the elements are packed
         * ``'index size'`` size of the index in bytes
-        * ``'segment size'`` size of a segment in bytes
+        * ``'segment size'`` size of a segment in bytes, on average if the
+          index is compressed
         * ``'leaf segments'`` number of segments in the last level of the index
         * ``'segments counts'`` number of segments in each level of the index
         * ``'height'`` number of levels of the index
         * ``'epsilon'`` error bound for the last level of the index
         * ``'epsilon recursive'`` error bound for the upper levels of the index
+        * ``'compressed'`` whether the index is compressed
+        * ``'uncompressed index size'`` size in bytes the index would have
+          if it were not compressed
+        * ``'distinct slopes'`` number of distinct slopes in the last level
+          of the index, only if compressed
+        * ``'radix'`` whether queries use a radix table
+        * ``'radix table size'`` size of the radix table in bytes, which is
+          included in ``'index size'``
         * ``'typecode'`` type of the elements
 
         Returns:
@@ -290,6 +696,73 @@ class SortedContainer(collections.abc.Sequence):
         """
         return self._impl.segment(level_num, segment_num)
 
+    def segments_array(self, level_num=0):
+        """Return all the segments of a level of the index as arrays.
+
+        This is the bulk version of :func:`segment`, for analysing indexes
+        with many segments. Level ``0`` is the last level, the one that
+        predicts the positions of the elements.
+
+        Args:
+            level_num (int, optional): the level number. Defaults to 0.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]: the keys, the
+                slopes and the intercepts of the segments in the level
+        """
+        return self._impl.segments_array(level_num)
+
+    def instrument(self, enabled=True):
+        """Enable or disable the counters of the searches in the index.
+
+        Enabling the counters resets them. While they are enabled, every
+        query that searches the index, including the ones in batches, updates
+        them with a few atomic operations, and they can be read with
+        :func:`query_stats`. This must not run concurrently with other
+        operations on ``self``.
+
+        Args:
+            enabled (bool, optional): whether to count the searches. Defaults
+                to True.
+        """
+        self._pgm.set_instrumented(enabled)
+
+    def query_stats(self):
+        """Return the counters of the searches in the index, enabled by
+        :func:`instrument`.
+
+        The keys are:
+
+        * ``'searches'`` number of searches in the index
+        * ``'levels traversed'`` total number of levels of the index
+          traversed by the searches, one per search with a radix table
+        * ``'mean error'`` average distance between the position predicted
+          by the index and the true position
+        * ``'max error'`` maximum distance between the position predicted by
+          the index and the true position
+        * ``'out of window'`` number of searches whose true position was
+          outside the window around the prediction, as after a long run of
+          duplicates, and was found with an exponential search
+        * ``'window histogram'`` list whose entry ``i`` counts the searches
+          whose last-mile window had size in ``[2 ** (i - 1), 2 ** i)``, and
+          entry ``0`` those with an empty window
+        * ``'error histogram'`` list whose entry ``i`` counts the searches
+          whose error was in ``[2 ** (i - 1), 2 ** i)``, and entry ``0``
+          those with no error
+        * ``'segment searches'`` NumPy array with the number of searches in
+          each segment returned by ``segments_array(0)``
+        * ``'segment errors'`` NumPy array with the total error of the
+          searches in each segment returned by ``segments_array(0)``
+
+        Queries on pending updates do not search the index and are not
+        counted. When the pending updates are merged into a new index, the
+        counters are kept, except those of the segments, which restart.
+
+        Returns:
+            dict[str, object]: the counters, or ``None`` if they are disabled
+        """
+        return self._pgm.query_stats()
+
     def __iter__(self):
         """Return an iterator over the elements of ``self``.
 
@@ -310,6 +783,111 @@ class SortedContainer(collections.abc.Sequence):
         """
         return self._impl.__reversed__()
 
+    def save(self, path):
+        """Save ``self`` to a binary file, including the index.
+
+        The file can be loaded back with the ``load`` class method, possibly
+        by memory-mapping it instead of reading it. Its layout is:
+
+        ====== ======================= ======================================
+        Offset Size                    Content
+        ====== ======================= ======================================
+        0      4                       magic string ``b"PyGM"``
+        4      4                       ``0x01020304``, to detect byte order
+        8      4                       file format version (``1`` to ``3``)
+        12     1                       buffer format of the elements
+        13     1                       typecode of ``self``
+        14     1                       size of an element in bytes
+        15     1                       whether there may be duplicates
+        16     8                       number of elements ``n``
+        24     8                       ``'epsilon'``
+        32     8                       ``'epsilon recursive'``
+        40     8                       number of segments ``s``
+        48     8                       number of levels offsets ``l``
+        56     1                       whether the index is compressed
+        57     1                       whether the elements are packed
+        58     1                       whether to build a radix table
+        59     5                       reserved
+        64     ``n`` * element size    elements, zero-padded to a multiple
+                                       of 8 bytes
+        ...    ``s`` * segment size    segments of all the index levels
+        ...    ``l`` * 8               levels offsets
+        ====== ======================= ======================================
+
+        Integers and elements are stored in the native byte order. Files of
+        compressed indexes have version ``2``, the segments and levels offsets
+        are those of the upper levels of the index, and they are followed by
+        the size in bytes of the compressed last level and its serialisation.
+        Files of packed elements have version ``3``, and store the words of
+        the Elias-Fano representation of the elements in place of the
+        elements. The radix table is not stored, and it is rebuilt on load.
+
+        Args:
+            path (str or os.PathLike): path of the file to write
+        """
+        self._impl.save(os.fspath(path), self._typecode)
+
+    def to_numpy(self):
+        """Return a read-only NumPy array with the elements of ``self``.
+
+        The array is a view on the internal storage, so no element is copied
+        or converted to a Python object. If the elements are packed, they are
+        decoded into a new array instead.
+
+        Returns:
+            numpy.ndarray: read-only array with the elements of ``self``
+        """
+        import numpy as np
+        if self._impl.is_packed():
+            a = self._impl.to_array()
+            a.flags.writeable = False
+            return a
+        return np.asarray(self._impl)
+
+    def __array__(self, dtype=None, copy=None):
+        """Return the elements of ``self`` as a NumPy array.
+
+        ``self.__array__()`` <==> ``numpy.asarray(self)``
+
+        Unless a copy or a different ``dtype`` is requested, the result is a
+        read-only view on the internal storage, like :func:`to_numpy`.
+
+        Returns:
+            numpy.ndarray: array with the elements of ``self``
+
+        Raises:
+            ValueError: if ``copy`` is ``False`` and the elements are packed
+        """
+        import numpy as np
+        if self._impl.is_packed():
+            if copy is False:
+                raise ValueError("packed elements can't be accessed without "
+                                 "a copy")
+            return np.asarray(self._impl.to_array(), dtype=dtype)
+        if copy:
+            return np.array(self._impl, dtype=dtype)
+        return np.asarray(self._impl, dtype=dtype)
+
+    def __buffer__(self, flags):
+        """Return a read-only memoryview of the elements of ``self``.
+
+        ``self.__buffer__(flags)`` <==> ``memoryview(self)`` (Python 3.12+)
+
+        Returns:
+            memoryview: read-only view on the internal storage
+
+        Raises:
+            BufferError: if the elements are packed
+        """
+        return memoryview(self._impl)
+
+    def __getstate__(self):
+        impl = self._impl
+        state = self.__dict__.copy()
+        state["_pgm"] = impl
+        state["_dirty"] = False
+        return state
+
     def __repr__(self):
         """Return a string representation of self.
 
@@ -328,3 +906,99 @@ class SortedContainer(collections.abc.Sequence):
             else:
                 preview += "[%d, %d, %d, ..., %d, %d]" % fmt_args
         return "%s(%s)" % (self.__class__.__name__, preview)
+
+
+class Builder:
+    """Builds a sorted container from elements given in chunks.
+
+    Builders are returned by :func:`SortedList.builder` and
+    :func:`SortedSet.builder`. Each chunk passed to :func:`Builder.extend` is
+    copied into a growing native array, so that no Python object has to
+    hold all the elements at once. Then, :func:`Builder.finish` sorts the
+    elements, if needed, and builds the container.
+
+    Example:
+        >>> from pygm import SortedList
+        >>> builder = SortedList.builder('q')
+        >>> for chunk in ([5, 3], range(3), [9, 0]):
+        ...     builder.extend(chunk)
+        >>> builder.finish()
+        SortedList([0, 0, 1, ..., 5, 9])
+    """
+
+    def __init__(self, cls, typecode, epsilon, drop_duplicates, compressed,
+                 packed, radix, epsilon_recursive):
+        self._cls = cls
+        self._typecode = typecode
+        self._args = (drop_duplicates, epsilon, epsilon_recursive, compressed,
+                      packed, radix)
+        self._builder = None
+        self._inferred = not typecode
+        if typecode:
+            self._init_builder()
+
+    def _init_builder(self):
+        builder_class = SortedContainer._impl_class(self._typecode)
+        builder_class = getattr(_pygm, builder_class.__name__ + "Builder")
+        self._builder = builder_class(*self._args)
+
+    def extend(self, chunk):
+        """Add the elements in ``chunk``.
+
+        Chunks supporting the buffer protocol, such as NumPy arrays, are
+        copied without converting their elements to Python objects, and
+        without holding the GIL if they are large. If the builder has no
+        typecode, it is inferred from the first non-empty chunk, and the
+        elements of the later chunks must be safely castable to it.
+
+        Args:
+            chunk (iterable): a sequence of values, not necessarily sorted
+
+        Raises:
+            TypeError: if the typecode was inferred from a previous chunk and
+                the elements of ``chunk`` can't be safely cast to it
+            ValueError: if :func:`Builder.finish` was already called
+        """
+        import numpy as np
+        buffer_typecode = SortedContainer._buffer_typecode(chunk)
+        if not buffer_typecode and self._inferred:
+            chunk = list(chunk)
+        if self._inferred and (buffer_typecode or chunk):
+            typecode = (buffer_typecode or
+                        SortedContainer._infer_typecode(chunk))
+            if self._builder is None:
+                self._typecode = typecode
+                self._init_builder()
+            elif not np.can_cast(typecode, self._typecode, "safe"):
+                raise TypeError("Can't safely cast %r elements to the "
+                                "inferred typecode %r"
+                                % (typecode, self._typecode))
+        elif self._builder is None:
+            return
+        self._builder.extend(chunk if buffer_typecode else iter(chunk))
+
+    def finish(self):
+        """Return the container with all the elements added so far.
+
+        The builder can't be used anymore afterwards.
+
+        Returns:
+            SortedList or SortedSet: the new container
+
+        Raises:
+            ValueError: if :func:`Builder.finish` was already called
+        """
+        if self._builder is None:
+            self._typecode = "q"
+            self._init_builder()
+        return self._cls(self._builder.finish(), self._typecode)
+
+    def __len__(self):
+        """Return the number of elements added so far.
+
+        ``self.__len__()`` <==> ``len(self)``
+
+        Returns:
+            int: number of elements added so far
+        """
+        return len(self._builder) if self._builder is not None else 0
@@ -0,0 +1,458 @@
+import collections.abc
+import functools
+
+from .sortedcontainer import SortedContainer
+from .sortedlist import SortedList
+from .sortedset import SortedSet
+
+_NAT = -2 ** 63  # the int64 value of NaT
+
+
+class _DatetimeContainer:
+    # A mixin storing datetimes as int64 counts of a unit since the epoch in
+    # a SortedList or SortedSet, whose methods are wrapped by
+    # _install_conversions to convert their arguments and results
+
+    def __init__(self, arg=None, unit=None, epsilon=64, compressed=False,
+                 packed=False, radix=False, epsilon_recursive=4):
+        import numpy as np
+        if unit is None:
+            dtype = getattr(arg, "dtype", None)
+            if isinstance(arg, _DatetimeContainer):
+                unit = arg._unit
+            elif dtype is not None and np.dtype(dtype).kind == "M":
+                unit = np.datetime_data(dtype)[0]
+            if unit in (None, "generic"):
+                unit = "ns"
+        np.dtype("M8[%s]" % unit)  # raises TypeError if unit is invalid
+        self._unit = unit
+
+        if isinstance(arg, _DatetimeContainer) and arg._unit == unit:
+            ticks = arg._ticks_view()
+        else:
+            ticks = None if arg is None else self._ticks_array(arg)
+        super().__init__(ticks, "q", epsilon, compressed, packed, radix,
+                         epsilon_recursive)
+
+    @property
+    def unit(self):
+        """The unit of the datetimes, such as ``'ns'`` or ``'s'``."""
+        return self._unit
+
+    @classmethod
+    def _fromticks(cls, container, unit):
+        # The datetime container sharing the index of a container of ticks
+        wrapper = (SortedDatetimeSet if isinstance(container, SortedSet)
+                   else SortedDatetimeList)
+        d = wrapper.__new__(wrapper)
+        d.__dict__.update(container.__dict__)
+        d._unit = unit
+        return d
+
+    @classmethod
+    def _combine_all(cls, method, containers):
+        # The result of a k-way method of SortedList or SortedSet on the
+        # ticks of containers, in the unit of the first datetime container
+        unit = next((c._unit for c in containers
+                     if isinstance(c, _DatetimeContainer)), "ns")
+        ticks = [c._ticks_view() if isinstance(c, _DatetimeContainer)
+                 and c._unit == unit else cls(c, unit)._ticks_view()
+                 for c in containers]
+        return cls._fromticks(method(*ticks), unit)
+
+    def _ticks_view(self):
+        # A container of ticks sharing the index of self
+        base = SortedSet if isinstance(self, SortedSet) else SortedList
+        return base(self._impl, "q")
+
+    def _ticks(self, x):
+        import numpy as np
+        t = int(np.datetime64(x, self._unit).view(np.int64))
+        if t == _NAT:
+            raise ValueError("NaT can't be stored or searched")
+        return t
+
+    def _ticks_array(self, xs):
+        import numpy as np
+        if not isinstance(xs, collections.abc.Sequence) \
+                and not hasattr(xs, "__array__"):
+            xs = list(xs)
+        a = np.asarray(xs, dtype="M8[%s]" % self._unit)
+        if np.isnat(a).any():
+            raise ValueError("NaT can't be stored or searched")
+        return a.view(np.int64)
+
+    def _ticks_other(self, other):
+        if isinstance(other, _DatetimeContainer):
+            if other._unit != self._unit:
+                other = type(other)(other, self._unit)
+            return other._ticks_view()
+        elif isinstance(other, SortedContainer):
+            return other
+        ticks = self._ticks_array(other).tolist()
+        return set(ticks) if isinstance(other, collections.abc.Set) else ticks
+
+    def _ticks_pair(self, other):
+        # Containers of the ticks of self and other for a comparison, in the
+        # finer of their units so that no datetime is truncated
+        import numpy as np
+        if isinstance(other, _DatetimeContainer) and other._unit != self._unit:
+            unit = np.datetime_data(np.promote_types(
+                "M8[%s]" % self._unit, "M8[%s]" % other._unit))[0]
+            return (type(self)(self, unit)._ticks_view(),
+                    type(other)(other, unit)._ticks_view())
+        return self._ticks_view(), self._ticks_other(other)
+
+    def _datetimes(self, result, kind):
+        import numpy as np
+        if kind == "value":
+            if result is None:
+                return None
+            if isinstance(result, SortedContainer):
+                return self._fromticks(result, self._unit)
+            return np.datetime64(int(result), self._unit)
+        if kind == "array":
+            return result.view("M8[%s]" % self._unit)
+        if kind == "found":
+            return self._datetimes(result[0], "array"), result[1]
+        if kind == "iter":
+            return (np.datetime64(t, self._unit) for t in result)
+        return result
+
+    @classmethod
+    def builder(cls, *args, **kwargs):
+        """Not supported: build a :class:`SortedList` of int64 ticks instead,
+        and pass it to the constructor with the ``unit`` of the ticks.
+
+        Raises:
+            NotImplementedError: always
+        """
+        raise NotImplementedError("%s has no builder" % cls.__name__)
+
+    @classmethod
+    def tuned(cls, *args, **kwargs):
+        """Not supported: tune a :class:`SortedList` of int64 ticks instead,
+        and pass it to the constructor with the ``unit`` of the ticks.
+
+        Raises:
+            NotImplementedError: always
+        """
+        raise NotImplementedError("%s can't be tuned" % cls.__name__)
+
+    @classmethod
+    def load(cls, path, mmap=True, unit="ns"):
+        """Load a container from a file written by :func:`save`.
+
+        The file stores the datetimes as int64 counts of ``unit``, which
+        must be the unit of the saved container.
+
+        Args:
+            path (str or os.PathLike): path of the file to read
+            mmap (bool, optional): whether to memory-map the file. Defaults to
+                ``True``
+            unit (str, optional): unit of the datetimes. Defaults to ``'ns'``
+
+        Returns:
+            the container stored in the file
+
+        Raises:
+            ValueError: if the file is not a valid PyGM file of int64 values
+        """
+        typecode, impl = SortedContainer._load(path, mmap)
+        if typecode not in "lq":
+            raise ValueError("the file does not store int64 values")
+        base = SortedSet if issubclass(cls, SortedSet) else SortedList
+        return cls._fromticks(base(impl, "q"), unit)
+
+    def to_numpy(self):
+        """Return a read-only NumPy array with the datetimes of ``self``.
+
+        The array has dtype ``datetime64`` of the unit of ``self``, and is a
+        view on the internal storage, unless the elements are packed.
+
+        Returns:
+            numpy.ndarray: read-only array with the datetimes of ``self``
+        """
+        return self._datetimes(super().to_numpy(), "array")
+
+    def __array__(self, dtype=None, copy=None):
+        """Return the datetimes of ``self`` as a NumPy array.
+
+        ``self.__array__()`` <==> ``numpy.asarray(self)``
+
+        Args:
+            dtype (numpy.dtype, optional): type of the result. Defaults to
+                ``datetime64`` of the unit of ``self``.
+            copy (bool, optional): whether to copy the elements. Defaults to
+                ``None``, meaning only if needed.
+
+        Returns:
+            numpy.ndarray: array with the datetimes of ``self``
+        """
+        import numpy as np
+        a = self.to_numpy()
+        if dtype is not None and np.dtype(dtype) != a.dtype:
+            if copy is False:
+                raise ValueError("a copy is needed to convert the datetimes")
+            return a.astype(dtype)
+        return a.copy() if copy else a
+
+    def stats(self):
+        """Return a dict containing statistics about ``self``.
+
+        The keys are those of :func:`SortedList.stats`, plus ``'unit'``, the
+        unit of the datetimes.
+
+        Returns:
+            dict[str, object]: a dictionary with stats about ``self``
+        """
+        d = super().stats()
+        d["unit"] = self._unit
+        return d
+
+    def __repr__(self):
+        """Return a string representation of self.
+
+        ``self.__repr__()`` <==> ``repr(self)``
+
+        Returns:
+            str: repr(self)
+        """
+        positions = range(len(self)) if len(self) < 6 else [0, 1, 2, -2, -1]
+        items = ["'%s'" % self[i] for i in positions]
+        if len(self) >= 6:
+            items.insert(3, "...")
+        return "%s([%s], unit=%r)" % (self.__class__.__name__,
+                                      ", ".join(items), self._unit)
+
+
+# For each method, how to convert its arguments and its result: "x" converts
+# the first argument, "ab" the first two, "xs" the first, which is an array,
+# "other" the first, which is an iterable, and "cmp" does the same but calls
+# the method on a container of ticks, converting both to the finer unit if
+# other is a datetime container with another unit. "subset" is like "cmp",
+# but accepts any iterable, as set.issubset does. A result "value" is a
+# datetime or a container, and the others are converted as their name
+# suggests.
+_COMMON_CONVERSIONS = {
+    "__contains__": ("x", None),
+    "__getitem__": ("", "value"),
+    "__iter__": ("", "iter"),
+    "__reversed__": ("", "iter"),
+    "add": ("x", None),
+    "approximate_rank": ("x", None),
+    "bisect_left": ("x", None),
+    "bisect_left_many": ("xs", None),
+    "bisect_right": ("x", None),
+    "bisect_right_many": ("xs", None),
+    "contains_many": ("xs", None),
+    "copy": ("", "value"),
+    "__copy__": ("", "value"),
+    "count": ("x", None),
+    "count_many": ("xs", None),
+    "discard": ("x", None),
+    "find_ge": ("x", "value"),
+    "find_ge_many": ("xs", "found"),
+    "find_gt": ("x", "value"),
+    "find_gt_many": ("xs", "found"),
+    "find_le": ("x", "value"),
+    "find_le_many": ("xs", "found"),
+    "find_lt": ("x", "value"),
+    "find_lt_many": ("xs", "found"),
+    "index": ("x", None),
+    "range": ("ab", "iter"),
+    "range_bounds": ("ab", None),
+    "range_count": ("ab", None),
+    "range_slice": ("ab", "array"),
+    "rank": ("x", None),
+    "rank_many": ("xs", None),
+    "remove": ("x", None),
+    "remove_range": ("ab", None),
+    "update": ("other", None),
+}
+
+_LIST_CONVERSIONS = dict(_COMMON_CONVERSIONS, **{
+    "__add__": ("other", "value"),
+    "__sub__": ("other", "value"),
+    "drop_duplicates": ("", "value"),
+}, **{name: ("cmp", None) for name in
+      ["__eq__", "__ne__", "__lt__", "__gt__", "__le__", "__ge__"]})
+
+_SET_CONVERSIONS = dict(_COMMON_CONVERSIONS, isdisjoint=("other", None), **{
+    name: ("other", "value") for name in
+    ["union", "difference", "symmetric_difference", "intersection",
+     "__or__", "__sub__", "__xor__", "__and__"]
+}, **{name: ("cmp", None) for name in
+      ["__eq__", "__ne__", "__lt__", "__gt__", "__le__", "__ge__"]},
+    issubset=("subset", None), issuperset=("subset", None))
+
+
+def _install_conversions(cls, base, conversions):
+    for name, (args_kind, result_kind) in conversions.items():
+        method = getattr(base, name)
+
+        def wrapper(self, *args, method=method, args_kind=args_kind,
+                    result_kind=result_kind, **kwargs):
+            target = self
+            if args_kind == "x":
+                args = (self._ticks(args[0]),) + args[1:]
+            elif args_kind == "ab":
+                args = (self._ticks(args[0]), self._ticks(args[1])) + args[2:]
+            elif args_kind == "xs":
+                args = (self._ticks_array(args[0]),) + args[1:]
+            elif args_kind == "other":
+                args = (self._ticks_other(args[0]),) + args[1:]
+            elif args_kind == "cmp":
+                try:
+                    target, other = self._ticks_pair(args[0])
+                except (TypeError, ValueError):
+                    return NotImplemented
+                args = (other,) + args[1:]
+            elif args_kind == "subset":
+                target, other = self._ticks_pair(args[0])
+                if not isinstance(other, (SortedSet, set)):
+                    other = set(other)
+                args = (other,) + args[1:]
+            result = method(target, *args, **kwargs)
+            if result_kind is None:
+                return result
+            return self._datetimes(result, result_kind)
+
+        functools.update_wrapper(wrapper, method)
+        setattr(cls, name, wrapper)
+
+
+class SortedDatetimeList(_DatetimeContainer, SortedList):
+    """A :class:`SortedList` of datetimes.
+
+    The list accepts the datetimes as ``numpy.datetime64`` values or arrays,
+    ``datetime.datetime`` or ``datetime.date`` objects, ISO 8601 strings, or
+    integers counting ``unit`` since the epoch, and it returns them as
+    ``numpy.datetime64`` values or arrays of the given ``unit``. Internally,
+    it stores them as int64 counts of ``unit``, so it takes the same memory
+    and has the same performance as a ``SortedList`` with typecode ``'q'``,
+    and arrays of datetimes are converted without creating Python objects.
+
+    If ``unit`` is not given, it is the one of ``arg`` if ``arg`` is a
+    ``datetime64`` array or another datetime container, and nanoseconds
+    otherwise. Datetimes with a finer unit are truncated to ``unit``,
+    including the values searched, and ``NaT`` is not allowed.
+
+    All the methods of :class:`SortedList` are available, except
+    :func:`SortedList.builder` and :func:`SortedList.tuned`. Files written
+    by :func:`SortedList.save` store the int64 counts, so that
+    :func:`SortedDatetimeList.load` needs the ``unit`` of the saved list.
+
+    Args:
+        arg (iterable, optional): initial datetimes. Defaults to None.
+        unit (str, optional): unit of the datetimes, as in
+            ``numpy.datetime64``. Defaults to None.
+        epsilon (int, optional): space-time trade-off parameter. Defaults
+            to 64.
+        compressed (bool, optional): whether to compress the index.
+            Defaults to False.
+        packed (bool, optional): whether to pack the elements. Defaults to
+            False.
+        radix (bool, optional): whether to search through a radix table.
+            Defaults to False.
+        epsilon_recursive (int, optional): space-time trade-off parameter
+            of the upper levels of the index. Defaults to 4.
+
+    Raises:
+        TypeError: if ``unit`` is not a valid unit
+        ValueError: if some datetime is ``NaT``
+
+    Example:
+        >>> import numpy as np
+        >>> from pygm import SortedDatetimeList
+        >>> events = np.array(['2024-03-01T12:00', '2024-01-15T08:30',
+        ...                    '2024-02-10T23:59'], dtype='datetime64[m]')
+        >>> sl = SortedDatetimeList(events)
+        >>> sl.find_gt('2024-02-01')
+        np.datetime64('2024-02-10T23:59')
+        >>> sl.range_slice('2024-02-01', '2024-12-31')
+        array(['2024-02-10T23:59', '2024-03-01T12:00'], dtype='datetime64[m]')
+    """
+
+    @classmethod
+    def merge_all(cls, *lists):
+        """Return a new ``SortedDatetimeList`` with the datetimes of all of
+        ``lists``, as :func:`SortedList.merge_all`.
+
+        The unit of the result is that of the first datetime container in
+        ``lists``, or nanoseconds if there is none.
+
+        Args:
+            *lists (iterable): sequences of datetimes
+
+        Returns:
+            SortedDatetimeList: new list with the merged datetimes
+        """
+        return cls._combine_all(SortedList.merge_all, lists)
+
+
+class SortedDatetimeSet(_DatetimeContainer, SortedSet):
+    """A :class:`SortedSet` of datetimes.
+
+    The set accepts and returns datetimes as :class:`SortedDatetimeList`
+    does, and it has all the methods of :class:`SortedSet`, except
+    :func:`SortedSet.builder` and :func:`SortedSet.tuned`.
+
+    Args:
+        arg (iterable, optional): initial datetimes. Defaults to None.
+        unit (str, optional): unit of the datetimes, as in
+            ``numpy.datetime64``. Defaults to None.
+        epsilon (int, optional): space-time trade-off parameter. Defaults
+            to 64.
+        compressed (bool, optional): whether to compress the index.
+            Defaults to False.
+        packed (bool, optional): whether to pack the elements. Defaults to
+            False.
+        radix (bool, optional): whether to search through a radix table.
+            Defaults to False.
+        epsilon_recursive (int, optional): space-time trade-off parameter
+            of the upper levels of the index. Defaults to 4.
+
+    Raises:
+        TypeError: if ``unit`` is not a valid unit
+        ValueError: if some datetime is ``NaT``
+    """
+
+    @classmethod
+    def union_all(cls, *sets):
+        """Return a new ``SortedDatetimeSet`` with the datetimes in at least
+        one of ``sets``, as :func:`SortedSet.union_all`.
+
+        The unit of the result is that of the first datetime container in
+        ``sets``, or nanoseconds if there is none.
+
+        Args:
+            *sets (iterable): sequences of datetimes
+
+        Returns:
+            SortedDatetimeSet: new set with the datetimes in the union
+        """
+        return cls._combine_all(SortedSet.union_all, sets)
+
+    @classmethod
+    def intersection_all(cls, *sets):
+        """Return a new ``SortedDatetimeSet`` with the datetimes found in all
+        of ``sets``, as :func:`SortedSet.intersection_all`.
+
+        The unit of the result is that of the first datetime container in
+        ``sets``, or nanoseconds if there is none.
+
+        Args:
+            *sets (iterable): sequences of datetimes
+
+        Returns:
+            SortedDatetimeSet: new set with the datetimes in the intersection
+
+        Raises:
+            TypeError: if no ``sets`` are given
+        """
+        return cls._combine_all(SortedSet.intersection_all, sets)
+
+
+_install_conversions(SortedDatetimeList, SortedList, _LIST_CONVERSIONS)
+_install_conversions(SortedDatetimeSet, SortedSet, _SET_CONVERSIONS)
@@ -0,0 +1,420 @@
+import collections.abc
+from array import array
+from operator import itemgetter
+
+from .sortedset import SortedSet
+
+
+class SortedDict(collections.abc.MutableMapping):
+    """A mapping whose keys are kept in sorted order and indexed by a
+    PGM-index.
+
+    The dictionary is initialised with the content of the provided mapping
+    or iterable of key-value pairs ``arg``. If a key is repeated, the last
+    value is kept, as for ``dict``.
+
+    The keys are stored in a :class:`SortedSet`, and the values in a payload
+    column aligned to the keys by position, so that finding a key also gives
+    its value. The ``typecode``, ``epsilon``, ``compressed``, ``packed`` and
+    ``radix`` arguments refer to the keys and have the same meaning as in
+    :class:`SortedSet`.
+
+    The ``value_typecode`` argument is a single character that makes the
+    payload column a compact `array <https://docs.python.org/3/library/array.html>`_
+    of fixed-width numbers of that type. If it is not specified, values can
+    be arbitrary Python objects.
+
+    Looking up or replacing the value of a key takes the time of a query on
+    the keys. Inserting or deleting a key also shifts the following values
+    in the payload column, which takes linear time but with a very small
+    constant. To build a large dictionary, pass all the pairs to the
+    constructor or to :func:`SortedDict.from_arrays` rather than inserting
+    them one by one.
+
+    Methods for accessing and querying items:
+
+    * :func:`SortedDict.__getitem__`
+    * :func:`SortedDict.__contains__`
+    * :func:`SortedDict.get`
+    * :func:`SortedDict.get_many`
+    * :func:`SortedDict.range`
+    * :func:`SortedDict.keys`
+    * :func:`SortedDict.values`
+    * :func:`SortedDict.items`
+
+    Methods for adding and removing items:
+
+    * :func:`SortedDict.__setitem__`
+    * :func:`SortedDict.__delitem__`
+    * :func:`SortedDict.clear`
+
+    Other methods:
+
+    * :func:`SortedDict.from_arrays`
+    * :func:`SortedDict.copy`
+    * :func:`SortedDict.__repr__`
+
+    Args:
+        arg (mapping or iterable, optional): initial items. Defaults to None.
+        typecode (char, optional): type of the keys. Defaults to None.
+        value_typecode (char, optional): type of the values. Defaults to
+            None, meaning any Python object.
+        epsilon (int, optional): space-time trade-off parameter. Defaults
+            to 64.
+        compressed (bool, optional): whether to compress the index.
+            Defaults to False.
+        packed (bool, optional): whether to pack the keys. Defaults to
+            False.
+        radix (bool, optional): whether to search the keys through a radix
+            table. Defaults to False.
+        epsilon_recursive (int, optional): space-time trade-off parameter
+            for the upper levels of the index. Defaults to 4.
+
+    Raises:
+        ValueError: if some distinct keys become equal once converted to
+            ``typecode``
+
+    Example:
+        >>> from pygm import SortedDict
+        >>> sd = SortedDict({5: 'e', 1: 'a', 3: 'c', 4: 'd'})
+        >>> sd[3]
+        'c'
+        >>> sd.get(2, '?')
+        '?'
+        >>> keys, values = sd.range(2, 4)
+        >>> list(keys), values
+        ([3, 4], ['c', 'd'])
+        >>> sd[2] = 'b'
+        >>> list(sd.items())[:3]
+        [(1, 'a'), (2, 'b'), (3, 'c')]
+    """
+
+    def __init__(self, arg=None, typecode=None, value_typecode=None,
+                 epsilon=64, compressed=False, packed=False, radix=False,
+                 epsilon_recursive=4):
+        if arg is None:
+            arg = ()
+        elif isinstance(arg, collections.abc.Mapping):
+            arg = arg.items()
+        pairs = sorted(dict(arg).items(), key=itemgetter(0))
+        keys = SortedSet([k for k, _ in pairs], typecode, epsilon,
+                         compressed, packed, radix, epsilon_recursive)
+        values = SortedDict._new_column(value_typecode)
+        values.extend(v for _, v in pairs)
+        SortedDict._initwithparts(self, keys, values)
+
+    @staticmethod
+    def _initwithparts(self, keys, values):
+        if len(keys) != len(values):
+            raise ValueError("keys must be distinct after their conversion "
+                             "to typecode '%s'" % keys.stats()['typecode'])
+        self._keys = keys
+        self._values = values
+
+    @staticmethod
+    def _new_column(value_typecode):
+        return array(value_typecode) if value_typecode else []
+
+    @classmethod
+    def from_arrays(cls, keys, values, typecode=None, value_typecode=None,
+                    epsilon=64, compressed=False, packed=False, radix=False,
+                    epsilon_recursive=4):
+        """Return a ``SortedDict`` with the given keys and values.
+
+        The arrays are sorted by key with NumPy, so that neither the keys nor
+        numeric values are converted to Python objects. If a key is repeated,
+        the value that comes last is kept. If ``value_typecode`` is not
+        specified and the values are fixed-width numbers, their type is kept.
+
+        Args:
+            keys (array-like): one-dimensional array of keys
+            values (array-like): array of values, one per key
+            typecode (char, optional): type of the keys. Defaults to None.
+            value_typecode (char, optional): type of the values. Defaults to
+                None.
+            epsilon (int, optional): space-time trade-off parameter. Defaults
+                to 64.
+            compressed (bool, optional): whether to compress the index.
+                Defaults to False.
+            packed (bool, optional): whether to pack the keys. Defaults to
+                False.
+            radix (bool, optional): whether to search the keys through a
+                radix table. Defaults to False.
+            epsilon_recursive (int, optional): space-time trade-off parameter
+                for the upper levels of the index. Defaults to 4.
+
+        Returns:
+            SortedDict: new dictionary with the given items
+
+        Raises:
+            ValueError: if the arrays have different lengths, or if some
+                distinct keys become equal once converted to ``typecode``
+        """
+        import numpy as np
+        keys = np.asarray(keys)
+        values = np.asarray(values)
+        if keys.ndim != 1 or values.ndim == 0 or len(keys) != len(values):
+            raise ValueError("keys and values must be arrays of the same "
+                             "length, and keys must be one-dimensional")
+
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        values = values[order]
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        keys = keys[last]
+        values = values[last]
+
+        if value_typecode is None and values.ndim == 1 and \
+                values.dtype.char in "bBhHiIlLqQfd":
+            value_typecode = values.dtype.char
+        column = SortedDict._new_column(value_typecode)
+        if value_typecode:
+            column.frombytes(values.astype(value_typecode).tobytes())
+        else:
+            column.extend(values.tolist())
+
+        d = cls.__new__(cls)
+        keys = SortedSet(keys, typecode, epsilon, compressed, packed, radix,
+                         epsilon_recursive)
+        SortedDict._initwithparts(d, keys, column)
+        return d
+
+    def __len__(self):
+        """Return the number of items in ``self``.
+
+        ``self.__len__()`` <==> ``len(self)``
+
+        Returns:
+            int: number of items
+        """
+        return len(self._keys)
+
+    def __iter__(self):
+        """Return an iterator over the keys of ``self``, in sorted order.
+
+        ``self.__iter__()`` <==> ``iter(self)``
+
+        Returns:
+            iterator over the keys
+        """
+        return iter(self._keys)
+
+    def __contains__(self, key):
+        """Check whether ``key`` is in ``self``.
+
+        ``self.__contains__(key)`` <==> ``key in self``
+
+        Args:
+            key: key to search
+
+        Returns:
+            bool: ``True`` if ``key`` is found, ``False`` otherwise
+        """
+        return key in self._keys
+
+    def _position(self, key):
+        # The position of the value of key in the payload column, or None
+        if key not in self._keys:
+            return None
+        return self._keys.bisect_left(key)
+
+    def __getitem__(self, key):
+        """Return the value of ``key``.
+
+        ``self.__getitem__(key)`` <==> ``self[key]``
+
+        Args:
+            key: key to search
+
+        Returns:
+            value of ``key``
+
+        Raises:
+            KeyError: if ``key`` is not found
+        """
+        i = self._position(key)
+        if i is None:
+            raise KeyError(key)
+        return self._values[i]
+
+    def get(self, key, default=None):
+        """Return the value of ``key`` if found, ``default`` otherwise.
+
+        Args:
+            key: key to search
+            default (optional): value returned if ``key`` is not found.
+                Defaults to None.
+
+        Returns:
+            value of ``key``, or ``default``
+        """
+        i = self._position(key)
+        return default if i is None else self._values[i]
+
+    def __setitem__(self, key, value):
+        """Set the value of ``key`` to ``value``, inserting ``key`` if it is
+        not found.
+
+        ``self.__setitem__(key, value)`` <==> ``self[key] = value``
+
+        Args:
+            key: key to set
+            value: new value of ``key``
+        """
+        i = self._keys.bisect_left(key)
+        if key in self._keys:
+            self._values[i] = value
+            return
+        self._values.insert(i, value)
+        try:
+            self._keys.add(key)
+        except BaseException:
+            del self._values[i]
+            raise
+
+    def __delitem__(self, key):
+        """Remove ``key`` and its value from ``self``.
+
+        ``self.__delitem__(key)`` <==> ``del self[key]``
+
+        Args:
+            key: key to remove
+
+        Raises:
+            KeyError: if ``key`` is not found
+        """
+        i = self._position(key)
+        if i is None:
+            raise KeyError(key)
+        self._keys.discard(key)
+        del self._values[i]
+
+    def clear(self):
+        """Remove all the items from ``self``."""
+        stats = self._keys.stats()
+        self._keys = SortedSet(None, stats['typecode'], stats['epsilon'],
+                               stats['compressed'], stats['packed'],
+                               stats['radix'], stats['epsilon recursive'])
+        self._values = SortedDict._new_column(self.value_typecode)
+
+    @property
+    def value_typecode(self):
+        """The type of the values, or ``None`` if they can be any object."""
+        return getattr(self._values, "typecode", None)
+
+    def get_many(self, keys, threads=None):
+        """Vectorised version of :func:`get`.
+
+        The keys are searched in C++ without holding the GIL. Values stored
+        with a ``value_typecode`` are then gathered without converting them
+        to Python objects.
+
+        Args:
+            keys (array-like): keys to search, given as a NumPy array or any
+                object supporting the buffer protocol
+            threads (int, optional): number of threads to use. Defaults to
+                the value returned by :func:`pygm.get_threads`.
+
+        Returns:
+            tuple[numpy.ndarray, numpy.ndarray]: the values of the keys, and
+                a boolean mask that is ``False`` where a key is not found
+                (the corresponding entries of the first array are zero, or
+                ``None`` for object values)
+        """
+        import numpy as np
+        found = self._keys.contains_many(keys, threads)
+        positions = self._keys.bisect_left_many(keys, threads)[found]
+        if self.value_typecode:
+            out = np.zeros(found.shape, dtype=self.value_typecode)
+            out[found] = np.asarray(memoryview(self._values))[positions]
+        else:
+            out = np.empty(found.shape, dtype=object)
+            flat = out.reshape(-1)
+            for j, i in zip(np.flatnonzero(found), positions.tolist()):
+                flat[j] = self._values[i]
+        return out, found
+
+    def range(self, a, b, inclusive=(True, True)):
+        """Return the keys between ``a`` and ``b`` and their values.
+
+        Args:
+            a: lower bound key
+            b: upper bound key
+            inclusive (tuple[bool, bool], optional): a pair of boolean
+                indicating whether the bounds are inclusive (``True``) or
+                exclusive (``False``). Defaults to ``(True, True)``
+
+        Returns:
+            tuple[SortedSet, list or array.array]: the keys in the range, and
+                the slice of the payload column with their values
+        """
+        left, right = self._keys.range_bounds(a, b, inclusive)
+        return self._keys[left:right], self._values[left:right]
+
+    def keys(self):
+        """Return the keys of ``self``.
+
+        Returns:
+            SortedSet: a snapshot of the keys, which shares their storage with
+                ``self``
+        """
+        return self._keys.copy()
+
+    def values(self):
+        """Return a view on the values of ``self``, in the order of their keys.
+
+        Returns:
+            ValuesView: view on the values
+        """
+        return _SortedValuesView(self)
+
+    def items(self):
+        """Return a view on the items of ``self``, in the order of their keys.
+
+        Returns:
+            ItemsView: view on the ``(key, value)`` pairs
+        """
+        return _SortedItemsView(self)
+
+    def copy(self):
+        """Return a copy of ``self``.
+
+        Returns:
+            SortedDict: new dictionary with the same items of ``self``
+        """
+        d = self.__class__.__new__(self.__class__)
+        SortedDict._initwithparts(d, self._keys.copy(), self._values[:])
+        return d
+
+    __copy__ = copy
+
+    def __repr__(self):
+        """Return a string representation of self.
+
+        ``self.__repr__()`` <==> ``repr(self)``
+
+        Returns:
+            str: repr(self)
+        """
+        def item(i):
+            return "%r: %r" % (self._keys[i], self._values[i])
+
+        if len(self) < 6:
+            preview = ", ".join(item(i) for i in range(len(self)))
+        else:
+            preview = ", ".join([item(0), item(1), item(2), "...", item(-2),
+                                 item(-1)])
+        return "%s({%s})" % (self.__class__.__name__, preview)
+
+
+class _SortedValuesView(collections.abc.ValuesView):
+
+    def __iter__(self):
+        return iter(self._mapping._values)
+
+
+class _SortedItemsView(collections.abc.ItemsView):
+
+    def __iter__(self):
+        return zip(self._mapping._keys, self._mapping._values)
@@ -2,7 +2,7 @@ import collections.abc
 from operator import eq, ge, gt, le, lt, ne
 from textwrap import dedent
 
-from .sortedcontainer import SortedContainer
+from .sortedcontainer import Builder, SortedContainer
 
 
 class SortedList(SortedContainer):
@@ -17,12 +17,53 @@ class SortedList(SortedContainer):
     from the contents of ``arg``.
 
     The ``epsilon`` argument allows to trade off memory usage with query
-    performance. The default value is adequate in most cases.
+    performance. The default value is adequate in most cases, and
+    :func:`SortedList.tuned` chooses it for a given memory or latency budget.
+    The ``epsilon_recursive`` argument is the same trade-off for the upper
+    levels of the index, which are much smaller than the last one.
+
+    If ``compressed`` is ``True``, the last level of the index stores
+    segments with shared slopes and bit-packed intercepts, which reduces the
+    index size at the cost of slightly slower queries. This is useful with
+    small values of ``epsilon``, for which the index has many segments.
+
+    If ``packed`` is ``True``, the elements, which must be integers, are
+    stored with the Elias-Fano encoding in about ``2 + log2(u / n)`` bits
+    each, where ``n`` is the number of elements and ``u`` the difference
+    between the largest and the smallest one. Accessing an element then
+    takes a few more operations, and the elements can't be exported through
+    the buffer protocol without decoding them with :func:`SortedList.to_numpy`.
+
+    If ``radix`` is ``True``, queries find the segment of the last level of
+    the index through a table on the high bits of the keys, rather than by
+    descending the upper levels. This takes a few bytes per segment, and is
+    faster when the elements are spread fairly evenly over their range.
+
+    Large lists are built, and large batches of queries are answered, using
+    multiple threads, whose number can be set with :func:`pygm.set_threads`.
+    Operations that do not modify the list can be called from multiple threads
+    at once, and release the GIL while they process many elements. Updates,
+    instead, require external locking if other threads access the list at the
+    same time.
+
+    Elements can be added and removed in amortised polylogarithmic time.
+    Updates are kept in a few sorted runs aside from the main index, which
+    queries such as :func:`SortedList.bisect_left` and
+    :func:`SortedList.find_ge` take into account. Accessing elements by
+    position, iterating, or combining the list with other containers first
+    merges the pending updates into a new index, in linear time. Iterators
+    and arrays obtained from the list are not affected by later updates.
 
     Methods for adding and removing elements:
 
+    * :func:`SortedList.add`
+    * :func:`SortedList.update`
+    * :func:`SortedList.discard`
+    * :func:`SortedList.remove`
+    * :func:`SortedList.remove_range`
     * :func:`SortedList.__add__`
     * :func:`SortedList.__sub__`
+    * :func:`SortedList.merge_all`
     * :func:`SortedList.drop_duplicates`
 
     Methods for accessing and querying elements:
@@ -39,10 +80,25 @@ class SortedList(SortedContainer):
     * :func:`SortedList.index`
     * :func:`SortedList.rank`
     * :func:`SortedList.approximate_rank`
+    * :func:`SortedList.range_bounds`
+    * :func:`SortedList.range_count`
+
+    Methods for querying many values at once:
+
+    * :func:`SortedList.bisect_left_many`
+    * :func:`SortedList.bisect_right_many`
+    * :func:`SortedList.contains_many`
+    * :func:`SortedList.count_many`
+    * :func:`SortedList.find_ge_many`
+    * :func:`SortedList.find_gt_many`
+    * :func:`SortedList.find_le_many`
+    * :func:`SortedList.find_lt_many`
+    * :func:`SortedList.rank_many`
 
     Methods for iterating elements:
 
     * :func:`SortedList.range`
+    * :func:`SortedList.range_slice`
     * :func:`SortedList.__iter__`
     * :func:`SortedList.__reversed__`
 
@@ -58,8 +114,16 @@ class SortedList(SortedContainer):
     Other methods:
 
     * :func:`SortedList.copy`
+    * :func:`SortedList.builder`
+    * :func:`SortedList.tuned`
+    * :func:`SortedList.save`
+    * :func:`SortedList.load`
     * :func:`SortedList.stats`
     * :func:`SortedList.segment`
+    * :func:`SortedList.segments_array`
+    * :func:`SortedList.instrument`
+    * :func:`SortedList.query_stats`
+    * :func:`SortedList.to_numpy`
     * :func:`SortedList.__repr__`
 
     Args:
@@ -68,6 +132,14 @@ class SortedList(SortedContainer):
             to None.
         epsilon (int, optional): space-time trade-off parameter. Defaults
             to 64.
+        compressed (bool, optional): whether to compress the index.
+            Defaults to False.
+        packed (bool, optional): whether to pack the elements. Defaults to
+            False.
+        radix (bool, optional): whether to search the index through a radix
+            table. Defaults to False.
+        epsilon_recursive (int, optional): space-time trade-off parameter
+            for the upper levels of the index. Defaults to 4.
 
     Example:
         >>> from pygm import SortedList
@@ -86,10 +158,16 @@ class SortedList(SortedContainer):
         SortedList([1, 5, 21])
         >>> (sl + [-3, -2, -1]).rank(0)                     # number of elements <= 0
         4
+        >>> sl.add(42)                                      # in-place insertion
+        >>> sl.find_gt(34)
+        42
     """
 
-    def __init__(self, arg=None, typecode=None, epsilon=64):
-        SortedContainer._initwitharg(self, arg, typecode, epsilon, False)
+    def __init__(self, arg=None, typecode=None, epsilon=64, compressed=False,
+                 packed=False, radix=False, epsilon_recursive=4):
+        SortedContainer._initwitharg(self, arg, typecode, epsilon, False,
+                                     compressed, packed, radix,
+                                     epsilon_recursive)
 
     def __getitem__(self, i):
         """Return the element at position ``i``.
@@ -106,6 +184,38 @@ class SortedList(SortedContainer):
             return SortedList(self._impl.slice(i), self._typecode)
         return self._impl[i]
 
+    def add(self, x):
+        """Insert ``x`` into ``self``.
+
+        Args:
+            x: value to insert
+        """
+        self._updated(self._pgm.add(x, False))
+
+    def update(self, other):
+        """Insert the values in ``other`` into ``self``.
+
+        Values in ``other`` do not need to be in sorted order.
+
+        Args:
+            other (iterable): a sequence of values
+        """
+        args = SortedContainer._impl_or_iter(other)
+        self._updated(self._pgm.update(*args, False))
+
+    def remove(self, x):
+        """Remove an element equal to ``x`` from ``self``.
+
+        Args:
+            x: value to remove
+
+        Raises:
+            ValueError: if ``x`` is not present
+        """
+        if not self._pgm.discard(x):
+            raise ValueError("%r not in list" % (x,))
+        self._updated(True)
+
     def __add__(self, other):
         """Return a new ``SortedList`` by merging the elements of ``self``
         with ``other``.
@@ -144,6 +254,39 @@ class SortedList(SortedContainer):
         args = SortedContainer._impl_or_iter(other)
         return SortedList(self._impl.difference(*args), self._typecode)
 
+    @classmethod
+    def merge_all(cls, *lists):
+        """Return a new ``SortedList`` with the elements of all of ``lists``.
+
+        The lists are merged together in C++, without the intermediate
+        results and indexes of a chain of :func:`SortedList.__add__`, and the
+        index of the result is built when a query first needs it. The
+        elements have the type of the first container in ``lists``, and the
+        values of the other iterables do not need to be in sorted order.
+
+        ``SortedList.merge_all(a, b, c)`` <==> ``a + b + c``
+
+        Args:
+            *lists (iterable): sequences of values
+
+        Returns:
+            SortedList: new list with the merged elements, which is empty if
+                no ``lists`` are given
+        """
+        impl_class = SortedContainer._impl_class
+        typecode = next((l._typecode for l in lists
+                         if isinstance(l, SortedContainer)), None)
+        impls = []
+        for l in lists:
+            if not isinstance(l, SortedContainer) or \
+                    impl_class(l._typecode) is not impl_class(typecode):
+                l = SortedList(l, typecode)
+                typecode = l._typecode
+            impls.append(l._impl)
+        if not impls:
+            return SortedList()
+        return SortedList(impl_class(typecode).merge_all(impls), typecode)
+
     def drop_duplicates(self):
         """Return ``self`` with duplicate elements removed.
 
@@ -158,7 +301,113 @@ class SortedList(SortedContainer):
         Returns:
             SortedList: new list with the same elements of ``self``
         """
-        return SortedList(self._impl, self._typecode)
+        return SortedList(self._impl.copy(), self._typecode)
+
+    @classmethod
+    def builder(cls, typecode=None, epsilon=64, compressed=False,
+                packed=False, radix=False, epsilon_recursive=4):
+        """Return a :class:`Builder` that creates a ``SortedList`` from elements
+        given in chunks.
+
+        This allows building a list from a stream of arrays, such as the
+        batches read from a file or a message queue, without first collecting
+        all the elements in a Python object. The arguments have the same
+        meaning as in the constructor.
+
+        Args:
+            typecode (char, optional): type of the stored elements. Defaults
+                to None, which means that the type is inferred from the first
+                chunk.
+            epsilon (int, optional): space-time trade-off parameter. Defaults
+                to 64.
+            compressed (bool, optional): whether to compress the index.
+                Defaults to False.
+            packed (bool, optional): whether to pack the elements. Defaults to
+                False.
+            radix (bool, optional): whether to search the index through a
+                radix table. Defaults to False.
+            epsilon_recursive (int, optional): space-time trade-off parameter
+                for the upper levels of the index. Defaults to 4.
+
+        Returns:
+            Builder: a new builder
+        """
+        return Builder(cls, typecode, epsilon, False, compressed, packed, radix,
+                       epsilon_recursive)
+
+    @classmethod
+    def tuned(cls, data, typecode=None, max_index_bytes=None,
+              target_latency_ns=None, sample_queries=None, compressed=False,
+              packed=False, radix=False):
+        """Return a ``SortedList`` with the elements in ``data`` and the values of
+        ``epsilon`` and ``epsilon_recursive`` that best fit a budget.
+
+        With ``max_index_bytes``, the list is the fastest one whose index takes
+        at most that many bytes. With ``target_latency_ns``, it is the one
+        with the smallest index among those answering a query within that
+        many nanoseconds, on average. If no values meet the budget, the
+        closest ones are chosen.
+
+        The values of ``epsilon`` whose index would exceed
+        ``max_index_bytes`` are first ruled out by building indexes on a
+        sample of the elements. The latency of the remaining ones is then
+        measured by running ``sample_queries`` through
+        :func:`SortedList.bisect_left_many` on a single thread, first to choose
+        ``epsilon``, and then ``epsilon_recursive``.
+
+        Args:
+            data (iterable): elements of the list
+            typecode (char, optional): type of the stored elements. Defaults
+                to None.
+            max_index_bytes (int, optional): maximum size of the index in
+                bytes. Defaults to None.
+            target_latency_ns (float, optional): maximum average time of a
+                query in nanoseconds. Defaults to None.
+            sample_queries (array-like, optional): queries representative of
+                the workload. Defaults to None, meaning 10000 elements of
+                ``data`` drawn at random.
+            compressed (bool, optional): whether to compress the index.
+                Defaults to False.
+            packed (bool, optional): whether to pack the elements. Defaults to
+                False.
+            radix (bool, optional): whether to search the index through a
+                radix table. Defaults to False.
+
+        Returns:
+            tuple[SortedList, dict]: the new list, and a dict with the chosen
+                ``'epsilon'`` and ``'epsilon recursive'``, and the resulting
+                ``'index size'`` in bytes and ``'latency'`` in nanoseconds
+
+        Raises:
+            ValueError: if neither ``max_index_bytes`` nor
+                ``target_latency_ns`` is given
+        """
+        return SortedContainer._tune(cls, data, typecode, max_index_bytes,
+                                     target_latency_ns, sample_queries,
+                                     compressed, packed, radix)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a ``SortedList`` from a file written by :func:`save`.
+
+        If ``mmap`` is ``True``, the file is memory-mapped read-only instead of
+        being read. Loading then takes constant time, elements are paged in on
+        access, and processes loading the same file share its pages through
+        the page cache. The file must not be modified while the list is alive.
+
+        Args:
+            path (str or os.PathLike): path of the file to read
+            mmap (bool, optional): whether to memory-map the file. Defaults to
+                ``True``
+
+        Returns:
+            SortedList: the list stored in the file
+
+        Raises:
+            ValueError: if the file is not a valid PyGM file
+        """
+        typecode, impl = SortedContainer._load(path, mmap)
+        return cls(impl, typecode)
 
     __copy__ = copy
 
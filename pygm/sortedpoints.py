@@ -0,0 +1,253 @@
+import collections.abc
+
+from . import _pygm
+from .sortedlist import SortedList
+
+
+class SortedPoints(collections.abc.Collection):
+    """A collection of multidimensional points indexed by a PGM-index, for
+    orthogonal range queries.
+
+    The collection is initialised with the points in ``points``, a
+    two-dimensional array-like with a row per point and a column per
+    coordinate, such as ``(latitude, longitude)`` or ``(time, sensor)``.
+    Coordinates can be integers or floating-point numbers.
+
+    Each point is mapped to a cell of a grid spanning the bounding box of the
+    points, and the cell to a 64-bit code on the Morton (or Z-order) curve,
+    which interleaves the bits of the coordinates of the cell. The points are
+    stored in the order of their codes, which are indexed by a
+    :class:`SortedList`. Since points close in space tend to have close
+    codes, the points in a box are found by searching a few ranges of codes,
+    skipping those of the cells outside the box, and by then checking the
+    exact coordinates of the points in the cells crossed by the border of
+    the box. The ``epsilon``, ``compressed``, ``packed`` and ``radix``
+    arguments refer to the index of the codes and have the same meaning as
+    in :class:`SortedList`.
+
+    Each coordinate gets ``64 / d`` bits of the code, where ``d`` is the
+    number of dimensions, so that the grid is finer with fewer dimensions.
+    Points sharing a cell are told apart by their exact coordinates, which
+    makes queries correct but slower if many points crowd a few cells.
+
+    The collection can't be modified once built.
+
+    Methods for querying points:
+
+    * :func:`SortedPoints.__contains__`
+    * :func:`SortedPoints.contains_many`
+    * :func:`SortedPoints.range`
+
+    Other methods:
+
+    * :func:`SortedPoints.to_numpy`
+    * :func:`SortedPoints.__repr__`
+
+    Args:
+        points (array-like): two-dimensional array of points, with a row per
+            point
+        epsilon (int, optional): space-time trade-off parameter. Defaults
+            to 64.
+        compressed (bool, optional): whether to compress the index.
+            Defaults to False.
+        packed (bool, optional): whether to pack the codes. Defaults to
+            False.
+        radix (bool, optional): whether to search the codes through a radix
+            table. Defaults to False.
+
+    Raises:
+        ValueError: if ``points`` is not two-dimensional or contains NaNs
+        TypeError: if the coordinates are not numbers
+
+    Example:
+        >>> from pygm import SortedPoints
+        >>> sp = SortedPoints([(43.7, 10.4), (45.5, 9.2), (41.9, 12.5)])
+        >>> sp.range((42, 9), (46, 11))
+        array([[43.7, 10.4],
+               [45.5,  9.2]])
+        >>> (41.9, 12.5) in sp
+        True
+    """
+
+    def __init__(self, points, epsilon=64, compressed=False, packed=False,
+                 radix=False):
+        import numpy as np
+        points = np.array(points)
+        if points.ndim != 2 or points.shape[1] == 0:
+            raise ValueError("points must be a two-dimensional array, with "
+                             "a row per point and a column per coordinate")
+        if points.dtype.kind not in "iuf":
+            raise TypeError("coordinates must be integers or floating-point "
+                            "numbers")
+        if np.isnan(points).any():
+            raise ValueError("coordinates can't be NaN")
+
+        dimensions = points.shape[1]
+        if len(points):
+            self._low = points.min(axis=0).astype(np.float64)
+            self._high = points.max(axis=0).astype(np.float64)
+        else:
+            self._low = self._high = np.zeros(dimensions)
+        # Cells beyond 2^52 per coordinate would not be exact in float64, and
+        # codes use at most 63 bits, as the largest 64-bit one is reserved by
+        # the index
+        self._cells = 2.0 ** min(63 // dimensions, 52)
+        span = self._high - self._low
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self._scale = np.where(np.isfinite(span) & (span > 0),
+                                   (self._cells - 1) / span, 0.)
+
+        codes = _pygm.morton_encode(self._grid(points))
+        order = np.argsort(codes, kind="stable")
+        self._points = points[order]
+        self._points.flags.writeable = False
+        self._codes = SortedList(codes[order], "Q", epsilon, compressed,
+                                 packed, radix)
+
+    def _grid(self, points):
+        # The cells of points, with coordinates beyond the bounding box
+        # moved to its border, and NaNs to the first cell
+        import numpy as np
+        points = np.asarray(points, dtype=np.float64)
+        cells = (np.clip(points, self._low, self._high) - self._low)
+        cells = np.floor(np.nan_to_num(cells * self._scale))
+        return np.minimum(cells, self._cells - 1).astype(np.uint64)
+
+    def _check_points(self, points, name):
+        import numpy as np
+        points = np.asarray(points)
+        if points.ndim != 2 or points.shape[1] != self.dimensions:
+            raise ValueError("%s must have %d coordinates"
+                             % (name, self.dimensions))
+        return points
+
+    @property
+    def dimensions(self):
+        """The number of coordinates of each point."""
+        return self._points.shape[1]
+
+    def __len__(self):
+        """Return the number of points in ``self``.
+
+        ``self.__len__()`` <==> ``len(self)``
+
+        Returns:
+            int: number of points
+        """
+        return len(self._points)
+
+    def __iter__(self):
+        """Return an iterator over the points of ``self``, as tuples in the
+        order of their Morton codes.
+
+        ``self.__iter__()`` <==> ``iter(self)``
+
+        Returns:
+            iterator over the points
+        """
+        return map(tuple, self._points.tolist())
+
+    def __contains__(self, point):
+        """Check whether ``point`` is in ``self``.
+
+        ``self.__contains__(point)`` <==> ``point in self``
+
+        Args:
+            point (sequence): coordinates of the point to search
+
+        Returns:
+            bool: ``True`` if ``point`` is found, ``False`` otherwise
+
+        Raises:
+            ValueError: if ``point`` has the wrong number of coordinates
+        """
+        return bool(self.contains_many([point])[0])
+
+    def contains_many(self, points, threads=None):
+        """Vectorised version of :func:`__contains__`.
+
+        Args:
+            points (array-like): two-dimensional array of points to search,
+                with a row per point
+            threads (int, optional): number of threads to use. Defaults to
+                the value returned by :func:`pygm.get_threads`.
+
+        Returns:
+            numpy.ndarray: boolean array with an entry per point, which is
+                ``True`` if the point is found
+
+        Raises:
+            ValueError: if ``points`` is not two-dimensional with
+                :attr:`dimensions` columns
+        """
+        import numpy as np
+        points = self._check_points(points, "points")
+        codes = _pygm.morton_encode(self._grid(points))
+        left = self._codes.bisect_left_many(codes, threads)
+        counts = self._codes.bisect_right_many(codes, threads) - left
+
+        # Compare each point with the stored points having the same code
+        rows = np.repeat(np.arange(len(points)), counts)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts,
+                                                   counts)
+        candidates = self._points[left[rows] + offsets]
+        match = np.all(candidates == points[rows], axis=1)
+        found = np.zeros(len(points), dtype=bool)
+        found[rows[match]] = True
+        return found
+
+    def range(self, low, high):
+        """Return the points in the box with corners ``low`` and ``high``.
+
+        A point ``p`` is in the box if ``low[i] <= p[i] <= high[i]`` for
+        every coordinate ``i``.
+
+        Args:
+            low (sequence): lower corner of the box
+            high (sequence): upper corner of the box
+
+        Returns:
+            numpy.ndarray: two-dimensional array with a row per point in the
+                box, in the order of their Morton codes
+
+        Raises:
+            ValueError: if the corners have the wrong number of coordinates
+        """
+        import numpy as np
+        low, high = self._check_points([low, high], "the corners")
+        if len(self) == 0 or not np.all(low <= high):
+            return self._points[:0]
+        zmin, zmax = _pygm.morton_encode(self._grid([low, high])).tolist()
+        positions = _pygm.morton_range(self._codes._impl, zmin, zmax,
+                                       self.dimensions)
+        points = self._points[positions]
+        return points[np.all((low <= points) & (points <= high), axis=1)]
+
+    def to_numpy(self):
+        """Return a read-only NumPy array with the points of ``self``.
+
+        The array has a row per point, in the order of their Morton codes, and
+        is a view on the internal storage.
+
+        Returns:
+            numpy.ndarray: read-only two-dimensional array of the points
+        """
+        return self._points
+
+    def __repr__(self):
+        """Return a string representation of self.
+
+        ``self.__repr__()`` <==> ``repr(self)``
+
+        Returns:
+            str: repr(self)
+        """
+        def item(i):
+            return repr(tuple(self._points[i].tolist()))
+
+        if len(self) < 6:
+            preview = ", ".join(item(i) for i in range(len(self)))
+        else:
+            preview = ", ".join([item(0), item(1), item(2), "...", item(-2),
+                                 item(-1)])
+        return "%s([%s])" % (self.__class__.__name__, preview)
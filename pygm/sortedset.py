@@ -1,4 +1,4 @@
-from .sortedcontainer import SortedContainer
+from .sortedcontainer import Builder, SortedContainer
 
 
 class SortedSet(SortedContainer):
@@ -13,7 +13,59 @@ class SortedSet(SortedContainer):
     from the contents of ``arg``.
 
     The ``epsilon`` argument allows to trade off memory usage with query
-    performance. The default value is adequate in most cases.
+    performance. The default value is adequate in most cases, and
+    :func:`SortedSet.tuned` chooses it for a given memory or latency budget.
+    The ``epsilon_recursive`` argument is the same trade-off for the upper
+    levels of the index, which are much smaller than the last one.
+
+    If ``compressed`` is ``True``, the last level of the index stores
+    segments with shared slopes and bit-packed intercepts, which reduces the
+    index size at the cost of slightly slower queries. This is useful with
+    small values of ``epsilon``, for which the index has many segments.
+
+    If ``packed`` is ``True``, the elements, which must be integers, are
+    stored with the Elias-Fano encoding in about ``2 + log2(u / n)`` bits
+    each, where ``n`` is the number of elements and ``u`` the difference
+    between the largest and the smallest one. Accessing an element then
+    takes a few more operations, and the elements can't be exported through
+    the buffer protocol without decoding them with :func:`SortedSet.to_numpy`.
+
+    If ``radix`` is ``True``, queries find the segment of the last level of
+    the index through a table on the high bits of the keys, rather than by
+    descending the upper levels. This takes a few bytes per segment, and is
+    faster when the elements are spread fairly evenly over their range.
+
+    Large sets are built, and large batches of queries are answered, using
+    multiple threads, whose number can be set with :func:`pygm.set_threads`.
+    Operations that do not modify the set can be called from multiple threads
+    at once, and release the GIL while they process many elements. Updates,
+    instead, require external locking if other threads access the set at the
+    same time.
+
+    Elements can be added and removed in amortised polylogarithmic time.
+    Updates are kept in a few sorted runs aside from the main index, which
+    queries such as :func:`SortedSet.__contains__` and
+    :func:`SortedSet.find_ge` take into account. Accessing elements by
+    position, iterating, or combining the set with other containers first
+    merges the pending updates into a new index, in linear time. Iterators
+    and arrays obtained from the set are not affected by later updates.
+
+    Set operations between containers with the same type of elements are
+    deferred until the elements of their result are first needed. Then, a
+    chain of them such as ``(a | b | c) - d`` is computed in a single pass
+    over the operands, without creating the intermediate results. The index
+    of a result is built only when a query needs it, so that results that
+    are just iterated, exported or combined further never pay for it. A
+    deferred result used by several other operations is computed once for
+    the first of them, and once more for the others and for its own use.
+
+    Methods for adding and removing elements:
+
+    * :func:`SortedSet.add`
+    * :func:`SortedSet.update`
+    * :func:`SortedSet.discard`
+    * :func:`SortedSet.remove`
+    * :func:`SortedSet.remove_range`
 
     Methods for set operations:
 
@@ -21,6 +73,8 @@ class SortedSet(SortedContainer):
     * :func:`SortedSet.intersection` (alias for ``set & other``)
     * :func:`SortedSet.union` (alias for ``set | other``)
     * :func:`SortedSet.symmetric_difference` (alias for ``set ^ other``)
+    * :func:`SortedSet.union_all`
+    * :func:`SortedSet.intersection_all`
 
     Methods for accessing and querying elements:
 
@@ -36,6 +90,20 @@ class SortedSet(SortedContainer):
     * :func:`SortedSet.index`
     * :func:`SortedSet.rank`
     * :func:`SortedSet.approximate_rank`
+    * :func:`SortedSet.range_bounds`
+    * :func:`SortedSet.range_count`
+
+    Methods for querying many values at once:
+
+    * :func:`SortedSet.bisect_left_many`
+    * :func:`SortedSet.bisect_right_many`
+    * :func:`SortedSet.contains_many`
+    * :func:`SortedSet.count_many`
+    * :func:`SortedSet.find_ge_many`
+    * :func:`SortedSet.find_gt_many`
+    * :func:`SortedSet.find_le_many`
+    * :func:`SortedSet.find_lt_many`
+    * :func:`SortedSet.rank_many`
 
     Methods for set comparisons:
 
@@ -49,14 +117,23 @@ class SortedSet(SortedContainer):
     Methods for iterating elements:
 
     * :func:`SortedSet.range`
+    * :func:`SortedSet.range_slice`
     * :func:`SortedSet.__iter__`
     * :func:`SortedSet.__reversed__`
 
     Other methods:
 
     * :func:`SortedSet.copy`
+    * :func:`SortedSet.builder`
+    * :func:`SortedSet.tuned`
+    * :func:`SortedSet.save`
+    * :func:`SortedSet.load`
     * :func:`SortedSet.stats`
     * :func:`SortedSet.segment`
+    * :func:`SortedSet.segments_array`
+    * :func:`SortedSet.instrument`
+    * :func:`SortedSet.query_stats`
+    * :func:`SortedSet.to_numpy`
     * :func:`SortedSet.__repr__`
 
     Args:
@@ -65,10 +142,76 @@ class SortedSet(SortedContainer):
             to None.
         epsilon (int, optional): space-time trade-off parameter. Defaults
             to 64.
+        compressed (bool, optional): whether to compress the index.
+            Defaults to False.
+        packed (bool, optional): whether to pack the elements. Defaults to
+            False.
+        radix (bool, optional): whether to search the index through a radix
+            table. Defaults to False.
+        epsilon_recursive (int, optional): space-time trade-off parameter
+            for the upper levels of the index. Defaults to 4.
     """
 
-    def __init__(self, arg=None, typecode=None, epsilon=64):
-        SortedContainer._initwitharg(self, arg, typecode, epsilon, True)
+    def __init__(self, arg=None, typecode=None, epsilon=64, compressed=False,
+                 packed=False, radix=False, epsilon_recursive=4):
+        SortedContainer._initwitharg(self, arg, typecode, epsilon, True,
+                                     compressed, packed, radix,
+                                     epsilon_recursive)
+
+    def __getattr__(self, name):
+        # The elements of a deferred set operation are computed on first
+        # access, see _operation. Concurrent first accesses compute them twice
+        expr = self.__dict__.get("_expr")
+        if name != "_pgm" or expr is None:
+            raise AttributeError("%r object has no attribute %r"
+                                 % (self.__class__.__name__, name))
+        self._impl = SortedContainer._impl_class(self._typecode).fused(expr)
+        self.__dict__.pop("_expr", None)
+        return self._pgm
+
+    def _operand(self):
+        # A deferred set operation is inlined into the first operation using
+        # it, while later uses take its elements
+        if self.__dict__.get("_expr") is not None and not self._inlined:
+            self._inlined = True
+            return self._expr
+        return self._impl
+
+    def _operation(self, op, other):
+        # Defer the operation if both operands can be merged by the fused
+        # C++ evaluator, and otherwise compute it right away
+        impl_class = SortedContainer._impl_class
+        if not isinstance(other, SortedContainer) or \
+                impl_class(other._typecode) is not impl_class(self._typecode):
+            args = SortedContainer._impl_or_iter(other)
+            return SortedSet(getattr(self._impl, op)(*args), self._typecode)
+        return SortedSet._deferred(self._typecode,
+                                   (op, self._operand(), other._operand()))
+
+    @staticmethod
+    def _deferred(typecode, expr):
+        result = SortedSet.__new__(SortedSet)
+        result._typecode = typecode
+        result._dirty = False
+        result._expr = expr
+        result._inlined = False
+        return result
+
+    @staticmethod
+    def _operation_all(op, sets):
+        # Defer a k-way operation, after converting to sets of the type of
+        # the first container the operands that can't be merged with it
+        impl_class = SortedContainer._impl_class
+        typecode = next((s._typecode for s in sets
+                         if isinstance(s, SortedContainer)), None)
+        operands = []
+        for s in sets:
+            if not isinstance(s, SortedContainer) or \
+                    impl_class(s._typecode) is not impl_class(typecode):
+                s = SortedSet(s, typecode)
+                typecode = s._typecode
+            operands.append(s._operand())
+        return SortedSet._deferred(typecode, (op,) + tuple(operands))
 
     def __getitem__(self, i):
         """Return the element at position ``i``.
@@ -85,6 +228,38 @@ class SortedSet(SortedContainer):
             return SortedSet(self._impl.slice(i), self._typecode)
         return self._impl[i]
 
+    def add(self, x):
+        """Add ``x`` to ``self``, if not already present.
+
+        Args:
+            x: value to add
+        """
+        self._updated(self._pgm.add(x, True))
+
+    def update(self, other):
+        """Add the values in ``other`` to ``self``.
+
+        Values in ``other`` do not need to be in sorted order.
+
+        Args:
+            other (iterable): a sequence of values
+        """
+        args = SortedContainer._impl_or_iter(other)
+        self._updated(self._pgm.update(*args, True))
+
+    def remove(self, x):
+        """Remove ``x`` from ``self``.
+
+        Args:
+            x: value to remove
+
+        Raises:
+            KeyError: if ``x`` is not present
+        """
+        if not self._pgm.discard(x):
+            raise KeyError(x)
+        self._updated(True)
+
     def union(self, other):
         """Return a new ``SortedSet`` with the elements in one or both ``self``
         and ``other``.
@@ -99,8 +274,7 @@ class SortedSet(SortedContainer):
         Returns:
             SortedSet: new set with the elements in the union
         """
-        args = SortedContainer._impl_or_iter(other)
-        return SortedSet(self._impl.union(*args), self._typecode)
+        return self._operation("union", other)
 
     __or__ = union
 
@@ -119,8 +293,7 @@ class SortedSet(SortedContainer):
         Returns:
             SortedSet: new set with the elements in the difference
         """
-        args = SortedContainer._impl_or_iter(other)
-        return SortedSet(self._impl.difference(*args), self._typecode)
+        return self._operation("difference", other)
 
     __sub__ = difference
 
@@ -139,8 +312,7 @@ class SortedSet(SortedContainer):
         Returns:
             SortedSet: new set with the elements in the symmetric difference
         """
-        args = SortedContainer._impl_or_iter(other)
-        return SortedSet(self._impl.symmetric_difference(*args), self._typecode)
+        return self._operation("symmetric_difference", other)
 
     __xor__ = symmetric_difference
 
@@ -159,18 +331,181 @@ class SortedSet(SortedContainer):
         Returns:
             SortedSet: new set with the elements in the intersection
         """
-        args = SortedContainer._impl_or_iter(other)
-        return SortedSet(self._impl.intersection(*args), self._typecode)
+        return self._operation("intersection", other)
 
     __and__ = intersection
 
+    @classmethod
+    def union_all(cls, *sets):
+        """Return a new ``SortedSet`` with the elements in at least one of
+        ``sets``.
+
+        The sets are merged together in C++, without the intermediate results
+        and indexes of a chain of :func:`SortedSet.union`, and the result is
+        deferred like those of the other set operations. The elements have
+        the type of the first container in ``sets``, and the values of the
+        other iterables do not need to be in sorted order.
+
+        ``SortedSet.union_all(a, b, c)`` <==> ``a | b | c``
+
+        Args:
+            *sets (iterable): sequences of values
+
+        Returns:
+            SortedSet: new set with the elements in the union, which is empty
+                if no ``sets`` are given
+        """
+        if not sets:
+            return SortedSet()
+        return SortedSet._operation_all("union", sets)
+
+    @classmethod
+    def intersection_all(cls, *sets):
+        """Return a new ``SortedSet`` with the elements found in all of
+        ``sets``.
+
+        The sets are intersected together in C++, without the intermediate
+        results and indexes of a chain of :func:`SortedSet.intersection`, and
+        the result is deferred like those of the other set operations. With
+        more than two sets, the smallest one drives the intersection, and the
+        others are skipped ahead to its elements, so the time depends mostly
+        on its size. The elements have the type of
+        the first container in ``sets``, and the values of the other
+        iterables do not need to be in sorted order.
+
+        ``SortedSet.intersection_all(a, b, c)`` <==> ``a & b & c``
+
+        Args:
+            *sets (iterable): sequences of values
+
+        Returns:
+            SortedSet: new set with the elements in the intersection
+
+        Raises:
+            TypeError: if no ``sets`` are given
+        """
+        if not sets:
+            raise TypeError("intersection_all expected at least 1 argument")
+        return SortedSet._operation_all("intersection", sets)
+
     def copy(self):
         """Return a copy of ``self``.
 
         Returns:
             SortedSet: new set with the same elements of ``self``
         """
-        return SortedSet(self._impl, self._typecode)
+        return SortedSet(self._impl.copy(), self._typecode)
+
+    @classmethod
+    def builder(cls, typecode=None, epsilon=64, compressed=False,
+                packed=False, radix=False, epsilon_recursive=4):
+        """Return a :class:`Builder` that creates a ``SortedSet`` from elements
+        given in chunks.
+
+        This allows building a set from a stream of arrays, such as the
+        batches read from a file or a message queue, without first collecting
+        all the elements in a Python object. The arguments have the same
+        meaning as in the constructor.
+
+        Args:
+            typecode (char, optional): type of the stored elements. Defaults
+                to None, which means that the type is inferred from the first
+                chunk.
+            epsilon (int, optional): space-time trade-off parameter. Defaults
+                to 64.
+            compressed (bool, optional): whether to compress the index.
+                Defaults to False.
+            packed (bool, optional): whether to pack the elements. Defaults to
+                False.
+            radix (bool, optional): whether to search the index through a
+                radix table. Defaults to False.
+            epsilon_recursive (int, optional): space-time trade-off parameter
+                for the upper levels of the index. Defaults to 4.
+
+        Returns:
+            Builder: a new builder
+        """
+        return Builder(cls, typecode, epsilon, True, compressed, packed, radix,
+                       epsilon_recursive)
+
+    @classmethod
+    def tuned(cls, data, typecode=None, max_index_bytes=None,
+              target_latency_ns=None, sample_queries=None, compressed=False,
+              packed=False, radix=False):
+        """Return a ``SortedSet`` with the elements in ``data`` and the values of
+        ``epsilon`` and ``epsilon_recursive`` that best fit a budget.
+
+        With ``max_index_bytes``, the set is the fastest one whose index takes
+        at most that many bytes. With ``target_latency_ns``, it is the one
+        with the smallest index among those answering a query within that
+        many nanoseconds, on average. If no values meet the budget, the
+        closest ones are chosen.
+
+        The values of ``epsilon`` whose index would exceed
+        ``max_index_bytes`` are first ruled out by building indexes on a
+        sample of the elements. The latency of the remaining ones is then
+        measured by running ``sample_queries`` through
+        :func:`SortedSet.bisect_left_many` on a single thread, first to choose
+        ``epsilon``, and then ``epsilon_recursive``.
+
+        Args:
+            data (iterable): elements of the set
+            typecode (char, optional): type of the stored elements. Defaults
+                to None.
+            max_index_bytes (int, optional): maximum size of the index in
+                bytes. Defaults to None.
+            target_latency_ns (float, optional): maximum average time of a
+                query in nanoseconds. Defaults to None.
+            sample_queries (array-like, optional): queries representative of
+                the workload. Defaults to None, meaning 10000 elements of
+                ``data`` drawn at random.
+            compressed (bool, optional): whether to compress the index.
+                Defaults to False.
+            packed (bool, optional): whether to pack the elements. Defaults to
+                False.
+            radix (bool, optional): whether to search the index through a
+                radix table. Defaults to False.
+
+        Returns:
+            tuple[SortedSet, dict]: the new set, and a dict with the chosen
+                ``'epsilon'`` and ``'epsilon recursive'``, and the resulting
+                ``'index size'`` in bytes and ``'latency'`` in nanoseconds
+
+        Raises:
+            ValueError: if neither ``max_index_bytes`` nor
+                ``target_latency_ns`` is given
+        """
+        return SortedContainer._tune(cls, data, typecode, max_index_bytes,
+                                     target_latency_ns, sample_queries,
+                                     compressed, packed, radix)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a ``SortedSet`` from a file written by :func:`save`.
+
+        If ``mmap`` is ``True``, the file is memory-mapped read-only instead of
+        being read. Loading then takes constant time, elements are paged in on
+        access, and processes loading the same file share its pages through
+        the page cache. The file must not be modified while the set is alive.
+
+        Files written by a ``SortedList`` are deduplicated, which requires
+        copying the elements.
+
+        Args:
+            path (str or os.PathLike): path of the file to read
+            mmap (bool, optional): whether to memory-map the file. Defaults to
+                ``True``
+
+        Returns:
+            SortedSet: the set stored in the file
+
+        Raises:
+            ValueError: if the file is not a valid PyGM file
+        """
+        typecode, impl = SortedContainer._load(path, mmap)
+        if impl.has_duplicates():
+            impl = impl.drop_duplicates()
+        return cls(impl, typecode)
 
     __copy__ = copy
 
@@ -299,6 +634,9 @@ class SortedSet(SortedContainer):
         with ``other``.
 
         Sets are disjoint if and only if their intersection is the empty set.
+        The check stops at the first common element, without computing the
+        intersection, and if one of the sets is much smaller than the other,
+        its elements are looked up in the index of the larger one.
 
         Args:
             other (iterable): a sequence of values
@@ -306,7 +644,8 @@ class SortedSet(SortedContainer):
         Returns:
             bool: ``True`` if ``self`` is disjoint from ``other``
         """
-        return len(self & other) == 0
+        args = SortedContainer._impl_or_iter(other)
+        return self._impl.disjoint(*args)
 
     issubset = __le__
     issuperset = __ge__
@@ -0,0 +1,352 @@
+import collections.abc
+
+from . import _pygm
+
+
+class SortedStrings(collections.abc.Sequence):
+    """A sorted list of strings, with efficient query performance and memory
+    usage.
+
+    The list is initialised with the content of the provided iterable
+    ``arg``, whose elements must be either all ``str`` or all ``bytes``.
+    Strings are compared as ``bytes`` are, and ``str`` as the bytes of their
+    UTF-8 encoding, which gives the same order as comparing them in Python.
+
+    The strings are stored one after the other in a single buffer, with the
+    offset of each one, so that a string takes its length plus 8 bytes
+    instead of a Python object each. They are indexed by a PGM-index on
+    their keys, which are the first 8 bytes after the prefix shared by all
+    the strings (like ``"https://"`` in a list of URLs), read as big-endian
+    integers. A query finds the strings with the key of the searched string
+    through the index, and then compares the full strings only among those.
+    Queries are therefore fastest when the keys tell most strings apart, as
+    with hashes, tokens or identifiers, and slow down to a binary search on
+    the strings sharing a key. The ``epsilon`` argument has the same meaning
+    as in :class:`SortedList`.
+
+    The list can't be modified once built.
+
+    Methods for accessing and querying strings:
+
+    * :func:`SortedStrings.__getitem__`
+    * :func:`SortedStrings.__contains__`
+    * :func:`SortedStrings.bisect_left`
+    * :func:`SortedStrings.bisect_right`
+    * :func:`SortedStrings.count`
+    * :func:`SortedStrings.find_ge`
+    * :func:`SortedStrings.find_gt`
+    * :func:`SortedStrings.find_le`
+    * :func:`SortedStrings.find_lt`
+    * :func:`SortedStrings.index`
+    * :func:`SortedStrings.range`
+    * :func:`SortedStrings.range_bounds`
+    * :func:`SortedStrings.range_count`
+
+    Other methods:
+
+    * :func:`SortedStrings.stats`
+    * :func:`SortedStrings.__iter__`
+    * :func:`SortedStrings.__reversed__`
+    * :func:`SortedStrings.__repr__`
+
+    Args:
+        arg (iterable, optional): initial strings. Defaults to None.
+        epsilon (int, optional): space-time trade-off parameter. Defaults
+            to 64.
+
+    Raises:
+        TypeError: if the strings are not all ``str`` or all ``bytes``
+
+    Example:
+        >>> from pygm import SortedStrings
+        >>> ss = SortedStrings(['pear', 'apple', 'fig', 'apple', 'plum'])
+        >>> ss
+        SortedStrings(['apple', 'apple', 'fig', 'pear', 'plum'])
+        >>> 'fig' in ss, ss.count('apple')
+        (True, 2)
+        >>> ss.find_gt('grape')
+        'pear'
+        >>> list(ss.range('b', 'p', inclusive=(True, False)))
+        ['fig']
+    """
+
+    _CHUNK = 1024
+
+    def __init__(self, arg=None, epsilon=64):
+        self._impl = _pygm.PGMIndexStrings(() if arg is None else arg, epsilon)
+
+    @classmethod
+    def _fromimpl(cls, impl):
+        s = cls.__new__(cls)
+        s._impl = impl
+        return s
+
+    def __len__(self):
+        """Return the number of strings in ``self``.
+
+        ``self.__len__()`` <==> ``len(self)``
+
+        Returns:
+            int: number of strings
+        """
+        return len(self._impl)
+
+    def __contains__(self, x):
+        """Check whether ``self`` contains the string ``x``.
+
+        ``self.__contains__(x)`` <==> ``x in self``
+
+        Args:
+            x (str or bytes): string to search
+
+        Returns:
+            bool: ``True`` if ``x`` is found, ``False`` otherwise
+        """
+        return self._impl.__contains__(x)
+
+    def __getitem__(self, i):
+        """Return the string at position ``i``, or a ``SortedStrings`` with
+        the strings selected by the slice ``i``.
+
+        ``self.__getitem__(i)`` <==> ``self[i]``
+
+        Args:
+            i (int or slice): position or slice
+
+        Returns:
+            str, bytes or SortedStrings: the selected strings
+
+        Raises:
+            IndexError: if ``i`` is out of range
+        """
+        if isinstance(i, slice):
+            return self._fromimpl(self._impl.slice(i))
+        return self._impl[i]
+
+    def bisect_left(self, x):
+        """Locate the insertion point for ``x`` to maintain sorted order.
+
+        If ``x`` is already present, the insertion point will be before (to
+        the left of) any existing entries.
+
+        Args:
+            x (str or bytes): string to compare the elements to
+
+        Returns:
+            int: insertion index in sorted list
+        """
+        return self._impl.bisect_left(x)
+
+    def bisect_right(self, x):
+        """Locate the insertion point for ``x`` to maintain sorted order.
+
+        If ``x`` is already present, the insertion point will be after (to the
+        right of) any existing entries.
+
+        Args:
+            x (str or bytes): string to compare the elements to
+
+        Returns:
+            int: insertion index in sorted list
+        """
+        return self._impl.bisect_right(x)
+
+    def count(self, x):
+        """Return the number of strings equal to ``x``.
+
+        Args:
+            x (str or bytes): string to count
+
+        Returns:
+            int: number of strings ``== x``
+        """
+        return self._impl.count(x)
+
+    def find_lt(self, x):
+        """Find the rightmost string less than ``x``.
+
+        Args:
+            x (str or bytes): string to compare the elements to
+
+        Returns:
+            the rightmost string ``< x``, or ``None`` if no such string is
+            found
+        """
+        i = self._impl.bisect_left(x)
+        return self._impl[i - 1] if i > 0 else None
+
+    def find_le(self, x):
+        """Find the rightmost string less than or equal to ``x``.
+
+        Args:
+            x (str or bytes): string to compare the elements to
+
+        Returns:
+            the rightmost string ``<= x``, or ``None`` if no such string is
+            found
+        """
+        i = self._impl.bisect_right(x)
+        return self._impl[i - 1] if i > 0 else None
+
+    def find_gt(self, x):
+        """Find the leftmost string greater than ``x``.
+
+        Args:
+            x (str or bytes): string to compare the elements to
+
+        Returns:
+            the leftmost string ``> x``, or ``None`` if no such string is
+            found
+        """
+        i = self._impl.bisect_right(x)
+        return self._impl[i] if i < len(self) else None
+
+    def find_ge(self, x):
+        """Find the leftmost string greater than or equal to ``x``.
+
+        Args:
+            x (str or bytes): string to compare the elements to
+
+        Returns:
+            the leftmost string ``>= x``, or ``None`` if no such string is
+            found
+        """
+        i = self._impl.bisect_left(x)
+        return self._impl[i] if i < len(self) else None
+
+    def index(self, x, start=None, stop=None):
+        """Return the first index of ``x``.
+
+        Args:
+            x (str or bytes): string in the sorted list
+            start (int, optional): restrict the search to the strings from
+                this position onwards. Defaults to ``None``
+            stop (int, optional): restrict the search to the strings before
+                this position. Defaults to ``None``
+
+        Returns:
+            int: first index of ``x``
+
+        Raises:
+            ValueError: if ``x`` is not present
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        i = max(self._impl.bisect_left(x), start)
+        if i < stop and self._impl[i] == x:
+            return i
+        raise ValueError("%r is not in list" % (x,))
+
+    def range_bounds(self, a, b, inclusive=(True, True)):
+        """Return the positions delimiting the strings between ``a`` and
+        ``b``.
+
+        Args:
+            a (str or bytes): lower bound string
+            b (str or bytes): upper bound string
+            inclusive (tuple[bool, bool], optional): a pair of boolean
+                indicating whether the bounds are inclusive (``True``) or
+                exclusive (``False``). Defaults to ``(True, True)``
+
+        Returns:
+            tuple[int, int]: the position of the first string in the range,
+                and the position past the last one, so that ``self[i:j]``
+                are the strings in the range
+        """
+        return self._impl.range_bounds(a, b, inclusive)
+
+    def range_count(self, a, b, inclusive=(True, True)):
+        """Return the number of strings between ``a`` and ``b``.
+
+        Args:
+            a (str or bytes): lower bound string
+            b (str or bytes): upper bound string
+            inclusive (tuple[bool, bool], optional): a pair of boolean
+                indicating whether the bounds are inclusive (``True``) or
+                exclusive (``False``). Defaults to ``(True, True)``
+
+        Returns:
+            int: number of strings in the range
+        """
+        left, right = self._impl.range_bounds(a, b, inclusive)
+        return right - left
+
+    def range(self, a, b, inclusive=(True, True), reverse=False):
+        """Return an iterator over the strings between ``a`` and ``b``.
+
+        Args:
+            a (str or bytes): lower bound string
+            b (str or bytes): upper bound string
+            inclusive (tuple[bool, bool], optional): a pair of boolean
+                indicating whether the bounds are inclusive (``True``) or
+                exclusive (``False``). Defaults to ``(True, True)``
+            reverse (bool, optional): if ``True`` return an reverse iterator.
+                Defaults to ``False``
+
+        Returns:
+            iterator over the strings between the given bounds
+        """
+        left, right = self._impl.range_bounds(a, b, inclusive)
+        return self._iter_positions(left, right, reverse)
+
+    def _iter_positions(self, start, stop, reverse):
+        # Decode the strings in chunks, to amortise the calls to C++
+        impl = self._impl
+        chunk = self._CHUNK
+        if reverse:
+            for j in range(stop, start, -chunk):
+                yield from reversed(impl.to_list(max(start, j - chunk), j))
+        else:
+            for j in range(start, stop, chunk):
+                yield from impl.to_list(j, min(j + chunk, stop))
+
+    def __iter__(self):
+        """Return an iterator over the strings of ``self``.
+
+        ``self.__iter__()`` <==> ``iter(self)``
+
+        Returns:
+            iterator: iterator over the strings
+        """
+        return self._iter_positions(0, len(self), False)
+
+    def __reversed__(self):
+        """Return a reverse iterator over the strings of ``self``.
+
+        ``self.__reversed__()`` <==> ``reversed(self)``
+
+        Returns:
+            iterator: reverse iterator over the strings
+        """
+        return self._iter_positions(0, len(self), True)
+
+    def stats(self):
+        """Return a dict containing statistics about ``self``.
+
+        The keys are those returned by :func:`SortedList.stats` for the index
+        of the keys, where ``'index size'`` includes the keys, and
+        ``'data size'`` is the size of the strings and their offsets. In
+        addition:
+
+        * ``'common prefix'`` the prefix shared by all the strings, as bytes
+        * ``'distinct keys'`` number of distinct keys, which is close to
+          the number of strings when the keys tell the strings apart
+
+        Returns:
+            dict[str, object]: a dictionary with stats about ``self``
+        """
+        return self._impl.stats()
+
+    def __repr__(self):
+        """Return a string representation of self.
+
+        ``self.__repr__()`` <==> ``repr(self)``
+
+        Returns:
+            str: repr(self)
+        """
+        if len(self) < 6:
+            preview = ", ".join(map(repr, self))
+        else:
+            preview = ", ".join([repr(self[0]), repr(self[1]), repr(self[2]),
+                                 "...", repr(self[-2]), repr(self[-1])])
+        return "%s([%s])" % (self.__class__.__name__, preview)
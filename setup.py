@@ -112,7 +112,7 @@ setuptools.setup(
     long_description_content_type='text/markdown',
     ext_modules=ext_modules,
     packages=setuptools.find_packages(),
-    setup_requires=['pybind11>=2.5.0'],
+    setup_requires=['pybind11>=2.6.0'],
     cmdclass={'build_ext': BuildExt},
     zip_safe=False,
     classifiers=[
@@ -0,0 +1,232 @@
+"""Reproducible benchmarks of PyGM, with machine-readable output.
+
+Each benchmark is run on every combination of typecode, key distribution,
+size and epsilon, with data generated from a fixed seed. Times are reported in
+nanoseconds per element or per query, as the minimum and the median over a
+number of repetitions, and memory usage in bytes.
+
+Typical usage, to catch regressions between two versions::
+
+    python tests/benchmark.py --output baseline.json
+    # ... install the new version ...
+    python tests/benchmark.py --output new.json --compare baseline.json
+
+The comparison reports the benchmarks whose minimum time grew by more than
+``--threshold``, and exits with status 1 if there is any.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import pygm
+
+TYPECODES = {'i': np.int32, 'I': np.uint32, 'q': np.int64, 'Q': np.uint64,
+             'f': np.float32, 'd': np.float64}
+DISTRIBUTIONS = ['uniform', 'lognormal', 'clustered', 'duplicates']
+
+
+def generate(distribution, typecode, n, rng):
+    """Return an unsorted array of n keys of the given distribution and type.
+
+    The keys are first drawn as floats in [0, 1), and then scaled to a range
+    that fits the type.
+    """
+    if distribution == 'uniform':
+        u = rng.random(n)
+    elif distribution == 'lognormal':
+        u = rng.lognormal(0, 2, n)
+        u /= u.max() * (1 + 1e-9)
+    elif distribution == 'clustered':
+        centers = rng.random(max(1, n // 1000))
+        u = centers[rng.integers(0, len(centers), n)] + rng.normal(0, 1e-5, n)
+        u = np.clip(u, 0, 1 - 1e-9)
+    elif distribution == 'duplicates':
+        distinct = max(1, n // 100)
+        u = rng.integers(0, distinct, n) / distinct
+    else:
+        raise ValueError('unknown distribution %r' % distribution)
+
+    dtype = TYPECODES[typecode]
+    if typecode in 'fd':
+        return (u * 1e6).astype(dtype)
+    info = np.iinfo(dtype)
+    span = min(float(info.max) - float(info.min), 2.0 ** 62)
+    return (np.floor(u * span) + max(float(info.min), -2.0 ** 61)).astype(dtype)
+
+
+def measure(f, ops, repeat):
+    """Return the minimum and median time of f() in nanoseconds per op."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append((time.perf_counter() - start) / max(ops, 1) * 1e9)
+    return min(times), statistics.median(times)
+
+
+def consume(iterable):
+    for _ in iterable:
+        pass
+
+
+def benchmarks(typecode, data, rng, n_queries, epsilon):
+    """Yield (name, function, number of ops) for each benchmark on data."""
+    sl = pygm.SortedList(data, typecode, epsilon)
+    ss = pygm.SortedSet(data, typecode, epsilon)
+    other = pygm.SortedSet(rng.choice(data, max(1, len(data) // 2)), typecode, epsilon)
+    present = rng.choice(data, n_queries // 2)
+    absent = generate('uniform', typecode, n_queries - len(present), rng)
+    queries_array = rng.permutation(np.concatenate([present, absent]))
+    queries = queries_array.tolist()
+    present_list = present.tolist()
+    sorted_data = np.sort(data)
+    positions = rng.integers(0, len(data), n_queries).tolist()
+    ranges = [tuple(sorted(r)) for r in zip(queries, queries[1:] + queries[:1])]
+    n = len(data)
+
+    # Construction
+    yield '__init__', lambda: pygm.SortedList(data, typecode, epsilon), n
+    yield '__init__ sorted', lambda: pygm.SortedList(sorted_data, typecode, epsilon), n
+    yield '__init__ set', lambda: pygm.SortedSet(data, typecode, epsilon), n
+    yield '__init__ list', lambda: pygm.SortedList(data.tolist(), typecode, epsilon), n
+    yield '__init__ compressed', lambda: pygm.SortedList(data, typecode, epsilon, compressed=True), n
+    if typecode not in 'fd':
+        yield '__init__ packed', lambda: pygm.SortedList(data, typecode, epsilon, packed=True), n
+
+    # Queries, one at a time
+    def scalar(method, xs=queries):
+        return lambda: consume(map(method, xs))
+
+    yield '__contains__', scalar(sl.__contains__), n_queries
+    for name in ['bisect_left', 'bisect_right', 'count', 'rank', 'approximate_rank',
+                 'find_lt', 'find_le', 'find_gt', 'find_ge']:
+        yield name, scalar(getattr(sl, name)), n_queries
+    yield 'index', scalar(sl.index, present_list), len(present_list)
+    yield '__getitem__', scalar(sl.__getitem__, positions), n_queries
+    yield 'range_count', lambda: consume(sl.range_count(a, b) for a, b in ranges), n_queries
+
+    # Queries in batches
+    for name in ['bisect_left_many', 'bisect_right_many', 'contains_many', 'count_many', 'rank_many',
+                 'find_lt_many', 'find_le_many', 'find_gt_many', 'find_ge_many']:
+        method = getattr(sl, name)
+        yield name, lambda method=method: method(queries_array, threads=1), n_queries
+
+    # Iteration
+    yield '__iter__', lambda: consume(sl), n
+    yield '__reversed__', lambda: consume(reversed(sl)), n
+    yield 'range', lambda: consume(sl.range(sorted_data[0], sorted_data[-1])), n
+    yield 'to_numpy', lambda: sl.to_numpy().sum(), n
+
+    # Set operations
+    yield 'union', lambda: ss.union(other), len(ss) + len(other)
+    yield 'intersection', lambda: ss.intersection(other), len(ss) + len(other)
+    yield 'difference', lambda: ss.difference(other), len(ss) + len(other)
+    yield 'symmetric_difference', lambda: ss.symmetric_difference(other), len(ss) + len(other)
+    yield 'issubset', lambda: other <= ss, len(ss) + len(other)
+    yield 'merge', lambda: sl + other, len(sl) + len(other)
+
+    # Updates, undone by the following benchmark so that sl stays the same
+    yield 'add', scalar(sl.add), n_queries
+    yield 'discard', scalar(sl.discard), n_queries
+
+
+def memory(typecode, data, epsilon):
+    """Return the memory usage in bytes of containers built on data."""
+    out = {}
+    for name, kwargs in [('default', {}), ('compressed', {'compressed': True}),
+                         ('packed', {'packed': True})]:
+        if name == 'packed' and typecode in 'fd':
+            continue
+        stats = pygm.SortedList(data, typecode, epsilon, **kwargs).stats()
+        out[name] = {'index size': stats['index size'], 'data size': stats['data size']}
+    return out
+
+
+def machine_info():
+    return {'platform': platform.platform(), 'processor': platform.processor(),
+            'python': platform.python_version(), 'pygm': pygm.__version__,
+            'numpy': np.__version__, 'cpu count': os.cpu_count(), 'threads': pygm.get_threads()}
+
+
+def run(args):
+    results = []
+    for size in args.sizes:
+        for typecode in args.typecodes:
+            for distribution in args.distributions:
+                for epsilon in args.epsilons:
+                    rng = np.random.default_rng(args.seed)
+                    data = generate(distribution, typecode, size, rng)
+                    key = {'typecode': typecode, 'distribution': distribution, 'size': size, 'epsilon': epsilon}
+                    for name, f, ops in benchmarks(typecode, data, rng, args.queries, epsilon):
+                        if args.filter and not any(s in name for s in args.filter):
+                            continue
+                        best, median = measure(f, ops, args.repeat)
+                        results.append(dict(key, benchmark=name, min=best, median=median))
+                        print('%-6d %s %-10s %4d %-22s %12.1f ns' % (size, typecode, distribution, epsilon, name,
+                                                                      best), file=sys.stderr)
+                    for name, usage in memory(typecode, data, epsilon).items():
+                        results.append(dict(key, benchmark='memory ' + name, **usage))
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print the benchmarks slower than in baseline, and return their number."""
+    def key(r):
+        return r['benchmark'], r['typecode'], r['distribution'], r['size'], r.get('epsilon', 64)
+
+    old = {key(r): r for r in baseline['results']}
+    regressions = 0
+    for r in results:
+        b = old.get(key(r))
+        for metric in ['min', 'index size', 'data size']:
+            if b is None or metric not in r or metric not in b or not b[metric]:
+                continue
+            ratio = r[metric] / b[metric]
+            if ratio > 1 + threshold:
+                regressions += 1
+                print('%s (%s, %s, %d, epsilon %d) %s: %.4g -> %.4g (%+.0f%%)'
+                      % (r['benchmark'], r['typecode'], r['distribution'], r['size'], r['epsilon'], metric,
+                         b[metric], r[metric], (ratio - 1) * 100))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** 4, 10 ** 6])
+    parser.add_argument('--typecodes', nargs='+', default=list(TYPECODES), choices=list(TYPECODES))
+    parser.add_argument('--distributions', nargs='+', default=DISTRIBUTIONS, choices=DISTRIBUTIONS)
+    parser.add_argument('--epsilons', type=int, nargs='+', default=[64],
+                        help='values of epsilon, which bounds the range searched at the end of each query')
+    parser.add_argument('--filter', nargs='+', help='run only the benchmarks whose name contains one of these')
+    parser.add_argument('--queries', type=int, default=10000, help='number of queries per benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='repetitions of each benchmark')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='JSON file to write the results to, instead of stdout')
+    parser.add_argument('--compare', help='JSON file of previous results to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown reported by --compare')
+    args = parser.parse_args()
+
+    report = {'machine': machine_info(),
+              'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare')},
+              'results': run(args)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    else:
+        json.dump(report, sys.stdout, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report['results'], baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
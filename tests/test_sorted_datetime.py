@@ -0,0 +1,171 @@
+import datetime
+import pickle
+
+import numpy as np
+import pytest
+from pygm import SortedDatetimeList, SortedDatetimeSet, SortedList
+
+
+def random_datetimes(n, unit='s', seed=42):
+    rng = np.random.default_rng(seed)
+    ticks = rng.integers(0, 2 * 10 ** 9, n) // 1000 * 1000
+    return ticks.astype('M8[%s]' % unit)
+
+
+def test_init():
+    dts = random_datetimes(1000, 'ms')
+    sl = SortedDatetimeList(dts)
+    assert sl.unit == 'ms'
+    assert sl.to_numpy().dtype == np.dtype('M8[ms]')
+    assert np.array_equal(sl.to_numpy(), np.sort(dts))
+    assert sl.stats()['unit'] == 'ms' and sl.stats()['typecode'] == 'q'
+
+    assert SortedDatetimeList().unit == 'ns'
+    assert len(SortedDatetimeList()) == 0
+    sl = SortedDatetimeList([datetime.datetime(2021, 1, 2), datetime.date(2020, 5, 1), '2022-03-04'], unit='D')
+    assert list(sl) == [np.datetime64('2020-05-01'), np.datetime64('2021-01-02'), np.datetime64('2022-03-04')]
+    assert list(SortedDatetimeList(iter(['1970-01-02', '1970-01-01']), unit='D').to_numpy().view('q')) == [0, 1]
+    assert list(SortedDatetimeSet(['2020-01-01T00:00:01', '2020-01-01T00:00:01.5'], unit='s')) == \
+        [np.datetime64('2020-01-01T00:00:01')]
+
+    with pytest.raises(ValueError):
+        SortedDatetimeList(['2020-01-01', 'NaT'])
+    with pytest.raises(TypeError):
+        SortedDatetimeList(unit='fortnight')
+    with pytest.raises(NotImplementedError):
+        SortedDatetimeList.builder()
+
+
+def test_queries():
+    dts = random_datetimes(5000)
+    l = np.sort(dts)
+    sl = SortedDatetimeList(dts, epsilon=16)
+    ss = SortedDatetimeSet(dts, epsilon=16)
+    u = np.unique(l)
+    queries = np.concatenate([dts[:200], dts[:200] + np.timedelta64(1, 's'), l[:1] - np.timedelta64(1, 's')])
+
+    for x in queries[::10]:
+        left, right = np.searchsorted(l, x, 'left'), np.searchsorted(l, x, 'right')
+        for c, a in [(sl, l), (ss, u)]:
+            i, j = np.searchsorted(a, x, 'left'), np.searchsorted(a, x, 'right')
+            assert c.bisect_left(x) == i
+            assert c.bisect_right(x) == j
+            assert c.bisect_left(x.astype(datetime.datetime)) == i
+            assert c.bisect_left(str(x)) == i
+            assert (x in c) == (i < j)
+            assert c.find_lt(x) == (a[i - 1] if i else None)
+            assert c.find_ge(x) == (a[i] if i < len(a) else None)
+            assert c.find_le(x) == (a[j - 1] if j else None)
+            assert c.find_gt(x) == (a[j] if j < len(a) else None)
+        assert sl.count(x) == right - left
+
+    assert isinstance(sl.find_ge(l[0]), np.datetime64)
+    assert np.array_equal(sl.bisect_left_many(queries), np.searchsorted(l, queries))
+    assert np.array_equal(sl.contains_many(queries), np.isin(queries, l))
+    found_values, found = sl.find_le_many(queries)
+    assert found_values.dtype == np.dtype('M8[s]')
+    expected = np.searchsorted(l, queries, 'right') - 1
+    assert np.array_equal(found, expected >= 0)
+    assert np.array_equal(found_values[found], l[expected[found]])
+
+    a, b = np.sort(queries[:2])
+    in_range = l[(l >= a) & (l <= b)]
+    assert np.array_equal(sl.range_slice(a, b), in_range)
+    assert sl.range_slice(a, b).dtype == np.dtype('M8[s]')
+    assert list(sl.range(a, b, reverse=True)) == list(in_range[::-1])
+    assert sl.range_count(a, b) == len(in_range)
+
+
+def test_access_and_modify():
+    sl = SortedDatetimeList(['2020-01-03', '2020-01-01', '2020-01-02'], unit='D')
+    assert sl[0] == np.datetime64('2020-01-01') and sl[-1] == np.datetime64('2020-01-03')
+    assert isinstance(sl[1:], SortedDatetimeList) and sl[1:].unit == 'D'
+    assert list(reversed(sl)) == list(sl)[::-1]
+    assert sl.index('2020-01-02') == 1
+
+    sl.add(datetime.date(2019, 12, 31))
+    sl.update(['2020-02-01', '2020-02-02'])
+    sl.remove('2020-01-02')
+    sl.discard('2030-01-01')
+    assert list(sl.to_numpy().astype(str)) == ['2019-12-31', '2020-01-01', '2020-01-03', '2020-02-01', '2020-02-02']
+    sl.remove_range('2020-01-02', '2020-02-01')
+    assert list(sl.to_numpy().astype(str)) == ['2019-12-31', '2020-01-01', '2020-02-02']
+    with pytest.raises(ValueError):
+        sl.remove('2021-01-01')
+
+    merged = sl + SortedDatetimeList(['2020-01-01'], unit='D')
+    assert isinstance(merged, SortedDatetimeList) and merged.count('2020-01-01') == 2
+    assert isinstance(merged.drop_duplicates(), SortedDatetimeList)
+    assert (merged - ['2020-01-01']) == sl
+    assert sl == list(sl) and sl != list(sl)[1:] and sl < list(sl) + [np.datetime64('2021-01-01')]
+    assert (sl == 5) is False
+
+
+def test_set_operations():
+    a = SortedDatetimeSet(['2020-01-01', '2020-01-02', '2020-01-03'], unit='D')
+    b = SortedDatetimeSet(['2020-01-03T00:00', '2020-01-04T00:00'], unit='m')
+    union = a | b
+    assert isinstance(union, SortedDatetimeSet) and union.unit == 'D'
+    assert list(union.to_numpy().astype(str)) == ['2020-01-01', '2020-01-02', '2020-01-03', '2020-01-04']
+    assert list(a & b) == [np.datetime64('2020-01-03')]
+    assert list((a - b).to_numpy().astype(str)) == ['2020-01-01', '2020-01-02']
+    assert len(a ^ ['2020-01-01']) == 2
+    assert a.isdisjoint(['2021-01-01']) and not a.isdisjoint(b)
+    assert a == {np.datetime64('2020-01-01'), np.datetime64('2020-01-02'), np.datetime64('2020-01-03')}
+    assert a > {datetime.date(2020, 1, 1)} and a.issubset(union) and union.issuperset(a)
+    assert a != [np.datetime64('2020-01-01')]
+
+    union = SortedDatetimeSet.union_all(a, b, ['2020-01-05'])
+    assert isinstance(union, SortedDatetimeSet) and union.unit == 'D' and len(union) == 5
+    assert list(SortedDatetimeSet.intersection_all(union, a, b)) == [np.datetime64('2020-01-03')]
+    merged = SortedDatetimeList.merge_all(SortedDatetimeList(a), ['2020-01-01T12:00'])
+    assert isinstance(merged, SortedDatetimeList) and merged.unit == 'D' and merged.count('2020-01-01') == 2
+
+
+def test_comparisons_across_units():
+    days = SortedDatetimeSet(['2020-01-01', '2020-01-02'], unit='D')
+    hours = SortedDatetimeSet(['2020-01-01T00', '2020-01-02T00'], unit='h')
+    more = SortedDatetimeSet(['2020-01-01T00', '2020-01-01T12', '2020-01-02T00'], unit='h')
+    assert days == hours and hours == days and not days != hours
+    assert days <= hours and days >= hours and not days < hours and not days > hours
+    assert days < more and more > days and days <= more and more >= days
+    assert not days > more and not more < days and days != more
+    assert days.issubset(hours) and days.issuperset(hours)
+    assert days.issubset(more) and not days.issuperset(more)
+    assert more.issuperset(days) and not more.issubset(days)
+    assert days.issubset(['2020-01-01', '2020-01-02', '2020-01-03']) is True
+    assert days.issuperset(iter(['2020-01-02'])) is True
+    with pytest.raises(TypeError):
+        days.issubset(1)
+
+    days, hours = SortedDatetimeList(days), SortedDatetimeList(hours)
+    later = SortedDatetimeList(['2020-01-01T00', '2020-01-01T12'], unit='h')
+    assert days == hours and not days != hours and days <= hours and days >= hours
+    assert days > later and later < days and days >= later and later <= days
+    assert not days < later and days != later
+
+
+def test_interop_and_persistence(tmp_path):
+    dts = random_datetimes(100)
+    sl = SortedDatetimeList(dts)
+    assert np.asarray(sl).dtype == np.dtype('M8[s]')
+    assert np.asarray(sl, dtype='M8[ms]')[0] == sl[0]
+    assert SortedDatetimeList(sl).stats()['data size'] == sl.stats()['data size']
+    assert SortedDatetimeList(sl, unit='ms').unit == 'ms'
+    assert SortedDatetimeList(sl, unit='ms')[0] == sl[0]
+    ticks = SortedList(sl.to_numpy().view('q'))
+    assert np.array_equal(SortedDatetimeList(ticks, unit='s').to_numpy(), sl.to_numpy())
+
+    loaded = pickle.loads(pickle.dumps(sl))
+    assert isinstance(loaded, SortedDatetimeList) and loaded.unit == 's'
+    assert np.array_equal(loaded.to_numpy(), sl.to_numpy())
+
+    path = tmp_path / 'dates.pgm'
+    SortedDatetimeSet(sl).save(path)
+    loaded = SortedDatetimeSet.load(path, unit='s')
+    assert isinstance(loaded, SortedDatetimeSet)
+    assert np.array_equal(loaded.to_numpy(), np.unique(dts))
+
+    assert repr(SortedDatetimeList(['2020-01-01'], unit='D')) == "SortedDatetimeList(['2020-01-01'], unit='D')"
+    assert repr(SortedDatetimeSet(range(10), unit='Y')) == \
+        "SortedDatetimeSet(['1970', '1971', '1972', ..., '1978', '1979'], unit='Y')"
@@ -0,0 +1,117 @@
+import pickle
+import random
+from array import array
+
+import numpy as np
+import pytest
+from pygm import SortedDict, SortedSet
+
+
+def test_init():
+    assert len(SortedDict()) == 0
+    assert list(SortedDict({3: 'c', 1: 'a'}).items()) == [(1, 'a'), (3, 'c')]
+    assert SortedDict([(2, 'x'), (1, 'a'), (2, 'b')]) == {1: 'a', 2: 'b'}
+    sd = SortedDict({1.5: 1, 0.5: 2}, value_typecode='q')
+    assert sd.value_typecode == 'q' and sd == {0.5: 2, 1.5: 1}
+    assert SortedDict(sd) == sd
+    sd = SortedDict({k: str(k) for k in range(1000)}, epsilon=8, epsilon_recursive=16)
+    assert sd.keys().stats()['epsilon recursive'] == 16
+    sd.clear()
+    assert sd.keys().stats()['epsilon recursive'] == 16
+    with pytest.raises(ValueError):
+        SortedDict({1.2: 'a', 1.7: 'b'}, 'q')
+
+
+def test_from_arrays():
+    keys = np.array([5, 1, 3, 1, 9])
+    values = np.array([50., 10., 30., 11., 90.])
+    sd = SortedDict.from_arrays(keys, values)
+    assert sd.value_typecode == 'd'
+    assert list(sd.items()) == [(1, 11.), (3, 30.), (5, 50.), (9, 90.)]
+    sd = SortedDict.from_arrays(keys, ['e', 'a', 'c', 'b', 'i'])
+    assert sd.value_typecode is None and list(sd.values()) == ['b', 'c', 'e', 'i']
+    sd = SortedDict.from_arrays(keys, values, 'I', 'f')
+    assert sd.keys().stats()['typecode'] == 'I' and sd[9] == 90.
+    sd = SortedDict.from_arrays(keys, values, epsilon_recursive=2)
+    assert sd.keys().stats()['epsilon recursive'] == 2
+    assert pickle.loads(pickle.dumps(sd)).keys().stats()['epsilon recursive'] == 2
+    with pytest.raises(ValueError):
+        SortedDict.from_arrays(keys, values[:3])
+
+
+def test_get_set_del():
+    random.seed(42)
+    d = {}
+    sd = SortedDict(value_typecode='q')
+    for i in range(5000):
+        k = random.randint(0, 2000)
+        if i % 3:
+            sd[k] = d[k] = i
+        elif k in d:
+            del sd[k], d[k]
+        else:
+            with pytest.raises(KeyError):
+                del sd[k]
+        if i % 500 == 0:
+            for x in random.sample(range(-10, 2010), 50):
+                assert sd.get(x, -1) == d.get(x, -1)
+                assert (x in sd) == (x in d)
+    assert sd == d
+    assert list(sd) == sorted(d)
+    assert list(sd.values()) == [d[k] for k in sorted(d)]
+    with pytest.raises(KeyError):
+        sd[-1]
+    with pytest.raises(TypeError):
+        sd[5000] = 'not a number'
+    assert 5000 not in sd and len(sd) == len(d)
+
+    assert sd.pop(min(d)) == d.pop(min(d))
+    assert sd.setdefault(-5, 7) == 7 and sd[-5] == 7
+    sd.clear()
+    assert len(sd) == 0 and sd.value_typecode == 'q'
+    sd[1] = 2
+    assert sd == {1: 2}
+
+
+def test_get_many():
+    sd = SortedDict.from_arrays(np.arange(0, 100000, 2), np.arange(50000) * 10)
+    xs = np.array([[0, 1], [99998, 4]])
+    values, found = sd.get_many(xs)
+    assert values.tolist() == [[0, 0], [499990, 20]]
+    assert found.tolist() == [[True, False], [True, True]]
+    xs = np.random.default_rng(42).integers(-10, 100010, 30000)
+    values, found = sd.get_many(xs, threads=2)
+    assert (found == ((xs % 2 == 0) & (xs >= 0) & (xs < 100000))).all()
+    assert (values[found] == xs[found] * 5).all()
+
+    sd = SortedDict({1: 'a', 3: (1, 2)})
+    sd[2] = 'b'
+    values, found = sd.get_many([3, 0, 2])
+    assert values.tolist() == [(1, 2), None, 'b']
+    assert found.tolist() == [True, False, True]
+
+
+def test_range():
+    sd = SortedDict({k: str(k) for k in range(0, 100, 5)})
+    keys, values = sd.range(10, 30)
+    assert isinstance(keys, SortedSet)
+    assert list(keys) == [10, 15, 20, 25, 30]
+    assert values == ['10', '15', '20', '25', '30']
+    keys, values = sd.range(10, 30, (False, False))
+    assert list(keys) == [15, 20, 25] and values == ['15', '20', '25']
+    keys, values = sd.range(31, 10)
+    assert len(keys) == 0 and values == []
+
+    sd = SortedDict.from_arrays(np.arange(10), np.arange(10) ** 2, value_typecode='i')
+    keys, values = sd.range(7, 20)
+    assert list(keys) == [7, 8, 9] and values == array('i', [49, 64, 81])
+
+
+def test_copy_pickle_repr():
+    sd = SortedDict({k: k * 2 for k in range(10)}, value_typecode='l')
+    copy = sd.copy()
+    copy[100] = 1
+    assert 100 not in sd and 100 in copy
+    assert pickle.loads(pickle.dumps(sd)) == sd
+    assert repr(SortedDict({2: 'b', 1: 'a'})) == "SortedDict({1: 'a', 2: 'b'})"
+    assert repr(sd) == "SortedDict({0: 0, 1: 2, 2: 4, ..., 8: 16, 9: 18})"
@@ -1,7 +1,11 @@
 import bisect
+import copy
+import pickle
 import random
+import struct
 from array import array
 
+import numpy as np
 import pytest
 from pygm import SortedList
 
@@ -26,6 +30,8 @@ def test_init():
     assert SortedList(array('Q', (1, 2, 2, 3))) == [1, 2, 2, 3]
     assert SortedList([-5, -1, -5, 5], 'h') == [-5, -5, -1, 5]
     assert SortedList(SortedList([1]), 'H').stats()['typecode'] == 'H'
+    assert SortedList(x for x in [3, 1.5, 2]) == [1.5, 2, 3]
+    assert SortedList(iter([3, 1, 2])) == [1, 2, 3]
     with pytest.raises(TypeError):
         SortedList([0], '@')
     with pytest.raises(TypeError):
@@ -34,6 +40,28 @@ def test_init():
         SortedList("ciao")
 
 
+def test_init_buffer():
+    random.seed(42)
+    l = [random.randint(0, 100) for _ in range(1000)]
+    for dtype in ['i1', 'u1', 'i2', 'u2', 'i4', 'u4', 'i8', 'u8', 'f4', 'f8']:
+        assert SortedList(np.array(l, dtype=dtype)) == sorted(l)
+        assert SortedList(np.array(l, dtype=dtype)[::3]) == sorted(l[::3])
+    assert SortedList(np.array(l, dtype='>i8')) == sorted(l)
+    assert SortedList(np.arange(10), 'i').stats()['typecode'] == 'i'
+    assert SortedList(np.array([2., -1.]), 'q') == [-1, 2]
+    assert SortedList(np.array([-2. ** 63]), 'q') == [-2 ** 63]
+    assert SortedList(array('q', [-1, 5, -3]), 'h') == [-3, -1, 5]
+    assert SortedList(np.zeros((0,))) == []
+    with pytest.raises(OverflowError):
+        SortedList(np.array([-1, 5]), 'Q')
+    with pytest.raises(OverflowError):
+        SortedList(array('Q', [2 ** 40]), 'i')
+    for values, typecode in [([1.5, 2.7, np.nan], 'q'), ([np.inf], 'i'), ([2. ** 63], 'q'), ([-1.], 'Q'),
+                             ([2. ** 64], 'Q'), ([0.5], 'I')]:
+        with pytest.raises(OverflowError):
+            SortedList(np.array(values), typecode)
+
+
 def test_compare():
     assert not SortedList([1] * 10) == SortedList([1] * 100)
     assert SortedList([-5, -4, -3, -2, -1]) > SortedList([-10, -5])
@@ -91,6 +119,166 @@ def test_bisect():
             assert sl.bisect_left(x) == bisect.bisect_left(l, x)
             assert sl.bisect_right(x) == bisect.bisect_right(l, x)
 
+    l = [1, 2, 3] + [5] * 1000
+    assert SortedList(l).bisect_left(6) == len(l)
+    assert SortedList(l).bisect_left(4) == 3
+
+    l = sorted(random.randint(0, 2 ** 63) for _ in range(10000))
+    for typecode, x in [('Q', 2 ** 64 - 1), ('q', 2 ** 63 - 1)]:
+        sl = SortedList(l, typecode, 16)
+        assert sl.bisect_left(x) == sl.bisect_right(x) == len(l) - (x in l)
+        assert x not in sl
+
+
+def test_compressed(tmp_path):
+    random.seed(42)
+    l = sorted(random.randint(-10 ** 6, 10 ** 6) for _ in range(50000))
+    l += [l[-1]] * 100
+    sl = SortedList(l, epsilon=8, compressed=True)
+    stats = sl.stats()
+    assert stats['compressed']
+    assert stats['index size'] < stats['uncompressed index size']
+    assert stats['distinct slopes'] <= stats['leaf segments']
+    assert not SortedList(l, epsilon=8).stats()['compressed']
+    for x in random.sample(l, 200) + [-10 ** 7, l[-1] + 1, 10 ** 7]:
+        assert sl.bisect_left(x) == bisect.bisect_left(l, x)
+        assert sl.bisect_right(x) == bisect.bisect_right(l, x)
+
+    assert sl[10:100].stats()['compressed']
+    assert sl.drop_duplicates().stats()['compressed']
+    sl.save(tmp_path / 'sl.pygm')
+    for loaded in [SortedList.load(tmp_path / 'sl.pygm'), pickle.loads(pickle.dumps(sl))]:
+        assert loaded.stats() == stats
+        assert loaded.bisect_left_many(l[:100]).tolist() == sl.bisect_left_many(l[:100]).tolist()
+
+
+def test_packed(tmp_path):
+    random.seed(42)
+    l = sorted(random.randint(-10 ** 9, 10 ** 9) for _ in range(50000))
+    l += [l[-1]] * 100
+    for typecode in ['i', 'q', 'Q']:
+        values = [x + 10 ** 9 for x in l] if typecode == 'Q' else l
+        sl = SortedList(values, typecode, packed=True)
+        assert sl.stats()['packed']
+        assert sl.stats()['data size'] < len(values) * 4
+        assert list(sl) == values
+        assert list(reversed(sl)) == values[::-1]
+        for x in random.sample(values, 200) + [values[-1] + 1]:
+            assert sl.bisect_left(x) == bisect.bisect_left(values, x)
+            assert sl.bisect_right(x) == bisect.bisect_right(values, x)
+            assert (x in sl) == (x <= values[-1])
+        assert sl[1000] == values[1000]
+        assert list(sl.range(values[10], values[20])) == values[10:21]
+
+        assert sl.to_numpy().tolist() == values
+        assert (sl + values[:10]).stats()['packed']
+        assert list(sl[:100]) == values[:100]
+        assert sl == SortedList(values, typecode)
+        assert not SortedList(sl, packed=False).stats()['packed']
+        sl.save(tmp_path / 'sl.pygm')
+        for loaded in [SortedList.load(tmp_path / 'sl.pygm'), pickle.loads(pickle.dumps(sl, 5))]:
+            assert loaded.stats() == sl.stats()
+            assert loaded.bisect_left_many(values[:100]).tolist() == sl.bisect_left_many(values[:100]).tolist()
+
+    with pytest.raises(ValueError):
+        SortedList([1.5], packed=True)
+
+
+def test_radix(tmp_path):
+    random.seed(42)
+    l = sorted(random.randint(-10 ** 9, 10 ** 9) for _ in range(50000))
+    l += [l[-1]] * 100
+    for typecode, values in [('q', l), ('i', l), ('d', [x / 7 for x in l])]:
+        for kwargs in [{}, {'compressed': True}, {'packed': typecode != 'd'}]:
+            sl = SortedList(values, typecode, epsilon=8, radix=True, **kwargs)
+            stats = sl.stats()
+            assert stats['radix']
+            assert 0 < stats['radix table size'] < stats['index size']
+            assert not SortedList(values, typecode, epsilon=8)._impl.stats()['radix']
+            for x in random.sample(values, 200) + [values[0] - 1, values[-1], values[-1] + 1]:
+                assert sl.bisect_left(x) == bisect.bisect_left(values, x)
+                assert sl.bisect_right(x) == bisect.bisect_right(values, x)
+
+    assert sl[10:100].stats()['radix']
+    assert (sl + [0]).stats()['radix']
+    assert not SortedList(sl, radix=False).stats()['radix']
+    assert SortedList([5], radix=True).bisect_left(5) == 0
+    assert SortedList([], radix=True).stats()['radix table size'] == 0
+    sl.save(tmp_path / 'sl.pygm')
+    for loaded in [SortedList.load(tmp_path / 'sl.pygm'), pickle.loads(pickle.dumps(sl))]:
+        assert loaded.stats() == sl.stats()
+        assert loaded.bisect_left_many(l[:100]).tolist() == sl.bisect_left_many(l[:100]).tolist()
+
+
+
+def test_last_mile():
+    random.seed(42)
+    l = sorted(random.randint(0, 10 ** 6) for _ in range(20000))
+    l += [l[-1]] * 50
+    for typecode, values in [('i', l), ('Q', l), ('f', [x / 4 for x in l]), ('d', [x / 7 for x in l])]:
+        queries = values[::97] + [values[0] - 1, values[-1], values[-1] + 1]
+        queries += [x + (1 if typecode in 'iQ' else 0.125) for x in values[::89]]
+        for epsilon in [1, 4, 16, 64, 256]:
+            sl = SortedList(values, typecode, epsilon=epsilon)
+            for x in queries:
+                left, right = bisect.bisect_left(values, x), bisect.bisect_right(values, x)
+                assert sl.bisect_left(x) == left
+                assert sl.bisect_right(x) == right
+                assert (x in sl) == (left < right)
+            assert sl.bisect_right_many(queries).tolist() == [bisect.bisect_right(values, x) for x in queries]
+
+
+def test_epsilon_recursive(tmp_path):
+    random.seed(42)
+    l = sorted(random.randint(-10 ** 9, 10 ** 9) for _ in range(50000))
+    for epsilon_recursive in [1, 2, 16, 100]:
+        for compressed in [False, True]:
+            sl = SortedList(l, epsilon=8, compressed=compressed, epsilon_recursive=epsilon_recursive)
+            assert sl.stats()['epsilon recursive'] == epsilon_recursive
+            for x in random.sample(l, 200) + [l[0] - 1, l[-1] + 1]:
+                assert sl.bisect_left(x) == bisect.bisect_left(l, x)
+            assert (sl + [0]).stats()['epsilon recursive'] == epsilon_recursive
+            sl.save(tmp_path / 'sl.pygm')
+            for loaded in [SortedList.load(tmp_path / 'sl.pygm'), pickle.loads(pickle.dumps(sl))]:
+                assert loaded.stats() == sl.stats()
+
+    # Pending updates are indexed with the epsilon_recursive of the container
+    for epsilon_recursive in [1, 100]:
+        sl = SortedList(l, epsilon=8, epsilon_recursive=epsilon_recursive)
+        added = [random.randint(-10 ** 9, 10 ** 9) for _ in range(20000)]
+        sl.update(added)
+        for x in added[:300]:
+            sl.discard(x)
+        expected = sorted(l + added[300:])
+        for x in random.sample(expected, 200):
+            assert x in sl
+            assert sl.count(x) == bisect.bisect_right(expected, x) - bisect.bisect_left(expected, x)
+            assert sl.find_gt(x) == (expected[bisect.bisect_right(expected, x)]
+                                     if bisect.bisect_right(expected, x) < len(expected) else None)
+        assert sl.stats()['epsilon recursive'] == epsilon_recursive
+        assert list(sl) == expected
+
+    with pytest.raises(ValueError):
+        SortedList(l, epsilon_recursive=0)
+
+
+def test_tuned():
+    random.seed(42)
+    l = [random.randint(-10 ** 9, 10 ** 9) for _ in range(50000)]
+    sl, params = SortedList.tuned(l, max_index_bytes=1000)
+    assert list(sl) == sorted(l)
+    assert params['index size'] == sl.stats()['index size'] <= 1000
+    assert params['epsilon'] == sl.stats()['epsilon']
+    assert params['epsilon recursive'] == sl.stats()['epsilon recursive']
+
+    sl, params = SortedList.tuned(l, 'i', target_latency_ns=10 ** 9, sample_queries=l[:100])
+    assert sl.stats()['typecode'] == 'i'
+    assert params['index size'] == SortedList(l, 'i', epsilon=1024).stats()['index size']
+    assert params['latency'] > 0
+
+    with pytest.raises(ValueError):
+        SortedList.tuned(l)
+
 
 def test_find():
     l = SortedList([0, 1, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233] * 100)
@@ -126,6 +314,50 @@ def test_segment():
     assert l.segment(0, 0)['key'] == 2
 
 
+def test_segments_array():
+    random.seed(42)
+    l = sorted(random.randint(-10 ** 9, 10 ** 9) for _ in range(50000))
+    for compressed in [False, True]:
+        sl = SortedList(l, epsilon=8, compressed=compressed)
+        for level in range(sl.stats()['height']):
+            keys, slopes, intercepts = sl.segments_array(level)
+            assert len(keys) == len(slopes) == len(intercepts) == sl.stats()['segments counts'][level]
+            for i in [0, len(keys) // 2, len(keys) - 1]:
+                assert sl.segment(level, i) == {'epsilon': 8 if level == 0 else 4, 'key': keys[i],
+                                                'slope': slopes[i], 'intercept': intercepts[i]}
+
+
+def test_instrument():
+    random.seed(42)
+    l = sorted(random.randint(-10 ** 9, 10 ** 9) for _ in range(50000))
+    for kwargs in [{}, {'compressed': True}, {'radix': True}]:
+        sl = SortedList(l, **kwargs)
+        assert sl.query_stats() is None
+        sl.instrument()
+        sl.bisect_left_many(l[::10])
+        for x in l[:100]:
+            assert x in sl
+        stats = sl.query_stats()
+        assert stats['searches'] == 5100
+        assert stats['levels traversed'] == 5100 * (1 if kwargs.get('radix') else sl.stats()['height'])
+        assert stats['mean error'] <= stats['max error'] <= 64 + 2
+        assert sum(stats['window histogram']) == sum(stats['error histogram']) == stats['searches']
+        assert len(stats['segment searches']) == len(sl.segments_array()[0])
+        assert stats['segment searches'].sum() == stats['searches']
+        assert stats['segment errors'].sum() == pytest.approx(stats['mean error'] * stats['searches'])
+
+        sl.update(range(100000))
+        sl[0]  # merges the pending updates into a new index
+        assert sl.query_stats()['searches'] >= 5100
+        sl.instrument(False)
+        assert sl.query_stats() is None
+
+    sl = SortedList([1] + [5] * 10000 + [9], epsilon=16)
+    sl.instrument()
+    sl.bisect_right(5)
+    assert sl.query_stats()['out of window'] == 1
+
+
 def test_count():
     l = SortedList(range(100))
     assert l.count(-100) == 0
@@ -140,6 +372,97 @@ def test_count():
         assert l.count(2 ** x) == 100
 
 
+def test_to_numpy():
+    sl = SortedList([5, 1, 3, 3])
+    a = sl.to_numpy()
+    assert a.tolist() == [1, 3, 3, 5]
+    assert a.dtype == np.int64
+    assert not a.flags.writeable
+    assert np.shares_memory(a, np.asarray(sl))
+    assert np.asarray(sl, dtype='f8').tolist() == [1., 3., 3., 5.]
+    assert np.array(sl, copy=True).flags.writeable
+    assert memoryview(sl._impl).tolist() == [1, 3, 3, 5]
+    assert memoryview(sl._impl).readonly
+    assert SortedList(array('f', [2, 1])).to_numpy().dtype == np.float32
+    assert SortedList().to_numpy().tolist() == []
+
+
+def test_save_load(tmp_path):
+    random.seed(42)
+    l = [random.randint(0, 10 ** 6) for _ in range(100000)]
+    for typecode in ['i', 'I', 'q', 'Q', 'f', 'd']:
+        sl = SortedList(l, typecode, 32)
+        sl.save(tmp_path / 'sl.pygm')
+        for mmap in [True, False]:
+            loaded = SortedList.load(tmp_path / 'sl.pygm', mmap)
+            assert loaded == sl
+            assert loaded.stats() == sl.stats()
+            assert loaded.bisect_left_many(l[:100]).tolist() == sl.bisect_left_many(l[:100]).tolist()
+            assert (loaded + [1, 2]).count(1) == sl.count(1) + 1
+
+    SortedList().save(str(tmp_path / 'empty.pygm'))
+    assert SortedList.load(str(tmp_path / 'empty.pygm')) == []
+
+    (tmp_path / 'bad.pygm').write_bytes(b'PyGN' + bytes(100))
+    with pytest.raises(ValueError):
+        SortedList.load(tmp_path / 'bad.pygm')
+    with pytest.raises(OSError):
+        SortedList([1]).save(tmp_path / 'missing' / 'sl.pygm')
+
+
+def test_load_corrupted(tmp_path):
+    random.seed(42)
+    sl = SortedList([random.randint(0, 10 ** 9) for _ in range(10 ** 5)], 'q', 16)
+    sl.save(tmp_path / 'sl.pygm')
+    data = (tmp_path / 'sl.pygm').read_bytes()
+    n, _, _, n_segments, n_levels = struct.unpack_from('<5Q', data, 16)
+    levels_at = 64 + n * 8 + n_segments * 20
+    levels = list(struct.unpack_from('<%dQ' % n_levels, data, levels_at))
+    assert levels[0] == 0 and levels[-1] == n_segments and n_levels > 2
+
+    def corrupt(at, fmt, *values):
+        b = bytearray(data)
+        struct.pack_into(fmt, b, at, *values)
+        (tmp_path / 'bad.pygm').write_bytes(bytes(b))
+        with pytest.raises(ValueError):
+            SortedList.load(tmp_path / 'bad.pygm')
+
+    corrupt(levels_at, '<Q', 1)
+    corrupt(levels_at + 8, '<Q', 0)
+    corrupt(levels_at + 8, '<Q', n_segments + 1)
+    corrupt(levels_at + 8 * (n_levels - 1), '<Q', n_segments - 1)
+    corrupt(levels_at + 8 * (n_levels - 2), '<Q', levels[-3] + 1)
+    corrupt(16 + 24, '<Q', 2 ** 63)
+    corrupt(16 + 32, '<Q', 2 ** 61)
+
+    version, elements, segments, offsets, *rest = sl._impl.__getstate__()
+    offsets = struct.pack('<%dQ' % n_levels, *levels[:-1], n_segments + 1)
+    with pytest.raises(ValueError):
+        type(sl._impl).__new__(type(sl._impl)).__setstate__((version, elements, segments, offsets, *rest))
+
+
+def test_pickle():
+    random.seed(42)
+    l = [random.randint(-10 ** 6, 10 ** 6) for _ in range(100000)]
+    sl = SortedList(l, epsilon=16)
+    for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+        loaded = pickle.loads(pickle.dumps(sl, protocol))
+        assert loaded == sl
+        assert loaded.stats() == sl.stats()
+        assert loaded.bisect_left_many(l[:100]).tolist() == sl.bisect_left_many(l[:100]).tolist()
+
+    buffers = []
+    data = pickle.dumps(sl, 5, buffer_callback=buffers.append)
+    assert len(data) < 4 * len(sl)
+    loaded = pickle.loads(data, buffers=buffers)
+    assert loaded == sl
+    assert np.shares_memory(loaded.to_numpy(), sl.to_numpy())
+
+    assert copy.deepcopy(sl) == sl
+    assert pickle.loads(pickle.dumps(SortedList())) == []
+    assert pickle.loads(pickle.dumps(SortedList([1.5, 0.5], 'f'))).stats()['typecode'] == 'f'
+
+
 def test_range():
     l = SortedList(range(0, 100, 2))
     assert list(l.range(10, 20, (False, False))) == [12, 14, 16, 18]
@@ -147,6 +470,79 @@ def test_range():
     assert list(l.range(10, 20, (True, False))) == [10, 12, 14, 16, 18]
     assert list(l.range(10, 20, (True, True))) == [10, 12, 14, 16, 18, 20]
 
+    l = SortedList([1, 3, 3, 3, 5, 7, 7, 9] * 3)
+    expected = sorted([1, 3, 3, 3, 5, 7, 7, 9] * 3)
+    for inclusive in [(False, False), (False, True), (True, False), (True, True)]:
+        for a, b in [(3, 7), (0, 10), (4, 4), (7, 3), (3, 3)]:
+            items = list(l.range(a, b, inclusive))
+            i, j = l.range_bounds(a, b, inclusive)
+            assert expected[i:j] == items
+            assert l.range_count(a, b, inclusive) == len(items)
+            view = l.range_slice(a, b, inclusive)
+            assert view.tolist() == items and not view.flags.writeable
+    view = l.range_slice(3, 7)
+    assert view.base is not None
+    l.add(4)
+    l.discard(1)
+    assert l.range_bounds(3, 5) == (2, 15) and l.range_count(3, 5) == 13
+    assert l.range_slice(3, 5).tolist() == [3] * 9 + [4] + [5] * 3
+    assert view.tolist() == [3] * 9 + [5] * 3 + [7] * 6
+
+    p = SortedList(range(0, 1000, 3), packed=True)
+    assert p.range_slice(10, 20).tolist() == [12, 15, 18]
+    assert p.range_count(-5, 2000) == len(p)
+
+
+def test_batch():
+    random.seed(42)
+    l = sorted([random.randint(-100, 100) for _ in range(500)])
+    sl = SortedList(l)
+    xs = np.arange(-105, 105)
+    assert sl.bisect_left_many(xs).tolist() == [bisect.bisect_left(l, x) for x in xs]
+    assert sl.bisect_right_many(xs).tolist() == [bisect.bisect_right(l, x) for x in xs]
+    assert sl.rank_many(xs).tolist() == [sl.rank(x) for x in xs]
+    assert sl.count_many(xs).tolist() == [l.count(x) for x in xs]
+    assert sl.contains_many(xs).tolist() == [x in l for x in xs]
+    assert sl.bisect_left_many(array('h', [0, 50])).tolist() == [sl.bisect_left(0), sl.bisect_left(50)]
+    assert sl.bisect_left_many([[0], [50]]).shape == (2, 1)
+
+    for name in ['find_lt', 'find_le', 'find_gt', 'find_ge']:
+        values, found = getattr(sl, name + '_many')(xs)
+        expected = [getattr(sl, name)(x) for x in xs]
+        assert found.tolist() == [e is not None for e in expected]
+        assert values[found].tolist() == [e for e in expected if e is not None]
+
+    fl = SortedList([0.5, 1.5, 1.5, 2.5])
+    assert fl.bisect_left_many([1.5, 2]).tolist() == [1, 3]
+    assert fl.contains_many(np.array([1.5, 2], dtype='f')).tolist() == [True, False]
+    assert SortedList().bisect_left_many([1, 2]).tolist() == [0, 0]
+    assert SortedList().find_ge_many([1])[1].tolist() == [False]
+    with pytest.raises(TypeError):
+        sl.bisect_left_many([0.5])
+
+    # Queries out of the range of the elements raise, rather than wrapping around
+    ul = SortedList([1, 2, 3], 'I')
+    assert ul.bisect_left_many(np.array([0, 2 ** 32 - 1])).tolist() == [0, 3]
+    for queries in [np.array([-1]), np.array([2 ** 32 + 1]), np.array([5, -1], dtype='i1')]:
+        for method in [ul.bisect_left_many, ul.contains_many, ul.find_ge_many]:
+            with pytest.raises(OverflowError):
+                method(queries)
+    with pytest.raises(OverflowError):
+        SortedList([1], 'q').contains_many(np.array([2 ** 64 - 1], dtype='u8'))
+    assert SortedList([1], 'Q').contains_many(np.array([1], dtype='i8')).tolist() == [True]
+
+    xs = np.random.default_rng(42).integers(-105, 105, 50000)
+    expected = np.searchsorted(l, xs)
+    for threads in [1, 3, 8]:
+        assert (sl.bisect_left_many(xs, threads=threads) == expected).all()
+        values, found = sl.find_ge_many(xs, threads)
+        assert (found == (expected < len(l))).all()
+        assert (values[found] == np.array(l)[expected[found]]).all()
+    sl.add(1000)
+    assert sl.contains_many(np.full(20000, 1000), threads=4).all()
+    with pytest.raises(ValueError):
+        sl.bisect_left_many(xs, threads=0)
+
 
 def test_index():
     l = sorted([0, 1, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233] * 10)
@@ -168,11 +564,77 @@ def test_add():
     assert SortedList([1, 1, 2, 3]) + [5, 1] == [1, 1, 1, 2, 3, 5]
 
 
+def test_updates():
+    random.seed(42)
+    l = [random.randint(0, 5000) for _ in range(3000)]
+    sl = SortedList(l)
+    l.sort()
+    for i in range(6000):
+        x = random.randint(0, 5000)
+        if i % 3:
+            sl.add(x)
+            bisect.insort(l, x)
+        else:
+            sl.discard(x)
+            if x in l:
+                l.remove(x)
+        if i % 500 == 0:
+            sl.update([x, x + 1, x - 1] * 200)
+            l = sorted(l + [x, x + 1, x - 1] * 200)
+            sl.remove_range(x, x + 50, (False, True))
+            l = [y for y in l if not x < y <= x + 50]
+        if i % 100 == 0:
+            assert len(sl) == len(l)
+            for y in random.sample(range(-10, 5010), 20):
+                assert sl.bisect_left(y) == bisect.bisect_left(l, y)
+                assert sl.bisect_right(y) == bisect.bisect_right(l, y)
+                assert sl.count(y) == l.count(y)
+                j = bisect.bisect_left(l, y)
+                assert sl.find_ge(y) == (l[j] if j < len(l) else None)
+                assert sl.find_lt(y) == (l[j - 1] if j > 0 else None)
+    assert sl == l
+
+    sl = SortedList(typecode='d')
+    sl.update([2.5, 0.5])
+    sl.add(1.5)
+    sl.remove(2.5)
+    assert sl == [0.5, 1.5]
+    with pytest.raises(ValueError):
+        sl.remove(2.5)
+
+
+def test_updates_snapshots():
+    sl = SortedList([1, 2, 3])
+    a = sl.to_numpy()
+    it = iter(sl)
+    copy = sl.copy()
+    sl.add(0)
+    sl.discard(2)
+    assert sl == [0, 1, 3]
+    assert copy == [1, 2, 3]
+    assert list(a) == [1, 2, 3]
+    assert list(it) == [1, 2, 3]
+    assert pickle.loads(pickle.dumps(sl)) == [0, 1, 3]
+
+
 def test_sub():
     assert SortedList([1, 1, 3]) - SortedList([5, 1]) == [1, 3]
     assert SortedList([1, 1, 2, 3, 8]) - [1, 1, 1] == [2, 3, 8]
 
 
+def test_merge_all():
+    random.seed(42)
+    for packed in [False, True]:
+        lists = [[random.randint(0, 100) for _ in range(random.randint(0, 50))] for _ in range(40)]
+        merged = SortedList.merge_all(*(SortedList(l, 'q', packed=packed) for l in lists))
+        assert merged == sorted(sum(lists, []))
+        assert merged.count(50) == sum(l.count(50) for l in lists)
+    assert SortedList.merge_all(SortedList([2, 1]), [3, 1], SortedList([1.5])) == [1, 1, 1, 2, 3]
+    assert SortedList.merge_all([0.5], SortedList([2])) == [0, 2]
+    assert SortedList.merge_all(SortedList([5, 4])) == [4, 5]
+    assert len(SortedList.merge_all()) == 0
+
+
 def test_drop_duplicates():
     assert SortedList([2, 3, 8]).drop_duplicates() == [2, 3, 8]
     assert SortedList([2, 3, 8] * 10).drop_duplicates() == [2, 3, 8]
@@ -181,3 +643,63 @@ def test_drop_duplicates():
 def test_copy():
     assert len(SortedList().copy()) == 0
     assert SortedList([4, 1, 3, 3, 2]).copy() == [1, 2, 3, 3, 4]
+
+
+def test_threads():
+    import pygm
+    default = pygm.get_threads()
+    assert default >= 1
+    random.seed(42)
+    l = [random.randint(-10 ** 6, 10 ** 6) for _ in range(100003)]
+    expected = sorted(l)
+    try:
+        for threads in [1, 2, 3, 8]:
+            pygm.set_threads(threads)
+            assert SortedList(l) == expected
+            assert SortedList(np.array(l, dtype=np.float64)) == expected
+            assert SortedList([1]) + l[:70000] == sorted([1] + l[:70000])
+    finally:
+        pygm.set_threads(0)
+    assert pygm.get_threads() == default
+    with pytest.raises(ValueError):
+        pygm.set_threads(-1)
+
+
+def test_builder():
+    random.seed(42)
+    chunks = [np.random.default_rng(i).integers(-1000, 1000, 50000) for i in range(3)]
+    chunks += [array('i', [5, 1]), [7, -3, 7], range(10)]
+    builder = SortedList.builder('q', epsilon=32)
+    for chunk in chunks:
+        builder.extend(chunk)
+    assert len(builder) == sum(len(c) for c in chunks)
+    sl = builder.finish()
+    assert sl.stats()['epsilon'] == 32
+    assert sl == sorted(x for c in chunks for x in c)
+    with pytest.raises(ValueError):
+        builder.extend([1])
+    with pytest.raises(ValueError):
+        builder.finish()
+
+    builder = SortedList.builder()
+    builder.extend(x / 2 for x in range(5))
+    builder.extend(np.arange(5, 10) / 2)
+    assert builder.finish() == [x / 2 for x in range(10)]
+
+    builder = SortedList.builder()
+    builder.extend([])
+    builder.extend([1, 2])
+    for chunk in ([2.5], np.array([2.5]), np.array([1], 'f'), np.array([1], 'Q')):
+        with pytest.raises(TypeError):
+            builder.extend(chunk)
+    builder.extend(np.array([3], 'i'))
+    builder.extend([])
+    sl = builder.finish()
+    assert sl == [1, 2, 3] and sl.stats()['typecode'] == 'q'
+
+    builder = SortedList.builder(packed=True)
+    builder.extend(np.arange(100000))
+    sl = builder.finish()
+    assert sl.stats()['packed'] and sl == range(100000)
+    assert SortedList.builder('d').finish().stats()['typecode'] == 'd'
+    assert len(SortedList.builder().finish()) == 0
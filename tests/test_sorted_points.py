@@ -0,0 +1,95 @@
+import pickle
+
+import numpy as np
+import pytest
+from pygm import SortedList, SortedPoints, _pygm
+
+
+def brute_range(points, low, high):
+    mask = np.all((points >= low) & (points <= high), axis=1)
+    return sorted(map(tuple, points[mask].tolist()))
+
+
+def test_init():
+    sp = SortedPoints([(3, 1), (0, 0), (1, 2), (3, 1)])
+    assert len(sp) == 4
+    assert sp.dimensions == 2
+    assert sorted(sp) == [(0, 0), (1, 2), (3, 1), (3, 1)]
+    assert sp.to_numpy().dtype.kind == 'i'
+    assert len(SortedPoints(np.empty((0, 3)))) == 0
+    with pytest.raises(ValueError):
+        SortedPoints([1, 2, 3])
+    with pytest.raises(ValueError):
+        SortedPoints([(0., np.nan)])
+    with pytest.raises(TypeError):
+        SortedPoints([('a', 'b')])
+
+
+def test_range():
+    rng = np.random.default_rng(42)
+    for points in [rng.integers(0, 1000, (5000, 2)),
+                   rng.normal(0, 1, (5000, 3)),
+                   rng.integers(-2 ** 40, 2 ** 40, (2000, 4)),
+                   np.repeat(rng.integers(0, 10, (50, 2)), 20, axis=0)]:
+        for packed in [False, True]:
+            sp = SortedPoints(points, epsilon=16, packed=packed)
+            for _ in range(50):
+                a, b = points[rng.integers(0, len(points), 2)]
+                low, high = np.minimum(a, b), np.maximum(a, b)
+                assert sorted(map(tuple, sp.range(low, high).tolist())) == brute_range(points, low, high)
+            assert len(sp.range(points.min(axis=0) - 1, points.max(axis=0) + 1)) == len(points)
+
+    sp = SortedPoints([(1, 1), (5, 5)])
+    assert sp.range((2, 2), (4, 4)).shape == (0, 2)
+    assert sp.range((5, 0), (0, 5)).shape == (0, 2)
+    assert sp.range((-np.inf, 0), (np.inf, 2)).tolist() == [[1, 1]]
+    assert SortedPoints(np.empty((0, 2))).range((0, 0), (1, 1)).shape == (0, 2)
+    with pytest.raises(ValueError):
+        sp.range((0, 0, 0), (1, 1, 1))
+
+
+def test_repeated_max_corner():
+    for dimensions in [1, 2, 4, 8]:
+        points = np.array([[0] * dimensions] + [[1] * dimensions] * 3)
+        sp = SortedPoints(points)
+        assert len(sp) == 4
+        assert len(sp.range([1] * dimensions, [1] * dimensions)) == 3
+        assert tuple([1] * dimensions) in sp
+
+
+def test_morton_dimensions():
+    with pytest.raises(ValueError):
+        _pygm.morton_encode(np.zeros((3, 0), dtype=np.uint64))
+    with pytest.raises(ValueError):
+        _pygm.morton_encode(np.zeros((3, 65), dtype=np.uint64))
+    codes = SortedList([0, 1, 2], 'Q')._impl
+    with pytest.raises(ValueError):
+        _pygm.morton_range(codes, 0, 2, 0)
+    assert list(_pygm.morton_range(codes, 0, 2, 1)) == [0, 1, 2]
+
+
+def test_contains():
+    rng = np.random.default_rng(42)
+    points = rng.normal(0, 1, (10000, 2))
+    sp = SortedPoints(points)
+    assert tuple(points[10]) in sp
+    assert (0.5, 0.5) not in sp
+    queries = np.concatenate([points[::7], points[::11] + 1e-9, [(100, 100)]])
+    expected = [True] * len(points[::7]) + [False] * (len(points[::11]) + 1)
+    assert sp.contains_many(queries).tolist() == expected
+    assert sp.contains_many(np.empty((0, 2))).tolist() == []
+
+    # Distinct points in the same cell of the grid
+    sp = SortedPoints([(0, 0), (1e-300, 0), (1, 1)])
+    assert sp.contains_many([(1e-300, 0), (0, 0), (2e-300, 0)]).tolist() == [True, True, False]
+    with pytest.raises(ValueError):
+        sp.contains_many([1, 2])
+
+
+def test_pickle_repr():
+    sp = SortedPoints([(i, i % 3) for i in range(10)])
+    loaded = pickle.loads(pickle.dumps(sp))
+    assert list(loaded) == list(sp)
+    assert loaded.range((2, 0), (5, 1)).tolist() == sp.range((2, 0), (5, 1)).tolist()
+    assert repr(SortedPoints([(1, 2)])) == 'SortedPoints([(1, 2)])'
+    assert repr(sp) == 'SortedPoints([(0, 0), (3, 0), (1, 1), ..., (5, 2), (8, 2)])'
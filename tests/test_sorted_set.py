@@ -1,5 +1,6 @@
 import bisect
 import itertools
+import pickle
 import random
 from array import array
 
@@ -21,6 +22,7 @@ def test_init():
     assert list(SortedSet({1, 5, 5, 10})) == [1, 5, 10]
     assert list(SortedSet(range(5, 0, -1))) == [1, 2, 3, 4, 5]
     assert list(SortedSet(array('d', (1, 2, 2, 3)))) == [1., 2., 3.]
+    assert list(SortedSet(array('Q', (9, 1, 2, 2, 9)))) == [1, 2, 9]
 
 
 def test_compare():
@@ -54,6 +56,22 @@ def test_contains():
     assert 500. in SortedSet([1., 1.] * 10 + [500.] * 2 + [1000.] * 5)
 
 
+def test_save_load(tmp_path):
+    SortedList([3, 1, 3, 2]).save(tmp_path / 'sl.pygm')
+    ss = SortedSet.load(tmp_path / 'sl.pygm')
+    assert list(ss) == [1, 2, 3]
+    ss.save(tmp_path / 'ss.pygm')
+    assert SortedSet.load(tmp_path / 'ss.pygm', mmap=False) == {1, 2, 3}
+
+
+def test_pickle():
+    ss = SortedSet([3, 1, 3, 2])
+    loaded = pickle.loads(pickle.dumps(ss, 5))
+    assert isinstance(loaded, SortedSet)
+    assert loaded == {1, 2, 3}
+    assert len(loaded | {1, 4}) == 4
+
+
 def test_getitem():
     assert SortedSet([0, 1, 3, 3, 4, 10])[-1] == 10
     assert SortedSet([0, 1, 3, 3, 4, 10])[3] == 4
@@ -78,6 +96,34 @@ def test_bisect():
         assert sl.bisect_right(x) == bisect.bisect_right(l, x)
 
 
+def test_compressed():
+    random.seed(42)
+    l = sorted(random.sample(range(10 ** 6), 10000))
+    s = set(l)
+    ss = SortedSet(l, epsilon=4, compressed=True)
+    assert ss.stats()['compressed']
+    for x in random.sample(range(-5, 10 ** 6 + 5), 500) + l[::50]:
+        assert (x in ss) == (x in s)
+        assert ss.bisect_left(x) == bisect.bisect_left(l, x)
+    assert (ss | {-1}).stats()['compressed']
+
+
+def test_packed():
+    random.seed(42)
+    s = set(random.sample(range(10 ** 7), 10000))
+    ss = SortedSet(s, packed=True)
+    assert ss.stats()['packed']
+    assert ss == s
+    for x in random.sample(range(-5, 10 ** 7 + 5), 500):
+        assert (x in ss) == (x in s)
+    other = SortedSet(range(0, 10 ** 7, 1000))
+    assert ss | other == s | set(other)
+    assert ss & other == s & set(other)
+    ss.add(-1)
+    ss.discard(min(s))
+    assert ss == (s | {-1}) - {min(s)}
+
+
 def test_find():
     l = SortedSet([0, 1, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233])
     assert l.find_lt(5) == 3
@@ -167,9 +213,96 @@ def test_symmetric_difference():
         assert x < 50 or x > 99
 
 
+def test_chained_operations():
+    random.seed(42)
+    for packed in [False, True]:
+        sets = [set(random.sample(range(500), random.randint(0, 300))) for _ in range(5)]
+        a, b, c, d, e = (SortedSet(s, 'q', packed=packed) for s in sets)
+        sa, sb, sc, sd, se = sets
+        assert list((a | b | c) - d) == sorted((sa | sb | sc) - sd)
+        assert list(a - b - c - (d & e)) == sorted(sa - sb - sc - (sd & se))
+        assert list((a ^ b ^ c) & (d | e)) == sorted((sa ^ sb ^ sc) & (sd | se))
+        assert list(a & b & c & d) == sorted(sa & sb & sc & sd)
+        assert list(a - (b - c)) == sorted(sa - (sb - sc))
+        assert list(a | SortedList([3, 3, 1]) | [7, 7]) == sorted(sa | {1, 3, 7})
+        assert list(a & SortedList([1, 1, 2, 3] + sorted(sa))) == sorted(sa)
+
+    # Deferred results are computed when needed, and can be queried, updated
+    # and reused by other operations
+    a, b, c = SortedSet(range(0, 30, 2)), SortedSet(range(0, 30, 3)), SortedSet(range(10))
+    union = a | b
+    difference = union - c
+    assert union.find_ge(25) == 26 and 27 in union
+    assert list(difference) == sorted((set(range(0, 30, 2)) | set(range(0, 30, 3))) - set(range(10)))
+    assert list(union & c) == [0, 2, 3, 4, 6, 8, 9]
+    union.add(100)
+    assert union[-1] == 100 and 100 not in difference
+    assert pickle.loads(pickle.dumps(a | c)) == a | c
+    assert a == SortedSet(range(0, 30, 2)) and a.stats()['height'] > 0
+    with pytest.raises(AttributeError):
+        (a | b).missing
+
+
+def test_union_intersection_all():
+    random.seed(42)
+    for packed in [False, True]:
+        for k in [1, 2, 3, 50]:
+            sets = [set(random.sample(range(1000), random.randint(0, 600))) for _ in range(k)]
+            containers = [SortedSet(s, 'q', packed=packed) for s in sets]
+            assert list(SortedSet.union_all(*containers)) == sorted(set().union(*sets))
+            assert list(SortedSet.intersection_all(*containers)) == sorted(sets[0].intersection(*sets[1:]))
+
+    a, b = SortedSet(range(0, 30, 2)), SortedSet(range(0, 30, 3))
+    assert SortedSet.union_all(a, [7, 1], SortedList([1, 1, 4.5])) == set(range(0, 30, 2)) | {1, 7}
+    assert list(SortedSet.intersection_all(a | b, [6, 7, 8, 6], a - [8])) == [6]
+    assert list(SortedSet.union_all([3, 1, 2])) == [1, 2, 3]
+    assert len(SortedSet.union_all()) == 0
+    with pytest.raises(TypeError):
+        SortedSet.intersection_all()
+
+
+def test_updates():
+    random.seed(42)
+    ss = SortedSet(random.randint(0, 5000) for _ in range(3000))
+    s = set(ss)
+    for i in range(6000):
+        x = random.randint(0, 5000)
+        if i % 3:
+            ss.add(x)
+            s.add(x)
+        else:
+            ss.discard(x)
+            s.discard(x)
+        if i % 500 == 0:
+            ss.update(range(x, x + 300, 3))
+            s.update(range(x, x + 300, 3))
+            ss.remove_range(x, x + 50)
+            s.difference_update(range(x, x + 51))
+        if i % 100 == 0:
+            l = sorted(s)
+            assert len(ss) == len(l)
+            for y in random.sample(range(-10, 5010), 20):
+                assert (y in ss) == (y in s)
+                assert ss.bisect_left(y) == bisect.bisect_left(l, y)
+                j = bisect.bisect_right(l, y)
+                assert ss.find_gt(y) == (l[j] if j < len(l) else None)
+                assert ss.find_le(y) == (l[j - 1] if j > 0 else None)
+    assert ss == s
+
+    ss = SortedSet([1, 2])
+    ss.remove(1)
+    with pytest.raises(KeyError):
+        ss.remove(1)
+    assert list(ss) == [2]
+
+
 def test_copy():
     assert len(SortedSet().copy()) == 0
     assert list(SortedSet([4, 1, 3, 3, 2]).copy()) == [1, 2, 3, 4]
+    ss = SortedSet([1, 2])
+    copy = ss.copy()
+    copy.add(3)
+    assert list(ss) == [1, 2]
 
 
 def test_isdisjoint():
@@ -178,3 +311,56 @@ def test_isdisjoint():
     assert not SortedSet({1, 2, 4, 8}).isdisjoint(SortedSet({1, 2, 4, 8}))
     assert SortedSet().isdisjoint(set())
     assert SortedSet().isdisjoint(SortedSet())
+
+
+def test_skewed_operations():
+    # Operands of very different sizes are combined by looking up the
+    # elements of the smaller one in the larger one
+    random.seed(42)
+    for packed in [False, True]:
+        large_set = set(random.sample(range(10 ** 6), 20000))
+        large = SortedSet(large_set, packed=packed, epsilon=16)
+        for small_set in [set(), {-1}, set(random.sample(range(10 ** 6), 50)),
+                          set(random.sample(sorted(large_set), 50)), {min(large_set), max(large_set)}]:
+            small = SortedSet(small_set)
+            for x, y, sx, sy in [(large, small, large_set, small_set), (small, large, small_set, large_set)]:
+                assert list(x & y) == sorted(sx & sy)
+                assert list(x - y) == sorted(sx - sy)
+                assert list(x & list(sy) * 2) == sorted(sx & sy)
+                assert list(x & SortedList(list(sy) * 2)) == sorted(sx & sy)
+                assert x.isdisjoint(y) == x.isdisjoint(list(sy)) == sx.isdisjoint(sy)
+                assert (x <= y) == (sx <= sy) and (x < y) == (sx < sy)
+                assert (x >= set(sy)) == (sx >= sy) and (x > set(sy)) == (sx > sy)
+        deferred = large | SortedSet([-5])
+        assert list(deferred & SortedSet([-5, 3])) == sorted({-5, 3} & (large_set | {-5}))
+        assert large >= SortedSet(sorted(large_set)[::1000]) > SortedSet([min(large_set)])
+
+
+def test_concurrent_operations():
+    from concurrent.futures import ThreadPoolExecutor
+    a = SortedSet(range(0, 300000, 2))
+    b = SortedSet(range(0, 300000, 3))
+    other = list(range(299999, 0, -5))
+    expected = [
+        set(range(0, 300000, 2)) | set(range(0, 300000, 3)),
+        set(range(0, 300000, 6)),
+        set(range(0, 300000, 2)) - set(other),
+        list(range(0, 300000, 4)),
+    ]
+    ops = [lambda: a | b, lambda: a & b, lambda: a - other, lambda: list(a[::2])]
+    with ThreadPoolExecutor(4) as executor:
+        for _ in range(2):
+            futures = [executor.submit(op) for op in ops]
+            results = [f.result() for f in futures]
+            assert results == expected
+    assert a == a.copy() and a >= a & b and not a <= b
+
+
+def test_builder():
+    builder = SortedSet.builder('I')
+    builder.extend(array('I', [3, 1, 3]))
+    builder.extend([2, 1])
+    ss = builder.finish()
+    assert isinstance(ss, SortedSet)
+    assert list(ss) == [1, 2, 3]
+    assert ss.stats()['typecode'] == 'I'
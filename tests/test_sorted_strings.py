@@ -0,0 +1,100 @@
+import bisect
+import pickle
+import random
+
+import pytest
+from pygm import SortedStrings
+
+
+def random_strings(n, alphabet='abc', max_length=12):
+    return [''.join(random.choice(alphabet) for _ in range(random.randint(0, max_length))) for _ in range(n)]
+
+
+def test_init():
+    assert list(SortedStrings()) == []
+    assert list(SortedStrings(['b', 'a', 'c', 'a'])) == ['a', 'a', 'b', 'c']
+    assert list(SortedStrings(iter([b'\xff', b'\x00', b'']))) == [b'', b'\x00', b'\xff']
+    assert list(SortedStrings(['é', 'z', 'ä', '\U0001F600'])) == sorted(['é', 'z', 'ä', '\U0001F600'])
+    with pytest.raises(TypeError):
+        SortedStrings(['a', b'b'])
+    with pytest.raises(TypeError):
+        SortedStrings([1, 2])
+
+
+def test_queries():
+    random.seed(42)
+    for strings in [random_strings(5000),
+                    ['https://example.com/' + s for s in random_strings(3000, 'xyz/', 20)],
+                    [s.encode() for s in random_strings(3000, 'ab\x00', 10)],
+                    ['%016x' % random.getrandbits(64) for _ in range(3000)]]:
+        l = sorted(strings)
+        for epsilon in [4, 64]:
+            ss = SortedStrings(strings, epsilon)
+            assert len(ss) == len(l)
+            assert list(ss) == l
+            assert list(reversed(ss)) == l[::-1]
+            empty = type(l[0])()
+            queries = random.sample(l, 200) + [q + l[0][:1] for q in random.sample(l, 100)] + [empty, l[-1] + l[-1]]
+            for x in queries:
+                left, right = bisect.bisect_left(l, x), bisect.bisect_right(l, x)
+                assert ss.bisect_left(x) == left
+                assert ss.bisect_right(x) == right
+                assert ss.count(x) == right - left
+                assert (x in ss) == (left < right)
+                assert ss.find_lt(x) == (l[left - 1] if left else None)
+                assert ss.find_ge(x) == (l[left] if left < len(l) else None)
+                assert ss.find_le(x) == (l[right - 1] if right else None)
+                assert ss.find_gt(x) == (l[right] if right < len(l) else None)
+            a, b = sorted(random.sample(l, 2))
+            assert list(ss.range(a, b)) == [x for x in l if a <= x <= b]
+            assert list(ss.range(a, b, (False, False), reverse=True)) == [x for x in l if a < x < b][::-1]
+            assert ss.range_count(a, b) == len([x for x in l if a <= x <= b])
+    assert SortedStrings(['x://a', 'x://b']).stats()['common prefix'] == b'x://'
+
+    with pytest.raises(TypeError):
+        b'a' in SortedStrings(['a'])
+    assert SortedStrings().bisect_left(b'a') == SortedStrings().bisect_left('a') == 0
+
+
+def test_max_keys():
+    # Strings whose first 8 bytes are all 0xff share a key with those just below
+    top = b'\xff' * 8
+    strings = [b'a', top, top, top, top + b'\x00', b'\xff' * 7 + b'\xfe', b'\xff' * 7 + b'\xfe\x01', top * 2]
+    l = sorted(strings)
+    ss = SortedStrings(strings, 4)
+    assert list(ss) == l
+    for x in l + [b'\xff' * 7, b'\xff' * 7 + b'\xfe\x00', top + b'\x01', top * 3]:
+        assert ss.bisect_left(x) == bisect.bisect_left(l, x)
+        assert ss.bisect_right(x) == bisect.bisect_right(l, x)
+        assert (x in ss) == (x in l)
+    assert ss.count(top) == 3
+
+
+def test_getitem_index():
+    ss = SortedStrings(['d', 'b', 'a', 'c', 'b'])
+    assert ss[0] == 'a' and ss[-1] == 'd'
+    assert list(ss[1:4]) == ['b', 'b', 'c']
+    assert list(ss[::-2]) == ['a', 'b', 'd']
+    assert list(ss[10:]) == []
+    assert ss.index('b') == 1
+    assert ss.index('b', 2) == 2
+    with pytest.raises(ValueError):
+        ss.index('b', 3)
+    with pytest.raises(ValueError):
+        ss.index('e')
+    with pytest.raises(IndexError):
+        ss[5]
+
+
+def test_pickle_repr_stats():
+    random.seed(42)
+    ss = SortedStrings(random_strings(1000))
+    loaded = pickle.loads(pickle.dumps(ss))
+    assert list(loaded) == list(ss)
+    assert loaded.bisect_left('abc') == ss.bisect_left('abc')
+    assert list(pickle.loads(pickle.dumps(SortedStrings([b'a'])))) == [b'a']
+    assert repr(SortedStrings(['b', 'a'])) == "SortedStrings(['a', 'b'])"
+    assert repr(SortedStrings(map(str, range(10)))) == "SortedStrings(['0', '1', '2', ..., '8', '9'])"
+    stats = ss.stats()
+    assert stats['data size'] >= sum(map(len, ss))
+    assert 0 < stats['distinct keys'] <= len(ss)